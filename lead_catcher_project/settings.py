@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 from pathlib import Path
 from decouple import config
 import os
+import tempfile
 
 
 
@@ -55,6 +56,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'leads.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -88,12 +90,97 @@ WSGI_APPLICATION = 'lead_catcher_project.wsgi.application'
 
 
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# DATABASE_ENGINE picks the profile: 'sqlite' (default) or 'postgresql'.
+DATABASE_ENGINE = config('DATABASE_ENGINE', default='sqlite')
+
+if DATABASE_ENGINE == 'postgresql':
+    # Needs psycopg (psycopg[pool] for DATABASE_POOL). Either keep one
+    # persistent connection per worker thread, health-checked before reuse,
+    # or share a psycopg pool per process; Django can't combine the two.
+    DATABASE_POOL = config('DATABASE_POOL', default=False, cast=bool)
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DATABASE_NAME', default='lead_catcher'),
+            'USER': config('DATABASE_USER', default=''),
+            'PASSWORD': config('DATABASE_PASSWORD', default=''),
+            'HOST': config('DATABASE_HOST', default=''),
+            'PORT': config('DATABASE_PORT', default=''),
+            'CONN_MAX_AGE': 0 if DATABASE_POOL else config('DATABASE_CONN_MAX_AGE', default=600, cast=int),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': config('DATABASE_POOL_MIN_SIZE', default=2, cast=int),
+                    'max_size': config('DATABASE_POOL_MAX_SIZE', default=20, cast=int),
+                    'timeout': config('DATABASE_POOL_TIMEOUT', default=10, cast=int),
+                },
+            } if DATABASE_POOL else {},
+        }
     }
-}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': config('DATABASE_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+            'OPTIONS': {
+                # Take the write lock when a transaction starts. A deferred
+                # transaction that reads and then writes fails outright with
+                # "database is locked" when another writer got in between;
+                # the busy timeout can't help it.
+                'transaction_mode': config('SQLITE_TRANSACTION_MODE', default='IMMEDIATE'),
+            },
+            'TEST': {
+                # A file rather than shared-cache memory, so concurrency tests
+                # see SQLite's real locking behaviour; kept out of the checkout.
+                'NAME': Path(tempfile.gettempdir()) / 'lead_catcher_test_db.sqlite3',
+            },
+        }
+    }
+
+# Read replica for dashboard, analytics and lead list reads: a host for
+# PostgreSQL, a file for SQLite (kept current by `manage.py sync_replica`).
+# Users read their own data from the primary for READ_REPLICA_LAG_SECONDS
+# after they write, and results cached from the replica expire that soon.
+DATABASE_REPLICA = config('DATABASE_REPLICA', default='')
+READ_REPLICA_ALIAS = 'replica' if DATABASE_REPLICA else ''
+READ_REPLICA_LAG_SECONDS = config('READ_REPLICA_LAG_SECONDS', default=5, cast=int)
+if DATABASE_REPLICA:
+    DATABASES[READ_REPLICA_ALIAS] = {
+        **DATABASES['default'],
+        'HOST' if DATABASE_ENGINE == 'postgresql' else 'NAME': DATABASE_REPLICA,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# Extra databases for per-client lead storage: SQLite files or PostgreSQL
+# hosts, comma separated, available as shard_1, shard_2, ... Clients stay on
+# the default database; each one's leads, rollups and callers live on the
+# shard recorded in Client.shard (chosen by hashing for new clients, changed
+# with `manage.py rebalance_shards`). Run `migrate --database` on each shard.
+DATABASE_SHARDS = [name for name in config('DATABASE_SHARDS', default='').split(',') if name]
+for number, name in enumerate(DATABASE_SHARDS, 1):
+    DATABASES[f'shard_{number}'] = {
+        **DATABASES['default'],
+        'HOST' if DATABASE_ENGINE == 'postgresql' else 'NAME': name,
+        'TEST': {} if DATABASE_ENGINE == 'postgresql' else {
+            'NAME': Path(tempfile.gettempdir()) / f'lead_catcher_test_shard_{number}.sqlite3',
+        },
+    }
+LEAD_SHARDS = ['default', *(f'shard_{number}' for number in range(1, len(DATABASE_SHARDS) + 1))]
+
+DATABASE_ROUTERS = ['leads.shards.ShardRouter', 'leads.replica.ReplicaRouter']
+
+# Applied to every new SQLite connection by leads.database.configure_sqlite.
+# WAL lets dashboards read while a webhook writes, and NORMAL sync is durable
+# against crashes of the app (the last commits can be lost on power failure).
+# Writers wait up to busy_timeout ms for the lock instead of failing.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT_MS', default=20000, cast=int),
+    'mmap_size': config('SQLITE_MMAP_SIZE', default=256 * 1024 * 1024, cast=int),
+    'cache_size': -config('SQLITE_CACHE_KB', default=64 * 1024, cast=int),
+    'temp_store': 'MEMORY',
+} if config('SQLITE_TUNING', default=True, cast=bool) else {}
 
 
 
@@ -163,6 +250,67 @@ STATICFILES_DIRS = [
 ]
 
 
+WEBHOOK_CLIENT_CACHE_SIZE = config('WEBHOOK_CLIENT_CACHE_SIZE', default=10000, cast=int)
+WEBHOOK_CLIENT_CACHE_TTL = config('WEBHOOK_CLIENT_CACHE_TTL', default=300, cast=int)
+
+# 'sync' writes leads inside the webhook request; 'spool' only appends the
+# event to WEBHOOK_SPOOL_PATH and leaves the write to `manage.py drain_webhook_spool`.
+WEBHOOK_INGEST_MODE = config('WEBHOOK_INGEST_MODE', default='sync')
+WEBHOOK_SPOOL_PATH = config('WEBHOOK_SPOOL_PATH', default=str(BASE_DIR / 'webhook_spool.sqlite3'))
+WEBHOOK_BATCH_MAX_EVENTS = config('WEBHOOK_BATCH_MAX_EVENTS', default=10000, cast=int)
+# Applies to POST /webhook/<token>/ only, before and after decompression;
+# every other route keeps Django's DATA_UPLOAD_MAX_MEMORY_SIZE.
+WEBHOOK_BATCH_MAX_BYTES = config('WEBHOOK_BATCH_MAX_BYTES', default=10 * 1024 * 1024, cast=int)
+
+# Deletes stay in the lead change feed this long; `manage.py prune_lead_tombstones`
+# drops older ones, and cursors from before them get 410 Gone.
+CHANGE_FEED_TOMBSTONE_RETENTION_DAYS = config('CHANGE_FEED_TOMBSTONE_RETENTION_DAYS', default=30, cast=int)
+
+
 LOGIN_REDIRECT_URL = '/dashboard/'
 LOGIN_URL = '/accounts/login/'
-LOGOUT_REDIRECT_URL = '/'
\ No newline at end of file
+LOGOUT_REDIRECT_URL = '/'
+
+# Analytics results are cached per client and invalidated by a data version
+# bumped on every lead write. locmem is per process; use the file backend
+# (or any shared cache) when running more than one worker.
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+}
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[config('CACHE_BACKEND', default='locmem')],
+        'LOCATION': config('CACHE_LOCATION', default=str(BASE_DIR / 'cache')),
+        'OPTIONS': {'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=10000, cast=int)},
+    }
+}
+ANALYTICS_CACHE_ALIAS = 'default'
+ANALYTICS_CACHE_TIMEOUT = config('ANALYTICS_CACHE_TIMEOUT', default=300, cast=int)
+
+# Route /webhook/ and /analytics/ to their async views. Enable when serving
+# through asgi.py; under WSGI the sync DRF views avoid a per-request event loop.
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
+
+# Live dashboard stream (/dashboard/stream/). Events are fanned out in
+# process, so dashboards only see writes handled by the same ASGI worker.
+LIVE_STREAM_HEARTBEAT = config('LIVE_STREAM_HEARTBEAT', default=15, cast=int)
+LIVE_STREAM_QUEUE_SIZE = config('LIVE_STREAM_QUEUE_SIZE', default=100, cast=int)
+
+# Caller numbers are stored in E.164 next to the original; national numbers
+# (with or without a trunk 0) are assumed to be in this country.
+PHONE_DEFAULT_COUNTRY_CODE = config('PHONE_DEFAULT_COUNTRY_CODE', default='91')
+PHONE_NATIONAL_NUMBER_LENGTH = config('PHONE_NATIONAL_NUMBER_LENGTH', default=10, cast=int)
+
+# provision_clients numbers clients without a virtual number from this
+# E.164 prefix, padded to a full-length number in the default country.
+VIRTUAL_NUMBER_PREFIX = config('VIRTUAL_NUMBER_PREFIX', default='+9180')
+
+# Per-view request metrics, served to staff at /metrics/ in Prometheus text
+# format. Requests slower than this many milliseconds are also logged as
+# warnings by the leads.metrics logger; 0 turns that off.
+METRICS_SLOW_REQUEST_MS = config('METRICS_SLOW_REQUEST_MS', default=0, cast=int)
+
+# Unfiltered admin changelists over tables estimated above this many rows
+# show the estimate instead of running COUNT(*) on every page.
+ADMIN_ESTIMATED_COUNT_THRESHOLD = config('ADMIN_ESTIMATED_COUNT_THRESHOLD', default=100000, cast=int)
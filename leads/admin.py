@@ -1,15 +1,120 @@
 
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
 from django.utils.html import format_html
 from django.urls import reverse
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.http import QueryDict
 from .models import Client, Lead
+from .pagination import EstimatedCountPaginator
+from . import changes, rollups, shards
+
+
+def admin_shard(request):
+    """
+    The shard picked in the lead changelist's shard filter. Change and delete
+    pages carry the changelist's filters in _changelist_filters.
+    """
+    params = request.GET
+    if '_changelist_filters' in params:
+        params = QueryDict(params['_changelist_filters'])
+    alias = params.get(ShardListFilter.parameter_name)
+    return alias if alias in settings.LEAD_SHARDS else DEFAULT_DB_ALIAS
+
+
+class ShardListFilter(admin.SimpleListFilter):
+    """
+    Picks the shard the lead admin browses. Routing happens in
+    ShardedAdminMixin, so there is no "All" choice.
+    """
+    title = 'shard'
+    parameter_name = 'shard'
+
+    def lookups(self, request, model_admin):
+        if len(settings.LEAD_SHARDS) < 2:
+            return []
+        return [(alias, alias) for alias in settings.LEAD_SHARDS]
+
+    def queryset(self, request, queryset):
+        return queryset
+
+    def choices(self, changelist):
+        current = self.value() or DEFAULT_DB_ALIAS
+        for alias, title in self.lookup_choices:
+            yield {
+                'selected': alias == current,
+                'query_string': changelist.get_query_string({self.parameter_name: alias}),
+                'display': title,
+            }
+
+
+class LeadClientFilter(admin.SimpleListFilter):
+    """
+    Filters leads by ?client=<id>, as linked from the client list. Lists only
+    the selected client rather than every client in the sidebar.
+    """
+    title = 'client'
+    parameter_name = 'client'
+
+    def lookups(self, request, model_admin):
+        value = self.value()
+        if not value or not value.isdigit():
+            return []
+        return [(str(client.id), str(client)) for client in Client.objects.filter(id=value)]
+
+    def queryset(self, request, queryset):
+        if self.value() and self.value().isdigit():
+            return queryset.filter(client_id=self.value())
+        return queryset
+
+
+class ClientChangeList(ChangeList):
+    def get_results(self, request):
+        super().get_results(request)
+        # One rollup query per shard for the page, rather than a COUNT per row.
+        counts = rollups.lead_counts([client.id for client in self.result_list])
+        for client in self.result_list:
+            client.lead_count = counts.get(client.id, 0)
+
+
+class ShardedAdminMixin:
+    """
+    Runs the admin views of a sharded model on the shard picked with
+    ShardListFilter. Responses are rendered inside the block, since their
+    templates evaluate the querysets.
+    """
+
+    def _on_shard(self, request, view, *args, **kwargs):
+        with shards.using(admin_shard(request)):
+            response = view(request, *args, **kwargs)
+            if hasattr(response, 'render'):
+                response.render()
+            return response
+
+    def changelist_view(self, request, extra_context=None):
+        return self._on_shard(request, super().changelist_view, extra_context)
+
+    def changeform_view(self, request, object_id=None, form_url='', extra_context=None):
+        return self._on_shard(request, super().changeform_view, object_id, form_url, extra_context)
+
+    def delete_view(self, request, object_id, extra_context=None):
+        return self._on_shard(request, super().delete_view, object_id, extra_context)
+
+    def history_view(self, request, object_id, extra_context=None):
+        return self._on_shard(request, super().history_view, object_id, extra_context)
+
 
 @admin.register(Client)
 class ClientAdmin(admin.ModelAdmin):
     list_display = ['business_name', 'user', 'virtual_number', 'webhook_url_display', 'total_leads', 'created_at']
     list_filter = ['created_at']
+    list_select_related = ['user']
     search_fields = ['business_name', 'user__username', 'virtual_number']
-    readonly_fields = ['webhook_token', 'webhook_url_display', 'webhook_url_ngrok', 'created_at']
+    readonly_fields = ['webhook_token', 'webhook_url_display', 'webhook_url_ngrok', 'shard', 'created_at']
+    autocomplete_fields = ['user']
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     fieldsets = (
         ('Business Information', {
@@ -19,6 +124,10 @@ class ClientAdmin(admin.ModelAdmin):
             'fields': ('webhook_token', 'webhook_url_display', 'webhook_url_ngrok'),
             'description': 'Use these URLs to receive call notifications from your phone service provider.'
         }),
+        ('Storage', {
+            'fields': ('shard',),
+            'description': 'Move clients between shards with the rebalance_shards command.'
+        }),
         ('Timestamps', {
             'fields': ('created_at',)
         }),
@@ -46,29 +155,39 @@ class ClientAdmin(admin.ModelAdmin):
         )
     webhook_url_ngrok.short_description = 'Ngrok Webhook URL'
     
+    def get_changelist(self, request, **kwargs):
+        return ClientChangeList
+
     def total_leads(self, obj):
-        return obj.leads.count()
+        count = obj.lead_count if hasattr(obj, 'lead_count') else rollups.lead_counts([obj.id]).get(obj.id, 0)
+        url = reverse('admin:leads_lead_changelist')
+        return format_html('<a href="{}?client={}&amp;shard={}">{}</a>', url, obj.id, shards.alias_for(obj), count)
     total_leads.short_description = 'Total Leads'
     
     class Media:
         js = ('admin/js/webhook_copy.js',)
 
 @admin.register(Lead)
-class LeadAdmin(admin.ModelAdmin):
+class LeadAdmin(ShardedAdminMixin, admin.ModelAdmin):
     list_display = ['customer_number', 'client', 'status', 'call_duration_display', 'call_timestamp', 'created_at']
-    list_filter = ['status', 'client', 'call_timestamp', 'created_at']
-    search_fields = ['customer_number', 'client__business_name']
-    readonly_fields = ['created_at']
+    list_filter = [ShardListFilter, LeadClientFilter, 'status']
+    list_select_related = ['client']
+    search_fields = ['customer_number', 'call_sid', 'client__business_name']
+    readonly_fields = ['created_at', 'updated_at']
+    autocomplete_fields = ['client']
+    date_hierarchy = 'call_timestamp'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     
     fieldsets = (
         ('Lead Information', {
             'fields': ('client', 'customer_number', 'status', 'notes')
         }),
         ('Call Details', {
-            'fields': ('call_duration', 'recording_url', 'call_timestamp')
+            'fields': ('call_sid', 'call_duration', 'recording_url', 'call_timestamp')
         }),
         ('Tracking', {
-            'fields': ('first_contacted_at', 'created_at')
+            'fields': ('first_contacted_at', 'created_at', 'updated_at')
         }),
     )
     
@@ -81,4 +200,31 @@ class LeadAdmin(admin.ModelAdmin):
             minutes = obj.call_duration // 60
             seconds = obj.call_duration % 60
             return f"{minutes}m {seconds}s"
-    call_duration_display.short_description = 'Call Duration'
\ No newline at end of file
+    call_duration_display.short_description = 'Call Duration'
+    
+    def get_readonly_fields(self, request, obj=None):
+        # A lead stays with its client: moving it could take it to another
+        # shard, and its change feed and rollups are kept per client.
+        if obj is not None:
+            return [*self.readonly_fields, 'client']
+        return self.readonly_fields
+
+    def save_model(self, request, obj, form, change):
+        # A new lead belongs on its client's shard, whichever one is browsed.
+        with shards.for_client(obj.client) as alias, transaction.atomic(using=alias):
+            before = None
+            if change:
+                before = rollups.contribution(Lead.objects.get(pk=obj.pk))
+            super().save_model(request, obj, form, change)
+            rollups.apply_change(before, rollups.contribution(obj))
+    
+    def delete_model(self, request, obj):
+        with transaction.atomic(using=shards.db()):
+            rollups.apply_change(rollups.contribution(obj), None)
+            changes.record_delete(obj)
+            super().delete_model(request, obj)
+    
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic(using=shards.db()):
+            rollups.apply_changes((rollups.contribution(lead), None) for lead in queryset)
+            changes.delete_leads(queryset)
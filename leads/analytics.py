@@ -0,0 +1,108 @@
+from django.db.models import Count, Avg, F, Q
+from django.db.models.functions import TruncDate, Extract
+from .models import Lead
+from . import notes_search, phone
+
+
+DURATION_FILTERS = {
+    '0': Q(call_duration=0),
+    '1-30': Q(call_duration__range=(1, 30)),
+    '31-120': Q(call_duration__range=(31, 120)),
+    '121+': Q(call_duration__gt=120),
+}
+
+DURATION_RANGES = [
+    ('0-30s', 0, 30),
+    ('31-60s', 31, 60),
+    ('1-2m', 61, 120),
+    ('2-5m', 121, 300),
+    ('5m+', 301, None),
+]
+
+BUSINESS_HOURS = ['6', '8', '10', '12', '14', '16', '18', '20']
+
+
+def filter_leads(client, status=None, duration=None, search=None, q=None):
+    """
+    Apply the dashboard filter set to a client's leads
+    """
+    leads_queryset = Lead.objects.filter(client=client)
+    if status:
+        leads_queryset = leads_queryset.filter(status=status)
+    if duration in DURATION_FILTERS:
+        leads_queryset = leads_queryset.filter(DURATION_FILTERS[duration])
+    if search:
+        leads_queryset = leads_queryset.filter(phone.search_q(search))
+    notes_q = notes_search.filter_q(client.id, q)
+    if notes_q is not None:
+        leads_queryset = leads_queryset.filter(notes_q)
+    return leads_queryset
+
+
+def _duration_q(min_dur, max_dur):
+    if max_dur is None:
+        return Q(call_duration__gte=min_dur)
+    return Q(call_duration__range=(min_dur, max_dur))
+
+
+def summarize(leads_queryset):
+    """
+    KPIs, status breakdown and duration histogram in a single aggregate query
+    """
+    aggregates = {
+        'total_leads': Count('id'),
+        'missed_calls': Count('id', filter=Q(call_duration=0)),
+        'avg_response_time': Avg(
+            F('first_contacted_at') - F('created_at'),
+            filter=Q(first_contacted_at__isnull=False),
+        ),
+        'avg_call_duration': Avg('call_duration', filter=Q(call_duration__gt=0)),
+    }
+    for value, _ in Lead.STATUS_CHOICES:
+        aggregates[f'status_{value}'] = Count('id', filter=Q(status=value))
+    for index, (_, min_dur, max_dur) in enumerate(DURATION_RANGES):
+        aggregates[f'duration_{index}'] = Count('id', filter=_duration_q(min_dur, max_dur))
+
+    row = leads_queryset.order_by().aggregate(**aggregates)
+
+    avg_response_seconds = 0
+    if row['avg_response_time']:
+        avg_response_seconds = row['avg_response_time'].total_seconds()
+
+    return {
+        'total_leads': row['total_leads'],
+        'converted_leads': row['status_converted'],
+        'missed_calls': row['missed_calls'],
+        'avg_response_seconds': avg_response_seconds,
+        'avg_call_duration': row['avg_call_duration'] or 0,
+        'status_counts': [
+            {'status': value, 'count': row[f'status_{value}']}
+            for value, _ in Lead.STATUS_CHOICES
+            if row[f'status_{value}']
+        ],
+        'duration_data': [
+            {'label': label, 'count': row[f'duration_{index}']}
+            for index, (label, _, _) in enumerate(DURATION_RANGES)
+        ],
+    }
+
+
+def leads_over_time(leads_queryset, date_from):
+    return leads_queryset.filter(call_timestamp__gte=date_from)\
+        .annotate(day=TruncDate('call_timestamp'))\
+        .values('day')\
+        .annotate(count=Count('id'))\
+        .order_by('day')
+
+
+def hourly_pattern(leads_queryset):
+    hourly_data = leads_queryset.exclude(call_timestamp__isnull=True)\
+        .annotate(hour=Extract('call_timestamp', 'hour'))\
+        .values('hour')\
+        .annotate(count=Count('id'))\
+        .order_by('hour')
+
+    pattern = {str(hour): 0 for hour in range(24)}
+    for item in hourly_data:
+        pattern[str(item['hour'])] = item['count']
+    return pattern
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from . import replica, shards
+
+
+def _cache():
+    return caches[settings.ANALYTICS_CACHE_ALIAS]
+
+
+def _version_key(client_id):
+    return f'analytics:version:{client_id}'
+
+
+def data_version(client_id):
+    """
+    The client's current data version. A missing version (first use, or
+    evicted) starts from the clock so it never matches entries cached under
+    an earlier one.
+    """
+    cache = _cache()
+    key = _version_key(client_id)
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+async def adata_version(client_id):
+    cache = _cache()
+    key = _version_key(client_id)
+    version = await cache.aget(key)
+    if version is None:
+        version = time.time_ns()
+        if not await cache.aadd(key, version, timeout=None):
+            version = await cache.aget(key, version)
+    return version
+
+
+def bump_versions(client_ids):
+    """
+    Invalidate every cached result for these clients once the current
+    transaction commits, so readers can't cache pre-commit data under the new version.
+    """
+    def bump():
+        cache = _cache()
+        for client_id in client_ids:
+            try:
+                cache.incr(_version_key(client_id))
+            except ValueError:
+                # No version yet; the next reader starts a fresh one.
+                pass
+
+    client_ids = set(client_ids)
+    if client_ids:
+        transaction.on_commit(bump, using=shards.db())
+
+
+def _result_key(client_id, version, name, params):
+    digest = hashlib.md5(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+    return f'analytics:{client_id}:{version}:{name}:{digest}'
+
+
+def cached(client_id, name, params, compute):
+    """
+    compute() cached under (client, name, params, data version)
+    """
+    key = _result_key(client_id, data_version(client_id), name, params)
+    cache = _cache()
+    result = cache.get(key)
+    if result is None:
+        result = compute()
+        cache.set(key, result, replica.cache_timeout(settings.ANALYTICS_CACHE_TIMEOUT))
+    return result
+
+
+async def acached(client_id, name, params, compute):
+    """
+    cached() for async views; a miss runs the synchronous compute() in one thread hop
+    """
+    key = _result_key(client_id, await adata_version(client_id), name, params)
+    cache = _cache()
+    result = await cache.aget(key)
+    if result is None:
+        result = await sync_to_async(compute)()
+        await cache.aset(key, result, replica.cache_timeout(settings.ANALYTICS_CACHE_TIMEOUT))
+    return result
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class LeadsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'leads'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_migrate
+        from . import database, metrics, notes_search, signals  # noqa: F401
+        post_migrate.connect(notes_search.reinstall_triggers, sender=self)
+        connection_created.connect(database.configure_sqlite)
+        connection_created.connect(metrics.install_sql_wrapper)
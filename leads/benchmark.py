@@ -0,0 +1,200 @@
+import asyncio
+import io
+import statistics
+import threading
+import time
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext
+
+
+def latency_report(latencies, elapsed, errors):
+    """
+    Requests/s and latency percentiles (in ms) for one benchmark run
+    """
+    cuts = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'elapsed_seconds': round(elapsed, 3),
+        'requests_per_second': round(len(latencies) / elapsed, 1) if elapsed else 0,
+        'p50_ms': round(cuts[49] * 1000, 2),
+        'p99_ms': round(cuts[98] * 1000, 2),
+    }
+
+
+def _wsgi_environ(method, path, query_string, headers, body):
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': query_string,
+        'SCRIPT_NAME': '',
+        'SERVER_NAME': headers.get('host', 'localhost'),
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'REMOTE_ADDR': '127.0.0.1',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': 'http',
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': io.StringIO(),
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in headers.items():
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        else:
+            environ['HTTP_' + name.upper().replace('-', '_')] = value
+    return environ
+
+
+def drive_wsgi(application, requests, concurrency):
+    """
+    Send (method, path, query_string, headers, body) requests through a WSGI
+    callable from `concurrency` threads, the way a threaded server would
+    """
+    pending = iter(requests)
+    lock = threading.Lock()
+    latencies = []
+    errors = [0]
+
+    def worker():
+        while True:
+            with lock:
+                request = next(pending, None)
+            if request is None:
+                return
+            statuses = []
+            started = time.perf_counter()
+            response = application(_wsgi_environ(*request), lambda status, headers, exc_info=None: statuses.append(status))
+            b''.join(response)
+            if hasattr(response, 'close'):
+                response.close()
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                if not statuses[0].startswith(('2', '3')):
+                    errors[0] += 1
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latency_report(latencies, time.perf_counter() - started, errors[0])
+
+
+async def _asgi_call(application, method, path, query_string, headers, body):
+    scope = {
+        'type': 'http',
+        'asgi': {'version': '3.0'},
+        'http_version': '1.1',
+        'method': method,
+        'scheme': 'http',
+        'path': path,
+        'raw_path': path.encode(),
+        'query_string': query_string.encode(),
+        'root_path': '',
+        'headers': [(name.encode(), value.encode()) for name, value in headers.items()],
+        'server': (headers.get('host', 'localhost'), 80),
+        'client': ('127.0.0.1', 0),
+    }
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    status = []
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        # Stay connected until the handler stops listening for a disconnect.
+        await asyncio.Event().wait()
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await application(scope, receive, send)
+    return status[0]
+
+
+def drive_asgi(application, requests, concurrency):
+    """
+    Send the same requests through an ASGI callable from `concurrency`
+    tasks on one event loop, the way an ASGI server would
+    """
+    async def run():
+        pending = iter(requests)
+        latencies = []
+        errors = 0
+
+        async def worker():
+            nonlocal errors
+            for request in pending:
+                started = time.perf_counter()
+                status = await _asgi_call(application, *request)
+                latencies.append(time.perf_counter() - started)
+                if status >= 400:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return latency_report(latencies, time.perf_counter() - started, errors)
+
+    return asyncio.run(run())
+
+
+def time_requests(send, repeats, before_each=None):
+    """
+    Latency report for `repeats` sequential send() calls, each returning a
+    response, plus the number of queries one call runs. before_each() runs
+    untimed ahead of every call (and of the query-counting one).
+    """
+    if before_each:
+        before_each()
+    # Each request clears the query log on start, so begin from an empty one.
+    reset_queries()
+    with CaptureQueriesContext(connection) as captured:
+        send()
+    # Count now: captured_queries is a view of the log, which the next request clears.
+    query_count = len(captured)
+    latencies = []
+    errors = 0
+    for _ in range(repeats):
+        if before_each:
+            before_each()
+        started = time.perf_counter()
+        response = send()
+        latencies.append(time.perf_counter() - started)
+        if response.status_code >= 400:
+            errors += 1
+    return {**latency_report(latencies, sum(latencies), errors), 'queries': query_count}
+
+
+def flatten_results(report):
+    """
+    {'10000 dashboard cold': {...}, '10000 webhook': {...}} from a benchmark_load report
+    """
+    flat = {}
+    for result in report['results']:
+        flat[f"{result['leads']} webhook"] = result['webhook']
+        for endpoint, modes in result['endpoints'].items():
+            for mode, measurement in modes.items():
+                flat[f"{result['leads']} {endpoint} {mode}"] = measurement
+    return flat
+
+
+def compare_reports(baseline, current, metrics=('p50_ms', 'p99_ms', 'queries')):
+    """
+    (label, metric, baseline value, current value) for every measurement
+    present in both benchmark_load reports
+    """
+    before = flatten_results(baseline)
+    rows = []
+    for label, measurement in flatten_results(current).items():
+        if label not in before:
+            continue
+        for metric in metrics:
+            if metric in measurement and metric in before[label]:
+                rows.append((label, metric, before[label][metric], measurement[metric]))
+    return rows
@@ -0,0 +1,179 @@
+from collections import defaultdict
+from django.db import connections, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+from .models import Caller, Lead
+from . import changes, shards
+
+
+def caller_number(lead):
+    return lead.customer_e164 or lead.customer_number
+
+
+def contribution(lead):
+    """
+    ((client_id, number), seen_at, call_duration, status) for a single lead
+    """
+    seen_at = lead.call_timestamp or lead.created_at or timezone.now()
+    return (lead.client_id, caller_number(lead)), seen_at, lead.call_duration, lead.status
+
+
+def apply_changes(changes):
+    """
+    Move (before, after) lead contributions between caller rows, creating
+    callers on their first call. Counters and first/last seen are updated
+    relative to the stored row in one upsert, so concurrent writers can't
+    lose each other's calls. Must run inside the transaction writing the leads.
+    """
+    deltas = defaultdict(lambda: [0, 0])
+    earliest = {}
+    latest = {}
+    for before, after in changes:
+        if before is not None:
+            key, _, call_duration, _ = before
+            deltas[key][0] -= 1
+            deltas[key][1] -= call_duration
+        if after is not None:
+            key, seen_at, call_duration, status = after
+            deltas[key][0] += 1
+            deltas[key][1] += call_duration
+            if key not in earliest or seen_at < earliest[key]:
+                earliest[key] = seen_at
+            if key not in latest or seen_at >= latest[key][0]:
+                latest[key] = (seen_at, status)
+
+    if latest:
+        _upsert([
+            (client_id, number, earliest[key], seen_at, *deltas[key], status)
+            for key, (seen_at, status) in latest.items()
+            for client_id, number in [key]
+        ])
+
+    # Keys that only lost calls: plain counter updates, then drop emptied callers.
+    emptied = defaultdict(set)
+    for (client_id, number), (call_count, total_duration) in deltas.items():
+        if (client_id, number) in latest:
+            continue
+        Caller.objects.filter(client_id=client_id, number=number).update(
+            call_count=F('call_count') + call_count, total_duration=F('total_duration') + total_duration
+        )
+        emptied[client_id].add(number)
+    for client_id, numbers in emptied.items():
+        Caller.objects.filter(client_id=client_id, number__in=numbers, call_count__lte=0).delete()
+
+
+def _upsert(rows):
+    """
+    INSERT ... ON CONFLICT DO UPDATE for (client_id, number, first_seen,
+    last_seen, call_count, total_duration, latest_status) rows, as one
+    prepared statement. SQLite and PostgreSQL share the syntax.
+    """
+    connection = connections[shards.db()]
+    greatest, least = ('GREATEST', 'LEAST') if connection.vendor == 'postgresql' else ('MAX', 'MIN')
+    table = connection.ops.quote_name(Caller._meta.db_table)
+    adapted = {}
+
+    def adapt(value):
+        # Imports stamp many calls with the same time; adapt each once.
+        if value not in adapted:
+            adapted[value] = connection.ops.adapt_datetimefield_value(value)
+        return adapted[value]
+
+    sql = f"""
+        INSERT INTO {table} (client_id, number, first_seen, last_seen, call_count, total_duration, latest_status)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (client_id, number) DO UPDATE SET
+            call_count = {table}.call_count + excluded.call_count,
+            total_duration = {table}.total_duration + excluded.total_duration,
+            first_seen = {least}({table}.first_seen, excluded.first_seen),
+            last_seen = {greatest}({table}.last_seen, excluded.last_seen),
+            latest_status = CASE WHEN excluded.last_seen >= {table}.last_seen
+                THEN excluded.latest_status ELSE {table}.latest_status END
+    """
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, [
+            (client_id, number, adapt(first_seen), adapt(last_seen), call_count, total_duration, status)
+            for client_id, number, first_seen, last_seen, call_count, total_duration, status in rows
+        ])
+
+
+def leads_for(caller):
+    """
+    The caller's leads, matched the same way caller_number() keyed them
+    """
+    return Lead.objects.filter(client_id=caller.client_id).filter(
+        Q(customer_e164=caller.number) | Q(customer_e164__isnull=True, customer_number=caller.number)
+    )
+
+
+def summarize(client):
+    """
+    Unique and repeat caller counts from the client's caller rows
+    """
+    row = Caller.objects.filter(client=client).aggregate(
+        unique_callers=Count('id'),
+        repeat_callers=Count('id', filter=Q(call_count__gt=1)),
+        repeat_calls=Sum('call_count', filter=Q(call_count__gt=1)),
+    )
+    return {field: value or 0 for field, value in row.items()}
+
+
+def top_repeat_callers(client, limit=5):
+    return list(
+        Caller.objects.filter(client=client, call_count__gt=1)
+        .order_by('-call_count', '-last_seen')
+        .values('number', 'call_count', 'total_duration', 'last_seen', 'latest_status')[:limit]
+    )
+
+
+def compute_callers(leads_queryset):
+    """
+    Build caller rows in memory from raw leads, keyed by (client_id, number)
+    """
+    callers = {}
+    leads = leads_queryset.only(
+        'client_id', 'customer_number', 'customer_e164', 'status', 'call_duration', 'call_timestamp', 'created_at'
+    ).order_by()
+    for lead in leads.iterator(chunk_size=2000):
+        key, seen_at, call_duration, status = contribution(lead)
+        row = callers.get(key)
+        if row is None:
+            callers[key] = {
+                'first_seen': seen_at, 'last_seen': seen_at, 'call_count': 1,
+                'total_duration': call_duration, 'latest_status': status,
+            }
+            continue
+        row['call_count'] += 1
+        row['total_duration'] += call_duration
+        row['first_seen'] = min(row['first_seen'], seen_at)
+        if seen_at >= row['last_seen']:
+            row['last_seen'] = seen_at
+            row['latest_status'] = status
+    return callers
+
+
+def rebuild(client_ids, alias=None):
+    """
+    Recompute the clients' rows from their leads, on their shards or on `alias`
+    """
+    count = 0
+    groups = {alias: list(client_ids)} if alias else shards.group(client_ids)
+    for alias, shard_client_ids in groups.items():
+        with shards.using(alias):
+            count += _rebuild(shard_client_ids)
+    return count
+
+
+def _rebuild(client_ids):
+    with transaction.atomic(using=shards.db()):
+        changes.hold_writes(client_ids)
+        callers = compute_callers(Lead.objects.filter(client_id__in=client_ids))
+        Caller.objects.filter(client_id__in=client_ids).delete()
+        Caller.objects.bulk_create(
+            [
+                Caller(client_id=client_id, number=number, **values)
+                for (client_id, number), values in callers.items()
+            ],
+            batch_size=500,
+        )
+    return len(callers)
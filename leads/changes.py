@@ -0,0 +1,167 @@
+import base64
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import Count, F, Max
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from .models import Lead, LeadChangeSequence, LeadTombstone
+from .pagination import InvalidCursor
+from . import shards
+
+
+FEED_PAGE_SIZE = 500
+FEED_MAX_PAGE_SIZE = 2000
+
+
+class ResyncRequired(Exception):
+    """
+    The cursor is older than the oldest tombstone still kept, so deletes
+    after it may have been pruned
+    """
+
+
+def next_seqs(client_id, count=1):
+    """
+    Reserve `count` consecutive change sequence numbers for a client and
+    return the first. Must run inside the transaction that writes the rows
+    they number: the counter row stays locked until that transaction ends,
+    so a client's sequence numbers commit in order.
+    """
+    if not transaction.get_connection(shards.db()).in_atomic_block:
+        raise transaction.TransactionManagementError(
+            'next_seqs() must run inside the transaction writing the sequenced rows'
+        )
+    with transaction.atomic(using=shards.db()):
+        updated = LeadChangeSequence.objects.filter(client_id=client_id).update(last_seq=F('last_seq') + count)
+        if not updated:
+            LeadChangeSequence.objects.get_or_create(client_id=client_id)
+            LeadChangeSequence.objects.filter(client_id=client_id).update(last_seq=F('last_seq') + count)
+        last_seq = LeadChangeSequence.objects.filter(client_id=client_id).values_list('last_seq', flat=True).get()
+    return last_seq - count + 1
+
+
+def hold_writes(client_ids):
+    """
+    Lock the clients' counter rows until the current transaction ends. Every
+    lead write reserves a seq from them, so writes wait (and ones already
+    under way finish) while the caller reads and replaces derived rows.
+    """
+    list(
+        LeadChangeSequence.objects.select_for_update().filter(client_id__in=client_ids)
+        .values_list('client_id', flat=True)
+    )
+
+
+def stamp(leads_by_client):
+    """
+    Give every lead in {client_id: [leads]} a fresh change_seq, for write
+    paths that bypass Lead.save()
+    """
+    for client_id, leads in leads_by_client.items():
+        if not leads:
+            continue
+        first_seq = next_seqs(client_id, len(leads))
+        for offset, lead in enumerate(leads):
+            lead.change_seq = first_seq + offset
+
+
+def delete_leads(leads):
+    """
+    Delete the leads in a queryset on the current shard, tombstoning them
+    first with one INSERT ... SELECT per client. Returns the number deleted.
+    Lead has no delete signal receivers, so deletes (including cascades
+    from a client) stay fast deletes; paths that want the deletes in the
+    change feed go through here or record_delete().
+    """
+    alias = shards.db()
+    connection = connections[alias]
+    quote = connection.ops.quote_name
+    tombstone_table = quote(LeadTombstone._meta.db_table)
+    lead_table = quote(Lead._meta.db_table)
+    deleted_at = connection.ops.adapt_datetimefield_value(timezone.now())
+    leads = leads.using(alias)
+    with transaction.atomic(using=alias):
+        counts = dict(leads.order_by().values('client_id').annotate(count=Count('id')).values_list('client_id', 'count'))
+        hold_writes(counts)
+        # Counted again under the lock, so the reserved seqs cover every row.
+        counts = dict(leads.order_by().values('client_id').annotate(count=Count('id')).values_list('client_id', 'count'))
+        for client_id, count in counts.items():
+            first_seq = next_seqs(client_id, count)
+            ids_sql, ids_params = leads.filter(client_id=client_id).order_by().values('id').query.get_compiler(alias).as_sql()
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'INSERT INTO {tombstone_table} (client_id, lead_id, call_sid, change_seq, deleted_at) '
+                    f'SELECT client_id, id, call_sid, %s + ROW_NUMBER() OVER (ORDER BY id) - 1, %s '
+                    f'FROM {lead_table} WHERE id IN ({ids_sql})',
+                    [first_seq, deleted_at, *ids_params],
+                )
+        return leads.delete()[0]
+
+
+def record_delete(lead):
+    """
+    Tombstone one lead; call in the transaction that deletes it
+    """
+    LeadTombstone.objects.create(
+        client_id=lead.client_id,
+        lead_id=lead.id,
+        call_sid=lead.call_sid,
+        change_seq=next_seqs(lead.client_id),
+    )
+
+
+def prune_tombstones(before):
+    """
+    Delete tombstones recorded before `before` on every shard. Each client's
+    pruned_seq moves up to the highest seq deleted, in the same transaction,
+    so read_feed can turn away cursors that would miss those deletes.
+    Returns the number of tombstones deleted.
+    """
+    deleted = 0
+    for alias in settings.LEAD_SHARDS:
+        with shards.using(alias), transaction.atomic(using=alias):
+            old = LeadTombstone.objects.filter(deleted_at__lt=before)
+            for client_id, seq in old.values('client_id').annotate(seq=Max('change_seq')).values_list('client_id', 'seq'):
+                LeadChangeSequence.objects.filter(client_id=client_id).update(pruned_seq=Greatest(F('pruned_seq'), seq))
+            deleted += old.delete()[0]
+    return deleted
+
+
+def encode_since(seq):
+    return base64.urlsafe_b64encode(f'seq:{seq}'.encode()).decode()
+
+
+def decode_since(value):
+    if not value:
+        return 0
+    try:
+        prefix, seq = base64.urlsafe_b64decode(value.encode()).decode().split(':')
+        seq = int(seq)
+    except (ValueError, UnicodeError):
+        raise InvalidCursor(value)
+    if prefix != 'seq' or seq < 0:
+        raise InvalidCursor(value)
+    return seq
+
+
+def read_feed(client, since, limit=FEED_PAGE_SIZE):
+    """
+    Up to `limit` changes after sequence number `since`, oldest first, as
+    ('upsert', seq, lead) and ('delete', seq, tombstone) tuples, plus whether
+    more are waiting. Both reads are range scans on a (client, change_seq) index.
+    Raises ResyncRequired when tombstones after a non-zero `since` were pruned.
+    """
+    leads = Lead.objects.filter(client=client, change_seq__gt=since).order_by('change_seq')[:limit + 1]
+    tombstones = LeadTombstone.objects.filter(client=client, change_seq__gt=since).order_by('change_seq')[:limit + 1]
+    entries = sorted(
+        [('upsert', lead.change_seq, lead) for lead in leads]
+        + [('delete', tombstone.change_seq, tombstone) for tombstone in tombstones],
+        key=lambda entry: entry[1],
+    )
+    # Checked after the reads: a prune that removed tombstones they missed
+    # has committed its pruned_seq by now.
+    if since:
+        pruned_seq = LeadChangeSequence.objects.filter(client=client).values_list('pruned_seq', flat=True).first()
+        if since < (pruned_seq or 0):
+            raise ResyncRequired(since)
+    return entries[:limit], len(entries) > limit
@@ -0,0 +1,61 @@
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from .models import Client
+
+
+class ClientTokenCache:
+    """
+    Bounded LRU of webhook_token -> Client with a TTL. Unknown tokens are
+    cached as None so repeated bad requests don't reach the database.
+    """
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        found, client = self._lookup(token)
+        if not found:
+            client = Client.objects.filter(webhook_token=token).first()
+            self._store(token, client)
+        return client
+
+    async def aget(self, token):
+        found, client = self._lookup(token)
+        if not found:
+            client = await Client.objects.filter(webhook_token=token).afirst()
+            self._store(token, client)
+        return client
+
+    def _lookup(self, token):
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(token)
+                return True, entry[1]
+        return False, None
+
+    def _store(self, token, client):
+        with self._lock:
+            self._entries[token] = (time.monotonic() + self.ttl, client)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, token):
+        with self._lock:
+            self._entries.pop(token, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+client_cache = ClientTokenCache(
+    maxsize=getattr(settings, 'WEBHOOK_CLIENT_CACHE_SIZE', 10000),
+    ttl=getattr(settings, 'WEBHOOK_CLIENT_CACHE_TTL', 300),
+)
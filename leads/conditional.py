@@ -0,0 +1,58 @@
+import hashlib
+from django.db.models import Sum
+from django.utils.cache import get_conditional_response
+from django.utils.http import quote_etag
+from .models import LeadChangeSequence, LeadDailyRollup
+from . import analytics_cache
+
+
+def client_watermark(client):
+    """
+    (change sequence high-water mark, lead count) for a client: a primary
+    key lookup plus a sum over its rollup rows, instead of the aggregates
+    behind a response. Every lead write and delete takes a new sequence number.
+    """
+    last_seq = LeadChangeSequence.objects.filter(client=client).values_list('last_seq', flat=True).first()
+    count = LeadDailyRollup.objects.filter(client=client).aggregate(count=Sum('lead_count'))['count']
+    return last_seq or 0, count or 0
+
+
+async def aclient_watermark(client):
+    last_seq = await LeadChangeSequence.objects.filter(client=client).values_list('last_seq', flat=True).afirst()
+    count = (await LeadDailyRollup.objects.filter(client=client).aaggregate(count=Sum('lead_count')))['count']
+    return last_seq or 0, count or 0
+
+
+def validators(client, variant=''):
+    """
+    ETag for a client's data as seen through `variant` (the request path,
+    the day a rolling window ends on, ...). The analytics data version is
+    mixed in so rollup rebuilds, which take no sequence number, change it too.
+    There is no Last-Modified: a timestamp can't tell apart writes in the
+    same second, or notice deletes.
+    """
+    last_seq, count = client_watermark(client)
+    return _validators(client, analytics_cache.data_version(client.id), last_seq, count, variant)
+
+
+async def avalidators(client, variant=''):
+    last_seq, count = await aclient_watermark(client)
+    version = await analytics_cache.adata_version(client.id)
+    return _validators(client, version, last_seq, count, variant)
+
+
+def _validators(client, version, last_seq, count, variant):
+    digest = hashlib.md5(f'{client.id}|{version}|{last_seq}|{count}|{variant}'.encode()).hexdigest()
+    return quote_etag(digest)
+
+
+def not_modified(request, etag):
+    """
+    A 304 (or 412) response if the request's If-None-Match/If-Match match, else None
+    """
+    return get_conditional_response(request, etag=etag)
+
+
+def set_validators(response, etag):
+    response['ETag'] = etag
+    return response
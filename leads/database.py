@@ -0,0 +1,24 @@
+from django.conf import settings
+
+
+def configure_sqlite(sender, connection, **kwargs):
+    """
+    connection_created receiver applying settings.SQLITE_PRAGMAS to every new
+    SQLite connection. Runs on the raw sqlite3 connection so the pragmas are
+    neither logged as queries nor counted by the metrics wrapper.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    for name, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+def pragmas(connection):
+    """
+    Current values of the SQLITE_PRAGMAS on a connection, for checks and tests
+    """
+    connection.ensure_connection()
+    return {
+        name: connection.connection.execute(f'PRAGMA {name}').fetchone()[0]
+        for name in getattr(settings, 'SQLITE_PRAGMAS', {})
+    }
@@ -0,0 +1,42 @@
+import csv
+import json
+from datetime import datetime
+
+
+EXPORT_FIELDS = [
+    'id', 'call_sid', 'customer_number', 'status', 'call_timestamp', 'call_duration',
+    'recording_url', 'first_contacted_at', 'created_at', 'notes',
+]
+
+
+class Echo:
+    """
+    File-like object for csv.writer that hands each line back instead of buffering it
+    """
+
+    def write(self, value):
+        return value
+
+
+def _plain(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def export_rows(leads_queryset, chunk_size=2000):
+    return leads_queryset.order_by('call_timestamp', 'id')\
+        .values_list(*EXPORT_FIELDS)\
+        .iterator(chunk_size=chunk_size)
+
+
+def stream_csv(leads_queryset):
+    writer = csv.writer(Echo())
+    yield writer.writerow(EXPORT_FIELDS)
+    for row in export_rows(leads_queryset):
+        yield writer.writerow([_plain(value) for value in row])
+
+
+def stream_ndjson(leads_queryset):
+    for row in export_rows(leads_queryset):
+        yield json.dumps(dict(zip(EXPORT_FIELDS, map(_plain, row)))) + '\n'
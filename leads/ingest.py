@@ -0,0 +1,262 @@
+import json
+import zlib
+from collections import defaultdict
+from asgiref.sync import sync_to_async
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from .models import Lead
+from . import changes, live, phone, rollups, shards
+
+
+class InvalidCallEvent(ValueError):
+    pass
+
+
+def lead_status_for(call_status):
+    if call_status == 'completed':
+        return 'contacted'
+    return 'new'
+
+
+def parse_call_event(params):
+    """
+    Turn provider webhook parameters into Lead fields.
+    Returns None for calls we don't track (anything but incoming).
+    """
+    direction = (params.get('Direction') or '').lower()
+    if direction != 'incoming':
+        return None
+
+    call_sid = params.get('CallSid')
+    customer_number = params.get('From')
+    if not call_sid or not customer_number:
+        raise InvalidCallEvent("Missing required fields")
+    # Checked here, not left to the database: PostgreSQL would reject the
+    # whole batch, and spooled events are acknowledged before they are written.
+    for param, field in (('CallSid', 'call_sid'), ('From', 'customer_number'), ('RecordingUrl', 'recording_url')):
+        if len(params.get(param) or '') > Lead._meta.get_field(field).max_length:
+            raise InvalidCallEvent(f"{param} is too long")
+
+    try:
+        call_duration = int(params.get('DialCallDuration') or 0)
+    except (TypeError, ValueError):
+        raise InvalidCallEvent("Invalid DialCallDuration")
+
+    call_timestamp = None
+    start_time_str = params.get('StartTime')
+    if start_time_str:
+        try:
+            call_timestamp = parse_datetime(start_time_str)
+        except ValueError:
+            pass
+        # Providers usually send local times without an offset. Everything
+        # downstream compares and buckets aware datetimes.
+        if call_timestamp is not None and timezone.is_naive(call_timestamp):
+            call_timestamp = timezone.make_aware(call_timestamp, timezone.get_current_timezone())
+
+    return {
+        'call_sid': call_sid,
+        'customer_number': customer_number,
+        **phone.normalized_fields(customer_number),
+        'status': lead_status_for((params.get('CallStatus') or '').lower()),
+        'call_duration': call_duration,
+        'recording_url': params.get('RecordingUrl') or None,
+        'call_timestamp': call_timestamp,
+    }
+
+
+UPDATE_FIELDS = ['status', 'call_duration', 'recording_url', 'call_timestamp', 'updated_at', 'change_seq']
+
+
+def update_lead(lead, event):
+    """
+    Apply a repeated event for an existing call. Missing recording URLs and
+    start times keep what the first event recorded.
+    """
+    lead.status = event['status']
+    lead.call_duration = event['call_duration']
+    if event['recording_url']:
+        lead.recording_url = event['recording_url']
+    if event['call_timestamp']:
+        lead.call_timestamp = event['call_timestamp']
+    # bulk_update doesn't run auto_now.
+    lead.updated_at = timezone.now()
+
+
+def record_call(client, event):
+    """
+    Insert or update the lead for (client, CallSid). The unique constraint
+    arbitrates concurrent retries: the loser of the INSERT race updates the
+    winner's row under a row lock instead of creating a duplicate.
+    """
+    # The shard comes from the directory rather than `client`, which may be a
+    # webhook cache entry from before rebalance_shards moved the client.
+    with shards.for_client_id(client.id) as alias, transaction.atomic(using=alias):
+        try:
+            with transaction.atomic(using=alias):
+                lead = Lead.objects.create(
+                    client=client,
+                    **{**event, 'call_timestamp': event['call_timestamp'] or timezone.now()}
+                )
+        except IntegrityError:
+            lead = Lead.objects.select_for_update().get(client=client, call_sid=event['call_sid'])
+            before = rollups.contribution(lead)
+            update_lead(lead, event)
+            lead.save(update_fields=UPDATE_FIELDS)
+            rollups.apply_change(before, rollups.contribution(lead))
+            return lead, False
+
+        rollups.apply_change(None, rollups.contribution(lead))
+        live.publish_leads(client.id, [lead])
+    return lead, True
+
+
+async def arecord_call(client, event):
+    """
+    record_call for async views. The insert-or-update and its rollup change
+    must share a transaction, which the async ORM can't open, so the whole
+    call takes one thread hop instead of one per query.
+    """
+    return await sync_to_async(record_call)(client, event)
+
+
+def parse_event_batch(body, content_type='', content_encoding='', max_events=10000, max_bytes=10 * 1024 * 1024):
+    """
+    Decode a JSON array or NDJSON body, optionally gzip-compressed, into a
+    list of parameter dicts shaped like the webhook's query string.
+    """
+    try:
+        if content_encoding == 'gzip':
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            body = decompressor.decompress(body, max_bytes + 1)
+            if len(body) > max_bytes:
+                raise InvalidCallEvent("Decompressed batch is too large")
+            if not decompressor.eof or decompressor.unused_data:
+                raise InvalidCallEvent("Truncated or trailing gzip data")
+        text = body.decode('utf-8')
+        if 'ndjson' in content_type or not text.lstrip().startswith('['):
+            items = [json.loads(line) for line in text.splitlines() if line.strip()]
+        else:
+            items = json.loads(text)
+    except (zlib.error, UnicodeDecodeError, json.JSONDecodeError):
+        raise InvalidCallEvent("Malformed batch body")
+
+    if not isinstance(items, list):
+        raise InvalidCallEvent("Batch must be a JSON array or NDJSON")
+    if len(items) > max_events:
+        raise InvalidCallEvent(f"Batch exceeds {max_events} events")
+    return [event_params(item) if isinstance(item, dict) else None for item in items]
+
+
+def event_params(item):
+    """
+    Stringify a decoded JSON event so parse_call_event sees query-string values
+    """
+    return {key: '' if value is None else str(value) for key, value in item.items()}
+
+
+def record_calls(items, batch_size=500):
+    """
+    Bulk version of record_call for (client_id, event, received_at) items in
+    arrival order. received_at stands in for a missing StartTime. Returns one
+    created flag per item; repeats of a CallSid within the batch count as updates.
+    Items for clients on different shards are written in one transaction per shard.
+    """
+    items = list(items)
+    created_flags = [None] * len(items)
+    for alias, positions in shards.partition(client_id for client_id, _, _ in items).items():
+        with shards.using(alias):
+            try:
+                flags = _record_calls([items[position] for position in positions], batch_size)
+            except IntegrityError:
+                # A concurrent writer inserted one of our CallSids after we looked;
+                # the second pass sees it and updates instead.
+                flags = _record_calls([items[position] for position in positions], batch_size)
+        for position, created in zip(positions, flags):
+            created_flags[position] = created
+    return created_flags
+
+
+def _record_calls(items, batch_size):
+    sids_by_client = defaultdict(set)
+    for client_id, event, _ in items:
+        sids_by_client[client_id].add(event['call_sid'])
+
+    with transaction.atomic(using=shards.db()):
+        leads = {}
+        for client_id, sids in sids_by_client.items():
+            sids = list(sids)
+            for start in range(0, len(sids), batch_size):
+                existing = Lead.objects.select_for_update().filter(
+                    client_id=client_id, call_sid__in=sids[start:start + batch_size]
+                )
+                for lead in existing:
+                    leads[(client_id, lead.call_sid)] = lead
+        before = {key: rollups.contribution(lead) for key, lead in leads.items()}
+
+        created_flags = []
+        new_leads = []
+        for client_id, event, received_at in items:
+            key = (client_id, event['call_sid'])
+            lead = leads.get(key)
+            if lead is None:
+                lead = Lead(client_id=client_id, **{**event, 'call_timestamp': event['call_timestamp'] or received_at})
+                leads[key] = lead
+                new_leads.append(lead)
+                created_flags.append(True)
+            else:
+                update_lead(lead, event)
+                created_flags.append(False)
+
+        touched = defaultdict(list)
+        for (client_id, _), lead in leads.items():
+            touched[client_id].append(lead)
+        changes.stamp(touched)
+        Lead.objects.bulk_create(new_leads, batch_size=batch_size)
+        Lead.objects.bulk_update([leads[key] for key in before], UPDATE_FIELDS, batch_size=batch_size)
+        rollups.apply_changes(
+            (before.get(key), rollups.contribution(lead)) for key, lead in leads.items()
+        )
+        new_by_client = defaultdict(list)
+        for lead in new_leads:
+            new_by_client[lead.client_id].append(lead)
+        for client_id, client_leads in new_by_client.items():
+            live.publish_leads(client_id, client_leads)
+    return created_flags
+
+
+def import_calls(client_id, events, default_timestamp, batch_size=2000):
+    """
+    Insert historical calls for one client in a single transaction, skipping
+    CallSids the client already has (or that repeat within `events`).
+    Returns the number of leads inserted.
+    """
+    with shards.for_client_id(client_id):
+        return _import_calls(client_id, events, default_timestamp, batch_size)
+
+
+def _import_calls(client_id, events, default_timestamp, batch_size):
+    tz = timezone.get_current_timezone()
+    with transaction.atomic(using=shards.db()):
+        sids = list({event['call_sid'] for event in events})
+        seen = set()
+        for start in range(0, len(sids), batch_size):
+            seen.update(
+                Lead.objects.filter(client_id=client_id, call_sid__in=sids[start:start + batch_size])
+                .values_list('call_sid', flat=True)
+            )
+
+        leads = []
+        for event in events:
+            if event['call_sid'] not in seen:
+                seen.add(event['call_sid'])
+                leads.append(Lead(
+                    client_id=client_id, **{**event, 'call_timestamp': event['call_timestamp'] or default_timestamp}
+                ))
+        if not leads:
+            return 0
+        changes.stamp({client_id: leads})
+        Lead.objects.bulk_create(leads, batch_size=batch_size)
+        rollups.apply_changes((None, rollups.contribution(lead, tz)) for lead in leads)
+    return len(leads)
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+from collections import defaultdict
+from django.conf import settings
+from django.db import transaction
+from . import shards
+
+
+class LeadBroker:
+    """
+    In-process fan-out of live dashboard events per client. publish() may be
+    called from any thread; each subscriber is an asyncio.Queue read on its
+    own event loop, so an idle stream costs a queue, not a thread.
+    """
+
+    def __init__(self, queue_size):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, client_id):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(self.queue_size))
+        with self._lock:
+            self._subscribers[client_id].add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, client_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(client_id)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[client_id]
+
+    def has_subscribers(self, client_id):
+        return client_id in self._subscribers
+
+    def publish(self, client_id, event, data):
+        with self._lock:
+            subscribers = list(self._subscribers.get(client_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, (event, data))
+            except RuntimeError:
+                # The subscriber's loop has closed; it unsubscribes on its way out.
+                pass
+
+
+def _offer(queue, message):
+    try:
+        queue.put_nowait(message)
+    except asyncio.QueueFull:
+        # A reader this far behind can't patch its way back; make it reload.
+        while not queue.empty():
+            queue.get_nowait()
+        queue.put_nowait(('resync', {}))
+
+
+broker = LeadBroker(queue_size=getattr(settings, 'LIVE_STREAM_QUEUE_SIZE', 100))
+
+
+def lead_payload(lead):
+    return {
+        'id': lead.id,
+        'customer_number': lead.customer_number,
+        'status': lead.status,
+        'status_display': lead.get_status_display(),
+        'call_duration': lead.call_duration,
+        'call_timestamp': lead.call_timestamp.isoformat() if lead.call_timestamp else None,
+        'recording_url': lead.recording_url,
+    }
+
+
+def publish_leads(client_id, leads):
+    """
+    Push newly created leads to the client's open dashboards once the write commits
+    """
+    if broker.has_subscribers(client_id):
+        payloads = [lead_payload(lead) for lead in leads]
+        transaction.on_commit(
+            lambda: [broker.publish(client_id, 'lead', payload) for payload in payloads], using=shards.db()
+        )
+
+
+def publish_rollup_deltas(deltas):
+    """
+    Push {(client_id, day): {counter: delta}} to open dashboards once the write commits
+    """
+    by_client = defaultdict(list)
+    for (client_id, day), values in deltas.items():
+        if broker.has_subscribers(client_id):
+            by_client[client_id].append({'day': day.isoformat(), 'label': day.strftime('%b %d'), **values})
+    if by_client:
+        transaction.on_commit(lambda: [
+            broker.publish(client_id, 'kpis', {'days': days}) for client_id, days in by_client.items()
+        ], using=shards.db())
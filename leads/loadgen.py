@@ -0,0 +1,126 @@
+import itertools
+import math
+import random
+import uuid
+from datetime import timedelta
+from django.contrib.auth.models import User
+from django.utils import timezone
+from .models import Client
+from . import ingest, phone, shards
+
+# Relative call volume per local hour: quiet nights, a late-morning peak and a
+# smaller late-afternoon one.
+HOUR_WEIGHTS = [
+    1, 1, 1, 1, 1, 2, 4, 8, 14, 20, 24, 22,
+    16, 14, 16, 19, 20, 16, 11, 8, 5, 3, 2, 1,
+]
+
+# Status mix for answered and missed calls
+ANSWERED_STATUSES = (['new', 'contacted', 'converted', 'lost'], [20, 45, 20, 15])
+MISSED_STATUSES = (['new', 'lost'], [80, 20])
+
+SEED_USER_PREFIX = 'loadtest-'
+
+NOTE_PHRASES = [
+    'Asked for a price quote', 'Wants a refund for a damaged delivery', 'Requested a callback after 5pm',
+    'Interested in the annual plan', 'Complaint about late installation', 'Booked a site visit',
+    'Needs warranty details', 'Asked about bulk order discounts', 'Follow up with invoice copy',
+    'Wrong number', 'Comparing with a competitor offer', 'Wants a product demo',
+]
+
+
+def call_duration(rng, missed_rate):
+    """
+    0 for a missed call, otherwise log-normal around a minute, capped at an hour
+    """
+    if rng.random() < missed_rate:
+        return 0
+    return max(1, min(3600, int(rng.lognormvariate(math.log(60), 1.0))))
+
+
+def call_time(rng, now, days):
+    day = now - timedelta(days=rng.randrange(days))
+    hour = rng.choices(range(24), weights=HOUR_WEIGHTS)[0]
+    timestamp = day.replace(hour=hour, minute=rng.randrange(60), second=rng.randrange(60), microsecond=0)
+    return timestamp - timedelta(days=1) if timestamp > now else timestamp
+
+
+def generate_events(count, days=90, repeat_rate=0.3, missed_rate=0.25, rng=None, now=None, sid_prefix='seed'):
+    """
+    Yield `count` lead events shaped like ingest.parse_call_event output,
+    for ingest.import_calls. About `repeat_rate` of calls come from a number
+    already used, favouring recent callers the way repeat business does.
+    """
+    rng = rng or random.Random()
+    tz = timezone.get_current_timezone()
+    now = timezone.localtime(now or timezone.now(), tz)
+    numbers = []
+    for index in range(count):
+        if numbers and rng.random() < repeat_rate:
+            number = numbers[-1 - min(len(numbers) - 1, int(rng.expovariate(1 / 50)))]
+        else:
+            number = f'+91{rng.choice("6789")}{rng.randrange(10 ** 9):09d}'
+            numbers.append(number)
+        duration = call_duration(rng, missed_rate)
+        statuses, weights = ANSWERED_STATUSES if duration else MISSED_STATUSES
+        yield {
+            'call_sid': f'{sid_prefix}-{index}',
+            'customer_number': number,
+            **phone.normalized_fields(number),
+            'status': rng.choices(statuses, weights=weights)[0],
+            'call_duration': duration,
+            'recording_url': f'https://recordings.example.com/{sid_prefix}-{index}.mp3' if duration else None,
+            'call_timestamp': call_time(rng, now, days),
+        }
+
+
+def sample_notes(call_sids, notes_rate=0.2, rng=None):
+    """
+    {call_sid: phrase} giving about `notes_rate` of the calls a rep's note
+    """
+    rng = rng or random.Random()
+    return {call_sid: rng.choice(NOTE_PHRASES) for call_sid in call_sids if rng.random() < notes_rate}
+
+
+def seed_client(client_id, count, rng=None, days=90, repeat_rate=0.3, missed_rate=0.25, notes_rate=0.2,
+                chunk_size=50000, sid_prefix='seed'):
+    """
+    Bulk-insert `count` generated leads for a client, notes included, through
+    ingest.import_calls, so rollups, callers and the change feed are
+    maintained as for a real import. Returns the number of leads inserted.
+    """
+    rng = rng or random.Random()
+    events = generate_events(count, days, repeat_rate, missed_rate, rng, sid_prefix=f'{sid_prefix}-{client_id}')
+    inserted = 0
+    while True:
+        chunk = list(itertools.islice(events, chunk_size))
+        if not chunk:
+            return inserted
+        notes = sample_notes([event['call_sid'] for event in chunk], notes_rate, rng)
+        for event in chunk:
+            event['notes'] = notes.get(event['call_sid'])
+        inserted += ingest.import_calls(client_id, chunk, timezone.now())
+
+
+def create_clients(count):
+    """
+    `count` throwaway users and clients, all with usernames starting with SEED_USER_PREFIX
+    """
+    run_id = uuid.uuid4().hex[:6]
+    users = User.objects.bulk_create([
+        User(username=f'{SEED_USER_PREFIX}{run_id}-{index}') for index in range(count)
+    ])
+    if users and users[0].pk is None:
+        users = list(User.objects.filter(username__startswith=f'{SEED_USER_PREFIX}{run_id}-').order_by('id'))
+    clients = [
+        Client(user=user, business_name=f'Load Test {run_id} {index}', virtual_number=f'+0{run_id}{index:06d}')
+        for index, user in enumerate(users)
+    ]
+    # bulk_create skips the signals that place new clients on a shard.
+    for client in clients:
+        client.shard = shards.hash_shard(client.webhook_token)
+    clients = Client.objects.bulk_create(clients)
+    if clients and clients[0].pk is None:
+        clients = list(Client.objects.filter(user__in=users).order_by('id'))
+    shards.ensure_stubs(clients)
+    return clients
@@ -0,0 +1,125 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import uuid
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client as TestClient
+from leads.models import Client
+from leads import benchmark
+
+# (entry point, ASYNC_VIEWS) combinations compared by default
+MODES = [('wsgi', False), ('asgi', False), ('asgi', True)]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the webhook and analytics endpoints through the WSGI and ASGI entry points'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--endpoint',
+            choices=['webhook', 'analytics'],
+            action='append',
+            help='Endpoint to drive; repeat for several (default: both)',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=2000,
+            help='Requests per run (default: 2000)',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=32,
+            help='Requests in flight at once (default: 32)',
+        )
+        parser.add_argument(
+            '--output',
+            help='Also write the results as JSON to this file',
+        )
+        # Internal: set when the command re-runs itself as one benchmark worker.
+        parser.add_argument('--worker', help=argparse.SUPPRESS)
+        parser.add_argument('--token', help=argparse.SUPPRESS)
+        parser.add_argument('--session', help=argparse.SUPPRESS)
+
+    def handle(self, *args, **options):
+        if options['worker']:
+            self.run_worker(options)
+            return
+
+        user = User.objects.create_user(username=f'benchmark-{uuid.uuid4().hex[:12]}')
+        client = Client.objects.create(
+            user=user, business_name='Benchmark', virtual_number=f'+0-{uuid.uuid4().hex[:12]}'
+        )
+        test_client = TestClient()
+        test_client.force_login(user)
+        session = test_client.cookies[settings.SESSION_COOKIE_NAME].value
+
+        results = []
+        try:
+            for endpoint in options['endpoint'] or ['webhook', 'analytics']:
+                for entrypoint, async_views in MODES:
+                    result = self.spawn_worker(endpoint, entrypoint, async_views, client, session, options)
+                    results.append(result)
+                    self.stdout.write(
+                        f"{endpoint:<10} {entrypoint} {'async' if async_views else 'sync '} views: "
+                        f"{result['requests_per_second']:>8.1f} req/s  p50 {result['p50_ms']:.2f}ms  "
+                        f"p99 {result['p99_ms']:.2f}ms  errors {result['errors']}"
+                    )
+        finally:
+            client.delete()
+            user.delete()
+
+        report = {'requests': options['requests'], 'concurrency': options['concurrency'], 'results': results}
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+
+    def spawn_worker(self, endpoint, entrypoint, async_views, client, session, options):
+        # Each run gets a fresh process so ASYNC_VIEWS can pick the URL routing.
+        command = [
+            sys.executable, '-m', 'django', 'benchmark_entrypoints',
+            '--worker', f'{endpoint}:{entrypoint}',
+            '--requests', str(options['requests']),
+            '--concurrency', str(options['concurrency']),
+            '--token', str(client.webhook_token),
+            '--session', session,
+        ]
+        env = {
+            **os.environ,
+            'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE,
+            'ASYNC_VIEWS': 'True' if async_views else 'False',
+        }
+        completed = subprocess.run(command, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+        if completed.returncode:
+            raise CommandError(f'{endpoint} {entrypoint} run failed:\n{completed.stderr}')
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        return {'endpoint': endpoint, 'entrypoint': entrypoint, 'async_views': async_views, **result}
+
+    def run_worker(self, options):
+        endpoint, entrypoint = options['worker'].split(':')
+        headers = {'host': settings.ALLOWED_HOSTS[-1] if settings.ALLOWED_HOSTS else 'localhost'}
+        if endpoint == 'webhook':
+            run_id = uuid.uuid4().hex[:8]
+            requests = [
+                ('GET', f"/webhook/{options['token']}/",
+                 f'CallSid=bench-{run_id}-{index}&From=%2B919988776655&CallStatus=completed'
+                 f'&Direction=incoming&DialCallDuration={index % 400}', headers, b'')
+                for index in range(options['requests'])
+            ]
+        else:
+            headers['cookie'] = f"{settings.SESSION_COOKIE_NAME}={options['session']}"
+            requests = [('GET', '/analytics/', '', headers, b'')] * options['requests']
+
+        if entrypoint == 'wsgi':
+            from lead_catcher_project.wsgi import application
+            result = benchmark.drive_wsgi(application, requests, options['concurrency'])
+        else:
+            from lead_catcher_project.asgi import application
+            result = benchmark.drive_asgi(application, requests, options['concurrency'])
+        self.stdout.write(json.dumps(result))
@@ -0,0 +1,177 @@
+import json
+import platform
+import random
+import subprocess
+import time
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, reset_queries
+from django.test import Client as TestClient
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from leads import analytics_cache, benchmark, loadgen
+
+
+class Command(BaseCommand):
+    help = 'Seed a throwaway client at growing sizes and measure ingest and dashboard endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='1000,10000,50000',
+            help='Comma-separated lead counts to measure at (default: 1000,10000,50000)',
+        )
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=20,
+            help='Timed requests per endpoint and cache state (default: 20)',
+        )
+        parser.add_argument(
+            '--webhook-requests',
+            type=int,
+            default=500,
+            help='Webhook calls per size (default: 500)',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=4,
+            help='Webhook calls in flight at once (default: 4)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Random seed for the generated leads (default: 0)',
+        )
+        parser.add_argument(
+            '--output',
+            help='Write the results as JSON to this file',
+        )
+        parser.add_argument(
+            '--compare',
+            help='Earlier --output file to print changes against',
+        )
+
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted(int(size) for size in options['sizes'].split(','))
+        except ValueError:
+            raise CommandError('--sizes must be comma-separated integers')
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+
+        client = loadgen.create_clients(1)[0]
+        user = client.user
+        rng = random.Random(options['seed'])
+        results = []
+        try:
+            seeded = 0
+            for size in sizes:
+                started = time.perf_counter()
+                seeded += loadgen.seed_client(client.id, size - seeded, rng, sid_prefix=f'bench{seeded}')
+                seed_seconds = time.perf_counter() - started
+                result = {
+                    'leads': size,
+                    'seed_seconds': round(seed_seconds, 3),
+                    'webhook': self.measure_webhook(client, size, options),
+                    'endpoints': self.measure_endpoints(client, user, options['requests']),
+                }
+                results.append(result)
+                self.print_result(result)
+        finally:
+            user.delete()
+
+        report = {
+            'commit': git_commit(),
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'options': {key: options[key] for key in ['requests', 'webhook_requests', 'concurrency', 'seed']},
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}"))
+        if baseline:
+            self.print_comparison(baseline, report)
+
+    def measure_webhook(self, client, size, options):
+        from lead_catcher_project.wsgi import application
+
+        host = settings.ALLOWED_HOSTS[-1] if settings.ALLOWED_HOSTS else 'localhost'
+        path = reverse('call-webhook', kwargs={'token': client.webhook_token})
+        requests = [
+            ('GET', path,
+             f'CallSid=bench-hook-{size}-{index}&From=%2B9199{index % 1000:08d}&CallStatus=completed'
+             f'&Direction=incoming&DialCallDuration={index % 400}', {'host': host}, b'')
+            for index in range(options['webhook_requests'])
+        ]
+        result = benchmark.drive_wsgi(application, requests, options['concurrency'])
+
+        reset_queries()
+        with CaptureQueriesContext(connection) as captured:
+            TestClient(HTTP_HOST=host).get(path, {
+                'CallSid': f'bench-count-{size}', 'From': '+919988776655',
+                'CallStatus': 'completed', 'Direction': 'incoming',
+            })
+        return {**result, 'queries': len(captured)}
+
+    def measure_endpoints(self, client, user, repeats):
+        host = settings.ALLOWED_HOSTS[-1] if settings.ALLOWED_HOSTS else 'localhost'
+        session_client = TestClient(HTTP_HOST=host)
+        session_client.force_login(user)
+        token, _ = Token.objects.get_or_create(user=user)
+        token_client = TestClient(HTTP_HOST=host, HTTP_AUTHORIZATION=f'Token {token.key}')
+
+        endpoints = {
+            'dashboard': lambda: session_client.get('/dashboard/'),
+            'analytics': lambda: session_client.get('/analytics/'),
+            'leads': lambda: token_client.get(reverse('lead-list')),
+        }
+        measurements = {}
+        for name, send in endpoints.items():
+            measurements[name] = {
+                # Bumping the data version makes every request miss the analytics cache.
+                'cold': benchmark.time_requests(send, repeats, lambda: analytics_cache.bump_versions([client.id])),
+                'warm': benchmark.time_requests(send, repeats),
+            }
+        return measurements
+
+    def print_result(self, result):
+        webhook = result['webhook']
+        self.stdout.write(
+            f"{result['leads']:>8} leads  webhook {webhook['requests_per_second']:>7.1f} req/s  "
+            f"p50 {webhook['p50_ms']:.2f}ms  p99 {webhook['p99_ms']:.2f}ms  "
+            f"{webhook['queries']} queries  errors {webhook['errors']}"
+        )
+        for endpoint, modes in result['endpoints'].items():
+            for mode, measurement in modes.items():
+                self.stdout.write(
+                    f"{'':>8}        {endpoint:<9} {mode:<4}  p50 {measurement['p50_ms']:>8.2f}ms  "
+                    f"p99 {measurement['p99_ms']:>8.2f}ms  {measurement['queries']} queries"
+                )
+
+    def print_comparison(self, baseline, report):
+        self.stdout.write(f"Compared with {baseline.get('commit') or 'baseline'}:")
+        for label, metric, before, after in benchmark.compare_reports(baseline, report):
+            change = f'{(after - before) / before * 100:+.0f}%' if before else 'n/a'
+            self.stdout.write(f'  {label:<28} {metric:<7} {before:>10} -> {after:<10} {change}')
+
+
+def git_commit():
+    try:
+        completed = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True
+        )
+    except OSError:
+        return None
+    return completed.stdout.strip() or None
@@ -0,0 +1,47 @@
+import time
+from django.core.management.base import BaseCommand
+from leads import spool
+
+class Command(BaseCommand):
+    help = 'Write spooled webhook events to the database in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Events written per transaction (default: 500)',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=1.0,
+            help='Seconds to sleep when the spool is empty (default: 1.0)',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Exit once the spool is empty instead of waiting for more events',
+        )
+
+    def handle(self, *args, **options):
+        webhook_spool = spool.get_spool()
+        batch_size = options['batch_size']
+        total = 0
+        
+        while True:
+            started = time.monotonic()
+            count = spool.drain(webhook_spool, batch_size)
+            if count:
+                total += count
+                elapsed = time.monotonic() - started
+                self.stdout.write(f'Wrote {count} events in {elapsed:.3f}s ({total} total)')
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+        
+        self.stdout.write(self.style.SUCCESS(f'Spool drained: {total} events written'))
+        dead = webhook_spool.dead_count()
+        if dead:
+            self.stdout.write(self.style.WARNING(f'{dead} events could not be written; see dead_events in the spool'))
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from leads.models import Client
+from leads import provisioning
 
 class Command(BaseCommand):
     help = 'Display webhook URLs for all clients'
@@ -16,34 +17,42 @@ class Command(BaseCommand):
             default='http://127.0.0.1:8000',
             help='Domain to use in webhook URL (default: http://127.0.0.1:8000)',
         )
+        parser.add_argument(
+            '--format',
+            choices=['text', 'csv', 'json'],
+            default='text',
+            help='Output format (default: text)',
+        )
 
     def handle(self, *args, **options):
         domain = options['domain']
         client_id = options.get('client_id')
-        
+
+        clients = Client.objects.select_related('user').order_by('id')
         if client_id:
-            try:
-                client = Client.objects.get(id=client_id)
-                clients = [client]
-            except Client.DoesNotExist:
+            clients = clients.filter(id=client_id)
+            if not clients.exists():
                 self.stdout.write(
                     self.style.ERROR(f'Client with ID {client_id} does not exist')
                 )
                 return
-        else:
-            clients = Client.objects.all()
-        
-        if not clients:
+        elif not clients.exists():
             self.stdout.write(self.style.WARNING('No clients found'))
             return
-            
+
+        rows = provisioning.webhook_rows(clients.iterator(chunk_size=2000), domain)
+        if options['format'] != 'text':
+            self.stdout.ending = ''
+            write = provisioning.write_json if options['format'] == 'json' else provisioning.write_csv
+            write(rows, self.stdout)
+            return
+
         self.stdout.write(self.style.SUCCESS('Webhook URLs:'))
         self.stdout.write('-' * 80)
-        
-        for client in clients:
-            webhook_url = f"{domain}/webhook/{client.webhook_token}/"
-            self.stdout.write(f"Client ID: {client.id}")
-            self.stdout.write(f"Business: {client.business_name}")
-            self.stdout.write(f"User: {client.user.username if client.user else 'No user'}")
-            self.stdout.write(f"Webhook URL: {webhook_url}")
+
+        for row in rows:
+            self.stdout.write(f"Client ID: {row['client_id']}")
+            self.stdout.write(f"Business: {row['business_name']}")
+            self.stdout.write(f"User: {row['username'] or 'No user'}")
+            self.stdout.write(f"Webhook URL: {row['webhook_url']}")
             self.stdout.write('-' * 80)
@@ -0,0 +1,121 @@
+import csv
+import gzip
+import json
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from leads.models import Client
+from leads import ingest
+
+class Command(BaseCommand):
+    help = 'Import a provider call-log export (CSV or NDJSON) as leads for a client'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='Call-log file to import; .gz files are decompressed, "-" reads stdin',
+        )
+        parser.add_argument(
+            '--client-id',
+            type=int,
+            required=True,
+            help='Client ID the calls belong to',
+        )
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'ndjson'],
+            help='Input format (default: guessed from the file extension)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Rows per bulk_create call (default: 2000)',
+        )
+        parser.add_argument(
+            '--transaction-size',
+            type=int,
+            default=50000,
+            help='Rows per transaction (default: 50000)',
+        )
+
+    def handle(self, *args, **options):
+        client_id = options['client_id']
+        if not Client.objects.filter(id=client_id).exists():
+            raise CommandError(f'Client with ID {client_id} does not exist')
+        
+        path = options['path']
+        input_format = options['format'] or ('ndjson' if '.ndjson' in path or '.jsonl' in path else 'csv')
+        
+        if path == '-':
+            stream = sys.stdin
+        elif path.endswith('.gz'):
+            stream = gzip.open(path, 'rt', newline='', encoding='utf-8')
+        else:
+            stream = open(path, newline='', encoding='utf-8')
+        
+        try:
+            self.import_rows(client_id, self.read_rows(stream, input_format), options)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+    def read_rows(self, stream, input_format):
+        if input_format == 'csv':
+            for row in csv.DictReader(stream):
+                # DictReader pads rows with too few columns with None.
+                yield None if None in row.values() else row
+            return
+        for line in stream:
+            if line.strip():
+                try:
+                    item = json.loads(line)
+                except ValueError:
+                    yield None
+                    continue
+                yield ingest.event_params(item) if isinstance(item, dict) else None
+
+    def import_rows(self, client_id, rows, options):
+        transaction_size = options['transaction_size']
+        default_timestamp = timezone.now()
+        started = time.monotonic()
+        read = inserted = filtered = rejected = 0
+        events = []
+        
+        def flush():
+            nonlocal inserted
+            inserted += ingest.import_calls(client_id, events, default_timestamp, options['batch_size'])
+            events.clear()
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f'{read} rows read, {inserted} inserted, {filtered} filtered, {rejected} rejected '
+                f'({read / elapsed if elapsed else 0:,.0f} rows/s)'
+            )
+        
+        for params in rows:
+            read += 1
+            if params is None:
+                rejected += 1
+                continue
+            try:
+                event = ingest.parse_call_event(params)
+            except ingest.InvalidCallEvent:
+                rejected += 1
+                continue
+            if event is None:
+                filtered += 1
+                continue
+            events.append(event)
+            if len(events) >= transaction_size:
+                flush()
+        
+        if events:
+            flush()
+        
+        skipped = read - inserted - filtered - rejected
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {inserted} leads ({skipped} duplicates skipped, {filtered} filtered, '
+            f'{rejected} rejected) in {elapsed:.1f}s'
+        ))
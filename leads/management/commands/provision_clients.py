@@ -0,0 +1,97 @@
+import contextlib
+import csv
+import gzip
+import shutil
+import sys
+import tempfile
+import time
+from django.core.management.base import BaseCommand, CommandError
+from leads import provisioning
+
+
+class Command(BaseCommand):
+    help = 'Create users and clients in bulk from a CSV and write out their webhook URLs'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            help='CSV with username and business_name columns, and optionally email, password and '
+                 'virtual_number; .gz files are decompressed, "-" reads stdin',
+        )
+        parser.add_argument(
+            '--domain',
+            type=str,
+            default='http://127.0.0.1:8000',
+            help='Domain to use in webhook URLs (default: http://127.0.0.1:8000)',
+        )
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'json'],
+            default='csv',
+            help='Format of the webhook URLs written to stdout (default: csv)',
+        )
+        parser.add_argument(
+            '--number-prefix',
+            help='Number clients without a virtual_number from this prefix (default: VIRTUAL_NUMBER_PREFIX)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Clients created per transaction (default: 500)',
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        spool = None
+        if path == '-':
+            # The file is read twice, once to check it and once to write it,
+            # and stdin can only be read once.
+            spool = tempfile.TemporaryFile('w+', newline='', encoding='utf-8')
+            shutil.copyfileobj(sys.stdin, spool)
+
+        def open_stream():
+            if spool is not None:
+                spool.seek(0)
+                return contextlib.nullcontext(spool)
+            if path.endswith('.gz'):
+                return gzip.open(path, 'rt', newline='', encoding='utf-8')
+            return open(path, newline='', encoding='utf-8')
+
+        def read_rows():
+            with open_stream() as stream:
+                reader = csv.DictReader(stream)
+                missing = {'username', 'business_name'} - set(reader.fieldnames or [])
+                if missing:
+                    raise CommandError(f"CSV is missing the {', '.join(sorted(missing))} column(s)")
+                yield from reader
+
+        try:
+            self.provision(read_rows, options)
+        finally:
+            if spool is not None:
+                spool.close()
+
+    def provision(self, read_rows, options):
+        started = time.monotonic()
+        created = 0
+        clients = provisioning.provision(
+            read_rows, options['batch_size'], provisioning.number_allocator(options['number_prefix']),
+        )
+
+        def counted(clients):
+            nonlocal created
+            for client in clients:
+                created += 1
+                yield client
+
+        # The URLs go to stdout as they are created, with nothing else mixed in.
+        self.stdout.ending = ''
+        write = provisioning.write_json if options['format'] == 'json' else provisioning.write_csv
+        try:
+            write(provisioning.webhook_rows(counted(clients), options['domain']), self.stdout)
+        except provisioning.ProvisioningError as error:
+            raise CommandError(f'{error} ({created} clients were created before this batch)')
+
+        elapsed = time.monotonic() - started
+        self.stderr.write(self.style.SUCCESS(f'Provisioned {created} clients in {elapsed:.1f}s'))
@@ -0,0 +1,20 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from leads import changes
+
+class Command(BaseCommand):
+    help = 'Delete change feed tombstones older than the retention period'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.CHANGE_FEED_TOMBSTONE_RETENTION_DAYS,
+            help='Keep tombstones this many days (default: CHANGE_FEED_TOMBSTONE_RETENTION_DAYS)',
+        )
+
+    def handle(self, *args, **options):
+        count = changes.prune_tombstones(timezone.now() - timedelta(days=options['days']))
+        self.stdout.write(self.style.SUCCESS(f"Pruned {count} tombstones older than {options['days']} days"))
@@ -0,0 +1,72 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from leads.models import Client
+from leads import rebalance, shards
+
+
+class Command(BaseCommand):
+    help = "Move clients' leads to the shard LEAD_SHARDS now assigns them, or one client to a given shard"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--client-id',
+            type=int,
+            help='Only move this client',
+        )
+        parser.add_argument(
+            '--to',
+            help='Shard alias to move --client-id to (default: the one hashing assigns)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Leads copied or deleted per transaction (default: 2000)',
+        )
+        parser.add_argument(
+            '--settle',
+            type=float,
+            default=5,
+            help='Seconds to wait after switching a client before the catch-up copy (default: 5)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='List the moves without making them',
+        )
+
+    def handle(self, *args, **options):
+        if options['to'] and not options['client_id']:
+            raise CommandError('--to needs --client-id')
+        if options['to'] and options['to'] not in settings.LEAD_SHARDS:
+            raise CommandError(f"Unknown shard {options['to']}; LEAD_SHARDS is {', '.join(settings.LEAD_SHARDS)}")
+
+        clients = Client.objects.order_by('id')
+        if options['client_id']:
+            clients = clients.filter(id=options['client_id'])
+            if not clients.exists():
+                raise CommandError(f"Client with ID {options['client_id']} does not exist")
+        if options['to']:
+            client = clients.get()
+            moves = [(client, shards.alias_for(client), options['to'])]
+        else:
+            moves = list(rebalance.plan(clients))
+
+        moved = 0
+        for client, source, target in moves:
+            if source == target:
+                continue
+            if options['dry_run']:
+                self.stdout.write(f'Would move client {client.id} from {source} to {target}')
+                continue
+            started = time.perf_counter()
+            count = rebalance.move_client(client, target, batch_size=options['batch_size'], settle=options['settle'])
+            moved += 1
+            self.stdout.write(
+                f'Moved client {client.id} from {source} to {target}: '
+                f'{count} leads in {time.perf_counter() - started:.1f}s'
+            )
+
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'Moved {moved} clients'))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+from leads.models import Client
+from leads import callers, rollups
+
+class Command(BaseCommand):
+    help = 'Rebuild daily lead rollups and callers from raw leads, or verify the rollups'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--client-id',
+            type=int,
+            help='Only rebuild or verify rollups for this client ID',
+        )
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Compare stored rollups with raw leads without writing anything',
+        )
+
+    def handle(self, *args, **options):
+        client_id = options.get('client_id')
+        
+        if client_id:
+            if not Client.objects.filter(id=client_id).exists():
+                raise CommandError(f'Client with ID {client_id} does not exist')
+            client_ids = [client_id]
+        else:
+            client_ids = list(Client.objects.values_list('id', flat=True))
+        
+        if options['verify']:
+            mismatches = rollups.verify(client_ids)
+            for client, day in mismatches:
+                self.stdout.write(self.style.ERROR(f'Client {client} on {day}: rollup does not match leads'))
+            if mismatches:
+                raise CommandError(f'{len(mismatches)} rollup rows out of date')
+            self.stdout.write(self.style.SUCCESS(f'Rollups verified for {len(client_ids)} clients'))
+            return
+        
+        count = rollups.rebuild(client_ids)
+        caller_count = callers.rebuild(client_ids)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {count} rollup rows and {caller_count} callers for {len(client_ids)} clients'
+        ))
@@ -0,0 +1,101 @@
+import random
+import time
+import uuid
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from leads.models import Client
+from leads import loadgen
+
+
+class Command(BaseCommand):
+    help = 'Seed synthetic clients and leads with realistic distributions for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--clients',
+            type=int,
+            default=1,
+            help='Clients to create (default: 1)',
+        )
+        parser.add_argument(
+            '--leads',
+            type=int,
+            default=10000,
+            help='Leads per client (default: 10000)',
+        )
+        parser.add_argument(
+            '--client-id',
+            type=int,
+            help='Add the leads to this existing client instead of creating clients',
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=90,
+            help='Spread calls over this many past days (default: 90)',
+        )
+        parser.add_argument(
+            '--repeat-rate',
+            type=float,
+            default=0.3,
+            help='Share of calls from a number that called before (default: 0.3)',
+        )
+        parser.add_argument(
+            '--missed-rate',
+            type=float,
+            default=0.25,
+            help='Share of missed calls (default: 0.25)',
+        )
+        parser.add_argument(
+            '--notes-rate',
+            type=float,
+            default=0.2,
+            help='Share of leads with a note (default: 0.2)',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            help='Random seed, for reproducible data',
+        )
+        parser.add_argument(
+            '--delete',
+            action='store_true',
+            help='Delete every client created by this command instead of seeding',
+        )
+
+    def handle(self, *args, **options):
+        if options['delete']:
+            users = User.objects.filter(username__startswith=loadgen.SEED_USER_PREFIX)
+            count = Client.objects.filter(user__in=users).count()
+            users.delete()
+            self.stdout.write(self.style.SUCCESS(f'Deleted {count} seeded clients'))
+            return
+
+        if options['client_id']:
+            if not Client.objects.filter(id=options['client_id']).exists():
+                raise CommandError(f"Client with ID {options['client_id']} does not exist")
+            client_ids = [options['client_id']]
+        else:
+            client_ids = [client.id for client in loadgen.create_clients(options['clients'])]
+
+        rng = random.Random(options['seed'])
+        run_id = uuid.uuid4().hex[:8]
+        started = time.perf_counter()
+        total = 0
+        for client_id in client_ids:
+            total += loadgen.seed_client(
+                client_id, options['leads'], rng,
+                days=options['days'],
+                repeat_rate=options['repeat_rate'],
+                missed_rate=options['missed_rate'],
+                notes_rate=options['notes_rate'],
+                sid_prefix=f'seed-{run_id}',
+            )
+            self.stdout.write(f'Seeded client {client_id}')
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {total} leads for {len(client_ids)} clients in {elapsed:.1f}s '
+            f'({total / elapsed if elapsed else 0:.0f} leads/s)'
+        ))
+
@@ -0,0 +1,32 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from leads import replica
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database over the local replica file, once or every few seconds'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            help='Keep copying, sleeping this many seconds between copies',
+        )
+
+    def handle(self, *args, **options):
+        if not settings.READ_REPLICA_ALIAS:
+            raise CommandError('No replica configured; set DATABASE_REPLICA')
+        
+        while True:
+            started = time.perf_counter()
+            try:
+                replica.copy_sqlite()
+            except ValueError as exc:
+                raise CommandError(f'{exc}; PostgreSQL replicas are kept current by replication')
+            self.stdout.write(self.style.SUCCESS(
+                f'Copied the primary to {settings.READ_REPLICA_ALIAS} in {time.perf_counter() - started:.2f}s'
+            ))
+            if not options['interval']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,171 @@
+import contextvars
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+# Anything else is reported as OTHER, so clients can't mint label values.
+HTTP_METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip([*self.buckets, '+Inf'], self.counts):
+            total += count
+            yield bound, total
+
+
+class MetricsRegistry:
+    """
+    In-process request and webhook metrics, rendered in the Prometheus text
+    format. Each worker process keeps its own; scrape every worker.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.request_seconds = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+            self.request_queries = defaultdict(lambda: Histogram(QUERY_BUCKETS))
+            self.request_sql_seconds = defaultdict(float)
+            self.responses = defaultdict(int)
+            self.webhook_events = defaultdict(int)
+
+    def observe_request(self, view, method, status, seconds, queries, sql_seconds):
+        with self._lock:
+            self.request_seconds[(view, method)].observe(seconds)
+            self.request_queries[(view, method)].observe(queries)
+            self.request_sql_seconds[(view, method)] += sql_seconds
+            self.responses[(view, method, str(status))] += 1
+
+    def count_webhook_events(self, outcomes):
+        with self._lock:
+            for outcome in outcomes:
+                self.webhook_events[outcome] += 1
+
+    def render(self):
+        with self._lock:
+            lines = []
+            _histogram(lines, 'http_request_duration_seconds', 'Request latency by view.', self.request_seconds)
+            _histogram(lines, 'http_request_db_queries', 'SQL queries per request by view.', self.request_queries)
+            _counter(lines, 'http_request_db_seconds_total', 'Time spent in SQL by view.',
+                     ('view', 'method'), self.request_sql_seconds)
+            _counter(lines, 'http_responses_total', 'Responses by view and status code.',
+                     ('view', 'method', 'status'), self.responses)
+            _counter(lines, 'webhook_events_total', 'Webhook call events by outcome.',
+                     ('outcome',), {(outcome,): count for outcome, count in self.webhook_events.items()})
+        return '\n'.join(lines) + '\n'
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    escaped = (
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in pairs
+    )
+    return '{' + ','.join(escaped) + '}'
+
+
+def _histogram(lines, name, help_text, histograms):
+    lines += [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+    for key, histogram in sorted(histograms.items()):
+        for bound, count in histogram.cumulative():
+            lines.append(f"{name}_bucket{_labels(('view', 'method'), key, [('le', bound)])} {count}")
+        lines.append(f"{name}_sum{_labels(('view', 'method'), key)} {histogram.sum}")
+        lines.append(f"{name}_count{_labels(('view', 'method'), key)} {histogram.count}")
+
+
+def _counter(lines, name, help_text, label_names, values):
+    lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+    for key, value in sorted(values.items()):
+        lines.append(f'{name}{_labels(label_names, key)} {value}')
+
+
+registry = MetricsRegistry()
+
+
+class SqlTimer:
+    __slots__ = ('queries', 'seconds')
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+
+
+# The timer of the request being handled. A context variable rather than a
+# per-thread connection.execute_wrapper() block, because async views run
+# their queries in sync_to_async threads, which inherit the context.
+_request_sql = contextvars.ContextVar('request_sql', default=None)
+
+
+def record_sql(execute, sql, params, many, context):
+    timer = _request_sql.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.queries += 1
+        timer.seconds += time.perf_counter() - started
+
+
+def install_sql_wrapper(sender, connection, **kwargs):
+    """
+    connection_created receiver adding record_sql to every connection.
+    It goes first in the list so execute_wrapper() blocks, which pop the
+    last wrapper on exit, still remove their own.
+    """
+    if record_sql not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_sql)
+
+
+def start_request():
+    """
+    Start timing a request and collecting its SQL. Returns (timer, token, started).
+    """
+    timer = SqlTimer()
+    return timer, _request_sql.set(timer), time.perf_counter()
+
+
+def stop_collecting(token):
+    _request_sql.reset(token)
+
+
+def finish_request(request, response, timer, started):
+    seconds = time.perf_counter() - started
+    match = request.resolver_match
+    view = (match.view_name or match.route) if match else 'unmatched'
+    method = request.method if request.method in HTTP_METHODS else 'OTHER'
+    registry.observe_request(view, method, response.status_code, seconds, timer.queries, timer.seconds)
+
+    threshold = settings.METRICS_SLOW_REQUEST_MS
+    if threshold and seconds * 1000 >= threshold:
+        logger.warning(
+            'Slow request %s %s (%s): %.0fms, %d queries, %.0fms in SQL',
+            request.method, request.path, view, seconds * 1000, timer.queries, timer.seconds * 1000,
+        )
+
+
+def count_webhook_events(outcomes):
+    registry.count_webhook_events(outcomes)
@@ -0,0 +1,38 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from . import metrics
+
+
+class MetricsMiddleware:
+    """
+    Records latency, SQL query count and SQL time per view (see leads.metrics).
+    Works in both sync and async stacks, so async views keep their event loop.
+    Streaming responses are timed until their headers are ready.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        timer, token, started = metrics.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.stop_collecting(token)
+        metrics.finish_request(request, response, timer, started)
+        return response
+
+    async def __acall__(self, request):
+        timer, token, started = metrics.start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.stop_collecting(token)
+        metrics.finish_request(request, response, timer, started)
+        return response
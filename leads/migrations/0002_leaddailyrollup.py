@@ -0,0 +1,56 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:05
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_rollups(apps, schema_editor):
+    from leads.rollups import compute_rollups
+
+    db = schema_editor.connection.alias
+    Client = apps.get_model('leads', 'Client')
+    Lead = apps.get_model('leads', 'Lead')
+    LeadDailyRollup = apps.get_model('leads', 'LeadDailyRollup')
+    for client_id in Client.objects.using(db).values_list('id', flat=True).iterator():
+        rollups = compute_rollups(Lead.objects.using(db).filter(client_id=client_id))
+        LeadDailyRollup.objects.using(db).bulk_create(
+            [LeadDailyRollup(client_id=client_id, day=day, **values) for (_, day), values in rollups.items()],
+            batch_size=500,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('lead_count', models.IntegerField(default=0)),
+                ('new_count', models.IntegerField(default=0)),
+                ('contacted_count', models.IntegerField(default=0)),
+                ('converted_count', models.IntegerField(default=0)),
+                ('lost_count', models.IntegerField(default=0)),
+                ('missed_calls', models.IntegerField(default=0)),
+                ('answered_calls', models.IntegerField(default=0)),
+                ('duration_0_30', models.IntegerField(default=0)),
+                ('duration_31_60', models.IntegerField(default=0)),
+                ('duration_61_120', models.IntegerField(default=0)),
+                ('duration_121_300', models.IntegerField(default=0)),
+                ('duration_301_plus', models.IntegerField(default=0)),
+                ('total_duration', models.BigIntegerField(default=0, help_text='Sum of call durations in seconds.')),
+                ('responded_count', models.IntegerField(default=0, help_text='Leads with a first_contacted_at timestamp.')),
+                ('total_response_seconds', models.FloatField(default=0)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_rollups', to='leads.client')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('client', 'day'), name='unique_client_day_rollup')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0002_leaddailyrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['client', 'call_timestamp'], name='lead_client_timestamp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['client', 'status', 'call_timestamp'], name='lead_client_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['client', 'call_duration'], name='lead_client_duration_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['client', 'customer_number', 'call_timestamp'], name='lead_client_number_ts_idx'),
+        ),
+    ]
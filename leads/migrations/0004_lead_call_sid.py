@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0003_lead_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lead',
+            name='call_sid',
+            field=models.CharField(blank=True, help_text='Provider call identifier, unique per client.', max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='lead',
+            constraint=models.UniqueConstraint(fields=('client', 'call_sid'), name='unique_client_call_sid'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0004_lead_call_sid'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lead',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, help_text='Timestamp of the last write to this lead.'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['client', 'updated_at'], name='lead_client_updated_idx'),
+        ),
+    ]
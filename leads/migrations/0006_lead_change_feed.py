@@ -0,0 +1,68 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_change_seq(apps, schema_editor):
+    Client = apps.get_model('leads', 'Client')
+    Lead = apps.get_model('leads', 'Lead')
+    LeadChangeSequence = apps.get_model('leads', 'LeadChangeSequence')
+    for client_id in Client.objects.values_list('id', flat=True).iterator():
+        leads = []
+        seq = 0
+        for lead in Lead.objects.filter(client_id=client_id).order_by('updated_at', 'id').only('id').iterator(chunk_size=2000):
+            seq += 1
+            lead.change_seq = seq
+            leads.append(lead)
+            if len(leads) >= 2000:
+                Lead.objects.bulk_update(leads, ['change_seq'])
+                leads = []
+        Lead.objects.bulk_update(leads, ['change_seq'])
+        LeadChangeSequence.objects.create(client_id=client_id, last_seq=seq)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0005_lead_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadChangeSequence',
+            fields=[
+                ('client', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='change_sequence', serialize=False, to='leads.client')),
+                ('last_seq', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='LeadTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lead_id', models.BigIntegerField()),
+                ('call_sid', models.CharField(blank=True, max_length=64, null=True)),
+                ('change_seq', models.BigIntegerField()),
+                ('deleted_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='lead',
+            name='change_seq',
+            field=models.BigIntegerField(default=0, help_text='Per-client sequence number of the last write, for delta sync.'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['client', 'change_seq'], name='lead_client_change_seq_idx'),
+        ),
+        migrations.AddField(
+            model_name='leadtombstone',
+            name='client',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lead_tombstones', to='leads.client'),
+        ),
+        migrations.AddConstraint(
+            model_name='leadtombstone',
+            constraint=models.UniqueConstraint(fields=('client', 'change_seq'), name='unique_client_tombstone_seq'),
+        ),
+        migrations.RunPython(backfill_change_seq, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:47
+
+from django.db import migrations, models, transaction
+
+
+BACKFILL_BATCH_SIZE = 2000
+
+
+def backfill_e164(apps, schema_editor):
+    # The live rule, so backfilled numbers follow the deployment's PHONE_*
+    # settings exactly as ingest and search do.
+    from leads.phone import normalized_fields
+
+    Lead = apps.get_model('leads', 'Lead')
+    last_id = 0
+    while True:
+        # Each batch commits on its own, so a large table is never locked for the whole backfill.
+        with transaction.atomic():
+            leads = list(
+                Lead.objects.filter(id__gt=last_id).order_by('id').only('id', 'customer_number')[:BACKFILL_BATCH_SIZE]
+            )
+            if not leads:
+                return
+            for lead in leads:
+                for field, value in normalized_fields(lead.customer_number).items():
+                    setattr(lead, field, value)
+            Lead.objects.bulk_update(leads, ['customer_e164', 'customer_digits_reversed'])
+        last_id = leads[-1].id
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('leads', '0006_lead_change_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lead',
+            name='customer_digits_reversed',
+            field=models.CharField(blank=True, help_text='E.164 digits reversed, for suffix search.', max_length=15, null=True),
+        ),
+        migrations.AddField(
+            model_name='lead',
+            name='customer_e164',
+            field=models.CharField(blank=True, help_text='customer_number normalized to E.164.', max_length=16, null=True),
+        ),
+        migrations.RunPython(backfill_e164, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['client', 'customer_e164'], name='lead_client_e164_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['client', 'customer_digits_reversed'], name='lead_client_digits_rev_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+from django.db import migrations
+
+
+def install_notes_fts(apps, schema_editor):
+    from leads import notes_search
+
+    notes_search.install(schema_editor.connection, rebuild=True)
+
+
+def uninstall_notes_fts(apps, schema_editor):
+    from leads import notes_search
+
+    notes_search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0007_lead_customer_e164'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_notes_fts, uninstall_notes_fts),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.4 on 2026-10-18 07:55
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_callers(apps, schema_editor):
+    from leads.callers import compute_callers
+
+    Lead = apps.get_model('leads', 'Lead')
+    Caller = apps.get_model('leads', 'Caller')
+    Client = apps.get_model('leads', 'Client')
+    for client_id in Client.objects.values_list('id', flat=True).iterator():
+        callers = compute_callers(Lead.objects.filter(client_id=client_id))
+        Caller.objects.bulk_create(
+            [Caller(client_id=client_id, number=number, **values) for (_, number), values in callers.items()],
+            batch_size=500,
+        )
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0008_lead_notes_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Caller',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.CharField(help_text="E.164 number, or the number as sent when it can't be normalized.", max_length=20)),
+                ('first_seen', models.DateTimeField()),
+                ('last_seen', models.DateTimeField()),
+                ('call_count', models.IntegerField(default=0)),
+                ('total_duration', models.BigIntegerField(default=0, help_text='Sum of call durations in seconds.')),
+                ('latest_status', models.CharField(choices=[('new', 'New'), ('contacted', 'Contacted'), ('converted', 'Converted'), ('lost', 'Lost')], default='new', help_text="Status of the caller's most recent lead.", max_length=20)),
+                ('client', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='callers', to='leads.client')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['client', 'last_seen'], name='caller_client_last_seen_idx'), models.Index(fields=['client', 'call_count'], name='caller_client_count_idx')],
+                'constraints': [models.UniqueConstraint(fields=('client', 'number'), name='unique_client_caller')],
+            },
+        ),
+        migrations.RunPython(backfill_callers, migrations.RunPython.noop),
+    ]
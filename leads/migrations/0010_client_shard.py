@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0009_caller'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='client',
+            name='shard',
+            field=models.CharField(blank=True, default='', help_text="Database alias holding this client's leads; blank means the default database.", max_length=64),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 08:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0010_client_shard'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['call_timestamp'], name='lead_call_timestamp_idx'),
+        ),
+    ]
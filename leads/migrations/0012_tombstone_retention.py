@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0011_lead_call_timestamp_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='leadchangesequence',
+            name='pruned_seq',
+            field=models.BigIntegerField(default=0, help_text='Highest change_seq of the tombstones pruned so far.'),
+        ),
+        migrations.AddIndex(
+            model_name='leadtombstone',
+            index=models.Index(fields=['deleted_at'], name='tombstone_deleted_at_idx'),
+        ),
+    ]
@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import models, router, transaction
 from django.contrib.auth.models import User
 import uuid 
 
@@ -8,6 +8,7 @@ class Client(models.Model):
     webhook_token = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     virtual_number = models.CharField(max_length=20, unique=True, help_text="The virtual number assigned to this client")
     created_at = models.DateTimeField(auto_now_add=True)
+    shard = models.CharField(max_length=64, blank=True, default='', help_text="Database alias holding this client's leads; blank means the default database.")
 
     def __str__(self):
         return self.business_name
@@ -21,7 +22,10 @@ class Lead(models.Model):
         ('lost', 'Lost'),
     ]
     client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='leads')
+    call_sid = models.CharField(max_length=64, blank=True, null=True, help_text="Provider call identifier, unique per client.")
     customer_number = models.CharField(max_length=20)
+    customer_e164 = models.CharField(max_length=16, blank=True, null=True, help_text="customer_number normalized to E.164.")
+    customer_digits_reversed = models.CharField(max_length=15, blank=True, null=True, help_text="E.164 digits reversed, for suffix search.")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='new')
     notes = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True, help_text="Timestamp from our server when the lead was created.")
@@ -29,6 +33,117 @@ class Lead(models.Model):
     call_duration = models.IntegerField(default=0, help_text="Duration of the call in seconds.")
     recording_url = models.URLField(max_length=512, blank=True, null=True)
     first_contacted_at = models.DateTimeField(blank=True, null=True, help_text="Timestamp when status was first changed to 'Contacted'.")
+    updated_at = models.DateTimeField(auto_now=True, help_text="Timestamp of the last write to this lead.")
+    change_seq = models.BigIntegerField(default=0, help_text="Per-client sequence number of the last write, for delta sync.")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['client', 'updated_at'], name='lead_client_updated_idx'),
+            models.Index(fields=['client', 'change_seq'], name='lead_client_change_seq_idx'),
+            models.Index(fields=['client', 'customer_e164'], name='lead_client_e164_idx'),
+            models.Index(fields=['client', 'customer_digits_reversed'], name='lead_client_digits_rev_idx'),
+            models.Index(fields=['client', 'call_timestamp'], name='lead_client_timestamp_idx'),
+            models.Index(fields=['client', 'status', 'call_timestamp'], name='lead_client_status_idx'),
+            models.Index(fields=['client', 'call_duration'], name='lead_client_duration_idx'),
+            models.Index(fields=['client', 'customer_number', 'call_timestamp'], name='lead_client_number_ts_idx'),
+            models.Index(fields=['call_timestamp'], name='lead_call_timestamp_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['client', 'call_sid'], name='unique_client_call_sid'),
+        ]
+
+    def __str__(self):
+        return f"Lead from {self.customer_number} for {self.client.business_name}"
+
+    def save(self, *args, using=None, **kwargs):
+        # The change_seq reserved in pre_save must commit with the row it
+        # numbers, or a later seq can become visible first and pollers skip it.
+        using = using or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, using=using, **kwargs)
+
+
+class Caller(models.Model):
+    """
+    One row per distinct caller of a client, maintained alongside the daily
+    rollups on every lead write so repeat-caller questions never scan leads.
+    """
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='callers')
+    number = models.CharField(max_length=20, help_text="E.164 number, or the number as sent when it can't be normalized.")
+    first_seen = models.DateTimeField()
+    last_seen = models.DateTimeField()
+    call_count = models.IntegerField(default=0)
+    total_duration = models.BigIntegerField(default=0, help_text="Sum of call durations in seconds.")
+    latest_status = models.CharField(max_length=20, choices=Lead.STATUS_CHOICES, default='new', help_text="Status of the caller's most recent lead.")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['client', 'last_seen'], name='caller_client_last_seen_idx'),
+            models.Index(fields=['client', 'call_count'], name='caller_client_count_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['client', 'number'], name='unique_client_caller'),
+        ]
+
+    def __str__(self):
+        return f"{self.number} for {self.client_id}"
+
+
+class LeadDailyRollup(models.Model):
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='daily_rollups')
+    day = models.DateField()
+    lead_count = models.IntegerField(default=0)
+    new_count = models.IntegerField(default=0)
+    contacted_count = models.IntegerField(default=0)
+    converted_count = models.IntegerField(default=0)
+    lost_count = models.IntegerField(default=0)
+    missed_calls = models.IntegerField(default=0)
+    answered_calls = models.IntegerField(default=0)
+    duration_0_30 = models.IntegerField(default=0)
+    duration_31_60 = models.IntegerField(default=0)
+    duration_61_120 = models.IntegerField(default=0)
+    duration_121_300 = models.IntegerField(default=0)
+    duration_301_plus = models.IntegerField(default=0)
+    total_duration = models.BigIntegerField(default=0, help_text="Sum of call durations in seconds.")
+    responded_count = models.IntegerField(default=0, help_text="Leads with a first_contacted_at timestamp.")
+    total_response_seconds = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['client', 'day'], name='unique_client_day_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.client_id} on {self.day}"
+
+
+class LeadChangeSequence(models.Model):
+    """
+    Per-client counter behind Lead.change_seq. Writers increment it inside
+    their transaction, so the row lock orders a client's changes by commit.
+    """
+    client = models.OneToOneField(Client, on_delete=models.CASCADE, primary_key=True, related_name='change_sequence')
+    last_seq = models.BigIntegerField(default=0)
+    pruned_seq = models.BigIntegerField(default=0, help_text="Highest change_seq of the tombstones pruned so far.")
+
+    def __str__(self):
+        return f"{self.client_id} at {self.last_seq}"
+
+
+class LeadTombstone(models.Model):
+    client = models.ForeignKey(Client, on_delete=models.CASCADE, related_name='lead_tombstones')
+    lead_id = models.BigIntegerField()
+    call_sid = models.CharField(max_length=64, blank=True, null=True)
+    change_seq = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['deleted_at'], name='tombstone_deleted_at_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['client', 'change_seq'], name='unique_client_tombstone_seq'),
+        ]
 
     def __str__(self):
-        return f"Lead from {self.customer_number} for {self.client.business_name}"
\ No newline at end of file
+        return f"Deleted lead {self.lead_id} for {self.client_id}"
@@ -0,0 +1,143 @@
+import functools
+import re
+from django.db import OperationalError, connections, router
+from django.db.models import FloatField, Q
+from django.db.models.expressions import RawSQL
+from .models import Lead
+
+
+FTS_TABLE = 'leads_lead_notes_fts'
+TERM = re.compile(r'\w+')
+
+# An external-content FTS5 index over leads_lead (client_id, notes). Indexing
+# client_id lets a query scope itself to one client inside the index.
+# The triggers cover every write path, including bulk_update and raw inserts;
+# they fire only when notes or client_id change.
+INSTALL_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        client_id, notes,
+        content='leads_lead', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON leads_lead BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, client_id, notes) VALUES (new.id, new.client_id, new.notes);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON leads_lead BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, client_id, notes)
+        VALUES ('delete', old.id, old.client_id, old.notes);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF notes, client_id ON leads_lead BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, client_id, notes)
+        VALUES ('delete', old.id, old.client_id, old.notes);
+        INSERT INTO {FTS_TABLE}(rowid, client_id, notes) VALUES (new.id, new.client_id, new.notes);
+    END
+    """,
+]
+
+UNINSTALL_SQL = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+
+def install(connection, rebuild=False):
+    """
+    Create the notes index and its triggers if missing. Returns False where
+    SQLite was built without FTS5 (or the database isn't SQLite).
+    """
+    if connection.vendor != 'sqlite':
+        return False
+    try:
+        with connection.cursor() as cursor:
+            for sql in INSTALL_SQL:
+                cursor.execute(sql)
+            if rebuild:
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    except OperationalError:
+        return False
+    available.cache_clear()
+    return True
+
+
+def uninstall(connection):
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            for sql in UNINSTALL_SQL:
+                cursor.execute(sql)
+    available.cache_clear()
+
+
+def reinstall_triggers(using='default', **kwargs):
+    """
+    post_migrate hook: SQLite migrations that rebuild leads_lead drop its
+    triggers along with the old table, so put them back.
+    """
+    connection = connections[using]
+    if available(using, connection.settings_dict['NAME']):
+        install(connection)
+
+
+@functools.lru_cache(maxsize=None)
+def available(alias, name):
+    connection = connections[alias]
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+        return cursor.fetchone() is not None
+
+
+def _uses_fts(using):
+    return available(using, connections[using].settings_dict['NAME'])
+
+
+def match_expression(client_id, terms):
+    # Every term is quoted, so user input can't inject FTS5 syntax, and
+    # prefix-matched, so partial words still find notes while typing.
+    phrases = ' '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+    return f'client_id:"{client_id}" AND notes:({phrases})'
+
+
+def filter_q(client_id, q, using=None):
+    """
+    Q for a client's leads whose notes contain every word in `q`, or None
+    when `q` has no words. Without FTS5 this degrades to one icontains per word.
+    """
+    terms = TERM.findall(q or '')
+    if not terms:
+        return None
+    using = using or router.db_for_read(Lead)
+    if not _uses_fts(using):
+        condition = Q()
+        for term in terms:
+            condition &= Q(notes__icontains=term)
+        return condition
+    return Q(id__in=RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match_expression(client_id, terms)]
+    ))
+
+
+def rank(queryset, client_id, q):
+    """
+    Annotate `search_rank` (BM25 over notes; lower is more relevant) on a
+    queryset already narrowed by filter_q. Without FTS5 the queryset is
+    returned as is and keeps its newest-first order.
+    """
+    terms = TERM.findall(q or '')
+    if not terms or not _uses_fts(queryset.db):
+        return queryset
+    return queryset.annotate(search_rank=RawSQL(
+        f'SELECT bm25({FTS_TABLE}, 0.0, 1.0) FROM {FTS_TABLE} '
+        f'WHERE {FTS_TABLE} MATCH %s AND rowid = {Lead._meta.db_table}.id',
+        [match_expression(client_id, terms)],
+        output_field=FloatField(),
+    ))
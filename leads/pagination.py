@@ -0,0 +1,168 @@
+import base64
+from collections import OrderedDict
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import F, Max, Q
+from django.utils.functional import cached_property
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+LEAD_ORDERING = (F('call_timestamp').desc(nulls_last=True), F('id').desc())
+RANKED_ORDERING = (F('search_rank').asc(), F('id').desc())
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(lead):
+    timestamp = lead.call_timestamp.isoformat() if lead.call_timestamp else ''
+    return base64.urlsafe_b64encode(f'{timestamp}|{lead.id}'.encode()).decode()
+
+
+def decode_cursor(value):
+    try:
+        timestamp, lead_id = base64.urlsafe_b64decode(value.encode()).decode().split('|')
+        position = (parse_datetime(timestamp) if timestamp else None, int(lead_id))
+    except (ValueError, UnicodeError):
+        raise InvalidCursor(value)
+    if timestamp and position[0] is None:
+        raise InvalidCursor(value)
+    return position
+
+
+def encode_rank_cursor(lead):
+    return base64.urlsafe_b64encode(f'{lead.search_rank!r}|{lead.id}'.encode()).decode()
+
+
+def decode_rank_cursor(value):
+    try:
+        search_rank, lead_id = base64.urlsafe_b64decode(value.encode()).decode().split('|')
+        return float(search_rank), int(lead_id)
+    except (ValueError, UnicodeError):
+        raise InvalidCursor(value)
+
+
+def ranked_page(queryset, cursor, page_size):
+    """
+    keyset_page for search results annotated with `search_rank`, best match first
+    """
+    queryset = queryset.order_by(*RANKED_ORDERING)
+    if cursor:
+        search_rank, lead_id = decode_rank_cursor(cursor)
+        queryset = queryset.filter(Q(search_rank__gt=search_rank) | Q(search_rank=search_rank, id__lt=lead_id))
+    rows = list(queryset[:page_size + 1])
+    next_cursor = encode_rank_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
+
+
+def keyset_page(queryset, cursor, page_size):
+    """
+    The page of leads after `cursor` in newest-first (call_timestamp, id) order,
+    plus the cursor for the following page or None. Seeks on the index
+    instead of counting or offsetting past earlier rows.
+    """
+    if 'search_rank' in queryset.query.annotations:
+        return ranked_page(queryset, cursor, page_size)
+    queryset = queryset.order_by(*LEAD_ORDERING)
+    if cursor:
+        timestamp, lead_id = decode_cursor(cursor)
+        if timestamp is None:
+            queryset = queryset.filter(call_timestamp__isnull=True, id__lt=lead_id)
+        else:
+            queryset = queryset.filter(
+                Q(call_timestamp__lt=timestamp)
+                | Q(call_timestamp=timestamp, id__lt=lead_id)
+                | Q(call_timestamp__isnull=True)
+            )
+    rows = list(queryset[:page_size + 1])
+    next_cursor = encode_cursor(rows[page_size - 1]) if len(rows) > page_size else None
+    return rows[:page_size], next_cursor
+
+
+class LeadCursorPagination(BasePagination):
+    page_size = 50
+    max_page_size = 200
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            return self.page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        try:
+            page, self.next_cursor = keyset_page(
+                queryset, request.query_params.get(self.cursor_query_param), self.get_page_size(request)
+            )
+        except InvalidCursor:
+            raise NotFound('Invalid cursor')
+        return page
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class CallerCursorPagination(CursorPagination):
+    ordering = ('-last_seen', '-id')
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = 'page_size'
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Admin paginator that estimates the size of unfiltered querysets over
+    big tables instead of counting them: from the planner's statistics on
+    PostgreSQL, from the highest id on SQLite (deleted rows still count).
+    Filtered querysets, and tables estimated below
+    ADMIN_ESTIMATED_COUNT_THRESHOLD rows, are counted exactly.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset)
+            if estimate is not None and estimate > settings.ADMIN_ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+def estimated_count(queryset):
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+        # -1 until the table is first analyzed.
+        return int(row[0]) if row and row[0] >= 0 else None
+    return queryset.model._default_manager.using(queryset.db).aggregate(high=Max('pk'))['high'] or 0
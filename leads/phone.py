@@ -0,0 +1,68 @@
+import re
+from django.conf import settings
+from django.db.models import Q
+
+
+NON_DIGITS = re.compile(r'\D')
+
+
+def normalize_e164(number, country_code=None, national_length=None):
+    """
+    Best-effort E.164 form of a caller number as providers send it
+    (+91…, 0091…, 0…, 91… or a bare national number).
+    Returns None when the digits can't be a phone number.
+    """
+    country_code = country_code or settings.PHONE_DEFAULT_COUNTRY_CODE
+    national_length = national_length or settings.PHONE_NATIONAL_NUMBER_LENGTH
+    number = (number or '').strip()
+    digits = NON_DIGITS.sub('', number)
+
+    if number.startswith('+'):
+        pass
+    elif digits.startswith('00'):
+        digits = digits[2:]
+    elif digits.startswith('0') and len(digits) == national_length + 1:
+        digits = country_code + digits[1:]
+    elif len(digits) == national_length:
+        digits = country_code + digits
+
+    if not 8 <= len(digits) <= 15:
+        return None
+    return '+' + digits
+
+
+def reversed_digits(e164):
+    return e164[:0:-1] if e164 else None
+
+
+def normalized_fields(number):
+    e164 = normalize_e164(number)
+    return {'customer_e164': e164, 'customer_digits_reversed': reversed_digits(e164)}
+
+
+def _starts_with(field, prefix):
+    # A half-open range instead of LIKE, so every backend can seek the index.
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': prefix[:-1] + chr(ord(prefix[-1]) + 1)})
+
+
+def search_q(term):
+    """
+    Q matching leads whose number starts or ends with the digits in `term`.
+    A complete number in any provider format matches its E.164 form exactly.
+    """
+    digits = NON_DIGITS.sub('', term or '')
+    if not digits:
+        return Q(customer_number__icontains=term)
+
+    e164 = normalize_e164(term)
+    if e164 and (term.strip().startswith('+') or len(digits) >= settings.PHONE_NATIONAL_NUMBER_LENGTH):
+        return Q(customer_e164=e164)
+
+    country_code = settings.PHONE_DEFAULT_COUNTRY_CODE
+    prefixes = {'+' + digits, '+' + country_code + digits}
+    if digits.startswith('0'):
+        prefixes.add('+' + country_code + digits[1:])
+    query = _starts_with('customer_digits_reversed', digits[::-1])
+    for prefix in prefixes:
+        query |= _starts_with('customer_e164', prefix)
+    return query
@@ -0,0 +1,208 @@
+import csv
+import json
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+from django.db.models.functions import Length
+from .models import Client
+from . import shards
+
+
+WEBHOOK_URL_FIELDS = ['client_id', 'business_name', 'username', 'virtual_number', 'webhook_url']
+
+
+class ProvisioningError(ValueError):
+    pass
+
+
+def webhook_url(domain, client):
+    return f"{domain.rstrip('/')}/webhook/{client.webhook_token}/"
+
+
+def webhook_rows(clients, domain):
+    """
+    WEBHOOK_URL_FIELDS dicts for clients with their users loaded
+    """
+    for client in clients:
+        yield {
+            'client_id': client.id,
+            'business_name': client.business_name,
+            'username': client.user.username if client.user else '',
+            'virtual_number': client.virtual_number,
+            'webhook_url': webhook_url(domain, client),
+        }
+
+
+def write_csv(rows, stream):
+    writer = csv.DictWriter(stream, fieldnames=WEBHOOK_URL_FIELDS)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow(row)
+
+
+def write_json(rows, stream):
+    """
+    A JSON array written one element at a time, so it never sits in memory whole
+    """
+    stream.write('[')
+    for index, row in enumerate(rows):
+        stream.write((',\n' if index else '\n') + json.dumps(row))
+    stream.write('\n]\n')
+
+
+def number_allocator(prefix=None):
+    """
+    Unused virtual numbers: `prefix` followed by a zero-padded counter,
+    making full-length numbers in PHONE_DEFAULT_COUNTRY_CODE, counting up
+    from the highest one already assigned. One query however many numbers
+    are taken; the unique constraint still catches concurrent runs.
+    """
+    prefix = prefix or settings.VIRTUAL_NUMBER_PREFIX
+    length = 1 + len(settings.PHONE_DEFAULT_COUNTRY_CODE) + settings.PHONE_NATIONAL_NUMBER_LENGTH
+    width = length - len(prefix)
+    if width <= 0:
+        raise ProvisioningError(f'Prefix {prefix} leaves no digits for a {length}-character number')
+    highest = (
+        Client.objects.annotate(number_length=Length('virtual_number'))
+        .filter(virtual_number__startswith=prefix, number_length=length)
+        .aggregate(highest=Max('virtual_number'))['highest']
+    )
+    start = int(highest[len(prefix):]) + 1 if highest and highest[len(prefix):].isdigit() else 0
+    for counter in range(start, 10 ** width):
+        yield f'{prefix}{counter:0{width}d}'
+    raise ProvisioningError(f'No virtual numbers left under {prefix}')
+
+
+def provision(read_rows, batch_size=500, numbers=None):
+    """
+    Create a user and a client for each row of a provisioning CSV (username,
+    business_name, and optional email, password and virtual_number), in one
+    transaction per batch_size rows. `read_rows` returns a fresh iterator over
+    the rows each time it is called: the file is read once to check it and
+    again to write it, so it never sits in memory whole. Yields the clients as
+    their batch commits. A bad row anywhere creates nobody, and allocated
+    numbers skip every number the file asks for. Rows without a password get
+    an unusable one, which skips the deliberately slow password hashing;
+    those users set theirs by reset.
+    """
+    numbers = numbers if numbers is not None else number_allocator()
+    explicit = _validate(read_rows(), batch_size)
+    batch = []
+    for line_row in enumerate(read_rows(), 2):  # Line numbers, after the header.
+        batch.append(line_row)
+        if len(batch) == batch_size:
+            yield from _provision_batch(batch, numbers, explicit)
+            batch = []
+    if batch:
+        yield from _provision_batch(batch, numbers, explicit)
+
+
+def _validate(rows, batch_size):
+    """
+    Raise ProvisioningError listing every problem in `rows`; returns the
+    virtual numbers they ask for. Only the usernames and numbers are kept,
+    and they are checked against the database batch_size at a time.
+    """
+    problems = []
+    usernames, explicit = set(), set()
+    pending = {'username': [], 'virtual_number': []}
+
+    def check(field, force=False):
+        values = pending[field]
+        if values and (force or len(values) >= batch_size):
+            queryset, message = (
+                (User.objects, 'username {} already exists') if field == 'username'
+                else (Client.objects, 'virtual number {} is already assigned')
+            )
+            taken = queryset.filter(**{f'{field}__in': values}).values_list(field, flat=True)
+            problems.extend(message.format(value) for value in sorted(taken))
+            values.clear()
+
+    for line, row in enumerate(rows, 2):
+        username, number = (row.get('username') or '').strip(), (row.get('virtual_number') or '').strip()
+        if not username or not (row.get('business_name') or '').strip():
+            problems.append(f'line {line}: username and business_name are required')
+        elif username in usernames:
+            problems.append(f'line {line}: username {username} appears twice')
+        elif username:
+            pending['username'].append(username)
+        if number in explicit:
+            problems.append(f'line {line}: virtual number {number} appears twice')
+        elif number:
+            pending['virtual_number'].append(number)
+        usernames.add(username)
+        if number:
+            explicit.add(number)
+        check('username')
+        check('virtual_number')
+    check('username', force=True)
+    check('virtual_number', force=True)
+    if problems:
+        raise ProvisioningError('; '.join(problems))
+    return explicit
+
+
+def _provision_batch(batch, numbers, explicit):
+    assigned = []
+    for _, row in batch:
+        number = (row.get('virtual_number') or '').strip()
+        if not number:
+            number = next(numbers)
+            while number in explicit:
+                number = next(numbers)
+        assigned.append(number)
+    try:
+        return _create_batch(batch, assigned)
+    except IntegrityError as error:
+        # Another run took a username or number after the file was checked.
+        raise ProvisioningError(_conflicts(batch, assigned) or f'lines {batch[0][0]}-{batch[-1][0]}: {error}')
+
+
+def _conflicts(batch, assigned):
+    """
+    The rows of a failed batch whose username or virtual number is now taken
+    """
+    usernames = {row['username'].strip(): line for line, row in batch}
+    numbers = {number: line for (line, _), number in zip(batch, assigned)}
+    problems = [
+        (usernames[username], f'line {usernames[username]}: username {username} already exists')
+        for username in User.objects.filter(username__in=usernames).values_list('username', flat=True)
+    ] + [
+        (numbers[number], f'line {numbers[number]}: virtual number {number} is already assigned')
+        for number in Client.objects.filter(virtual_number__in=numbers).values_list('virtual_number', flat=True)
+    ]
+    return '; '.join(message for _, message in sorted(problems))
+
+
+def _create_batch(batch, assigned):
+    with transaction.atomic():
+        users = User.objects.bulk_create([
+            User(
+                username=row['username'].strip(),
+                email=(row.get('email') or '').strip(),
+                password=make_password(row.get('password') or None),
+            )
+            for _, row in batch
+        ])
+        if users and users[0].pk is None:
+            by_username = {
+                user.username: user
+                for user in User.objects.filter(username__in=[user.username for user in users])
+            }
+            users = [by_username[user.username] for user in users]
+        clients = []
+        for user, (_, row), number in zip(users, batch, assigned):
+            client = Client(user=user, business_name=row['business_name'].strip(), virtual_number=number)
+            # bulk_create skips the signals that place new clients on a shard.
+            client.shard = shards.hash_shard(client.webhook_token)
+            clients.append(client)
+        created = Client.objects.bulk_create(clients)
+        if created and created[0].pk is None:
+            by_user = {client.user_id: client for client in Client.objects.filter(user__in=users)}
+            created = [by_user[user.id] for user in users]
+        # Inside the transaction: clients whose stubs failed to copy would
+        # otherwise commit with nothing on their shard for leads to point at.
+        shards.ensure_stubs(created)
+    return created
@@ -0,0 +1,210 @@
+import time
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F, Max, Min
+from django.db.models.functions import Greatest
+from .models import Caller, Client, Lead, LeadChangeSequence, LeadDailyRollup, LeadTombstone
+from . import callers, changes, rollups, shards
+
+
+def plan(clients=None):
+    """
+    (client, source, target) for every client whose stored shard isn't the
+    one hash_shard() picks for it under the current LEAD_SHARDS
+    """
+    clients = Client.objects.using(DEFAULT_DB_ALIAS).order_by('id') if clients is None else clients
+    for client in clients.iterator():
+        source, target = shards.alias_for(client), shards.hash_shard(client.webhook_token)
+        if source != target:
+            yield client, source, target
+
+
+def move_client(client, target, batch_size=2000, settle=0):
+    """
+    Move a client's leads, callers, rollups and change feed to `target`.
+
+    Leads are copied in batches while the source keeps taking writes. Then,
+    with the client's writes on the source held, leads the source changed
+    since the copy started are copied again, the moved leads are restamped,
+    the target's rollups and callers are rebuilt and the directory is
+    switched, so the target takes no writes until it is complete. An upsert
+    on (client, call_sid) that only overwrites older rows makes the copies
+    safe to repeat. Leads without a call_sid are only copied once.
+
+    Writers that looked the client up before the switch can still land on
+    the source once the hold ends. After `settle` seconds those leads are
+    copied too, with fresh change_seqs.
+
+    Moved leads get new ids. Every moved lead is restamped with a fresh
+    change_seq and each old id gets a tombstone, so delta-sync consumers
+    drop the old ids and pick up the new ones from their current cursor.
+
+    Returns the number of leads copied.
+    """
+    source = shards.alias_for(client)
+    if source == target:
+        return 0
+    if target not in settings.LEAD_SHARDS:
+        raise ValueError(f'Unknown shard {target!r}')
+
+    _purge(client.id, target)  # Leftovers of an interrupted move.
+    shards.ensure_stubs([client], alias=target)
+    with shards.using(source):
+        start_seq = _last_seq(client.id)
+    leads = Lead.objects.using(source).filter(client_id=client.id)
+    copied, last_id = _copy_leads(leads, target, batch_size)
+
+    with shards.using(source), transaction.atomic(using=source):
+        LeadChangeSequence.objects.get_or_create(client_id=client.id)
+        changes.hold_writes([client.id])
+        held_seq = _last_seq(client.id)
+        late = leads.filter(change_seq__gt=start_seq).exclude(call_sid__isnull=True, id__lte=last_id)
+        late_copied, late_id = _copy_leads(late, target, batch_size)
+        last_id = max(last_id, late_id)
+        _drop_deleted(client.id, source, target, start_seq)
+        _restamp(client.id, source, target, batch_size)
+        rollups.rebuild([client.id], alias=target)
+        callers.rebuild([client.id], alias=target)
+        client.shard = target
+        client.save(update_fields=['shard'])
+
+    if settle:
+        time.sleep(settle)
+    stragglers = leads.filter(change_seq__gt=held_seq).exclude(call_sid__isnull=True, id__lte=last_id)
+    straggler_count, _ = _copy_leads(stragglers, target, batch_size, restamp=True)
+    dropped = _drop_deleted(client.id, source, target, held_seq)
+    if straggler_count or dropped:
+        rollups.rebuild([client.id])
+        callers.rebuild([client.id])
+
+    _purge(client.id, source, batch_size)
+    if source != DEFAULT_DB_ALIAS:
+        Client.objects.using(source).filter(id=client.id).delete()
+    return copied + late_copied + straggler_count
+
+
+def _last_seq(client_id):
+    return LeadChangeSequence.objects.filter(client_id=client_id).values_list('last_seq', flat=True).first() or 0
+
+
+def _copy_leads(queryset, target, batch_size, restamp=False):
+    """
+    Upsert the leads in `queryset` into `target` in id order, batch_size at
+    a time, with fresh change_seqs from the target if `restamp`. Returns
+    (count, last source id copied).
+    """
+    connection = connections[target]
+    quote = connection.ops.quote_name
+    fields = [field for field in Lead._meta.concrete_fields if not field.primary_key]
+    table, updated_at = quote(Lead._meta.db_table), quote(Lead._meta.get_field('updated_at').column)
+    conflict = ', '.join(quote(Lead._meta.get_field(name).column) for name in ('client', 'call_sid'))
+    updates = ', '.join(
+        f'{quote(field.column)} = excluded.{quote(field.column)}'
+        for field in fields if field.name not in ('client', 'call_sid', 'created_at')
+    )
+    # Raw SQL rather than bulk_create(), which would overwrite created_at and
+    # updated_at with the current time.
+    sql = (
+        f'INSERT INTO {table} ({", ".join(quote(field.column) for field in fields)}) '
+        f'VALUES ({", ".join(["%s"] * len(fields))}) '
+        f'ON CONFLICT ({conflict}) DO UPDATE SET {updates} '
+        f'WHERE {table}.{updated_at} < excluded.{updated_at}'
+    )
+
+    count, last_id = 0, 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id).order_by('id')[:batch_size])
+        if not batch:
+            return count, last_id
+        with transaction.atomic(using=target), connection.cursor() as cursor:
+            if restamp:
+                with shards.using(target):
+                    changes.stamp({batch[0].client_id: batch})
+            cursor.executemany(sql, [
+                [field.get_db_prep_save(getattr(lead, field.attname), connection) for field in fields]
+                for lead in batch
+            ])
+        count += len(batch)
+        last_id = batch[-1].id
+
+
+def _drop_deleted(client_id, source, target, start_seq):
+    """
+    Delete target copies of leads the source deleted after `start_seq`,
+    returning how many
+    """
+    deleted = set(
+        LeadTombstone.objects.using(source)
+        .filter(client_id=client_id, change_seq__gt=start_seq, call_sid__isnull=False)
+        .values_list('call_sid', flat=True)
+    )
+    deleted -= set(Lead.objects.using(source).filter(client_id=client_id, call_sid__in=deleted).values_list('call_sid', flat=True))
+    if not deleted:
+        return 0
+    # Rollups and callers are rebuilt after.
+    with shards.using(target):
+        return changes.delete_leads(Lead.objects.filter(client_id=client_id, call_sid__in=deleted))
+
+
+def _restamp(client_id, source, target, batch_size):
+    """
+    Write tombstones for the source's lead ids and copies of its tombstones,
+    then give the client's leads on `target` fresh change_seqs after them.
+    Ids are only unique per shard, so consumers must see a moved lead's old
+    id deleted before a lead reusing that id on the target. Runs before the
+    directory switch, so batches committing one by one are never seen
+    half done; the seqs are reserved up front.
+    """
+    with shards.using(target):
+        with transaction.atomic(using=target):
+            LeadChangeSequence.objects.get_or_create(client_id=client_id)
+            with shards.using(source):
+                source_seq = _last_seq(client_id)
+                source_pruned = (
+                    LeadChangeSequence.objects.filter(client_id=client_id).values_list('pruned_seq', flat=True).first()
+                    or 0
+                )
+            # Cursors the source turned away for pruned deletes stay turned away.
+            LeadChangeSequence.objects.filter(client_id=client_id).update(
+                last_seq=Greatest(F('last_seq'), source_seq), pruned_seq=Greatest(F('pruned_seq'), source_pruned),
+            )
+
+            old_leads = Lead.objects.using(source).filter(client_id=client_id).order_by('id')
+            old_tombstones = LeadTombstone.objects.using(source).filter(client_id=client_id).order_by('id')
+            tombstones = old_leads.count() + old_tombstones.count()
+            span = Lead.objects.filter(client_id=client_id).aggregate(low=Min('id'), high=Max('id'))
+            lead_seqs = span['high'] - span['low'] + 1 if span['low'] is not None else 0
+            next_seq = changes.next_seqs(client_id, tombstones + lead_seqs)
+
+        for rows in (old_leads.values_list('id', 'call_sid'), old_tombstones.values_list('lead_id', 'call_sid')):
+            batch = []
+            for lead_id, call_sid in rows.iterator(chunk_size=batch_size):
+                batch.append(LeadTombstone(client_id=client_id, lead_id=lead_id, call_sid=call_sid, change_seq=next_seq))
+                next_seq += 1
+                if len(batch) == batch_size:
+                    LeadTombstone.objects.bulk_create(batch)
+                    batch = []
+            LeadTombstone.objects.bulk_create(batch)
+        for low in range(span['low'] or 0, (span['high'] or -1) + 1, batch_size):
+            with transaction.atomic(using=target):
+                Lead.objects.filter(client_id=client_id, id__gte=low, id__lt=low + batch_size).update(
+                    change_seq=F('id') + (next_seq - span['low'])
+                )
+
+
+def _purge(client_id, alias, batch_size=2000):
+    """
+    Delete a client's sharded rows from `alias`, leads in batches and without
+    tombstones
+    """
+    connection = connections[alias]
+    table = connection.ops.quote_name(Lead._meta.db_table)
+    leads = Lead.objects.using(alias).filter(client_id=client_id)
+    while True:
+        ids = list(leads.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            break
+        with transaction.atomic(using=alias), connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {table} WHERE id IN ({", ".join(["%s"] * len(ids))})', ids)
+    for model in (Caller, LeadDailyRollup, LeadTombstone, LeadChangeSequence):
+        model.objects.using(alias).filter(client_id=client_id).delete()
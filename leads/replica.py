@@ -0,0 +1,143 @@
+import contextvars
+import functools
+import sqlite3
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# The alias reads in the current view go to, or None for the primary. Set per
+# request by reading_from(); a context variable so async views' sync_to_async
+# queries see it too.
+_read_alias = contextvars.ContextVar('replica_read_alias', default=None)
+
+
+class ReplicaRouter:
+    """
+    Sends reads of leads models made inside reads_for() to the read replica,
+    and every write to the primary. Outside it, or without a
+    replica configured, everything stays on the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        if alias is None or model._meta.app_label != 'leads':
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Related lookups from an object stay on the database it came from.
+            return instance._state.db
+        return alias
+
+    def db_for_write(self, model, **hints):
+        if settings.READ_REPLICA_ALIAS:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, settings.READ_REPLICA_ALIAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get their schema from the primary.
+        if settings.READ_REPLICA_ALIAS and db == settings.READ_REPLICA_ALIAS:
+            return False
+        return None
+
+
+def _pin_key(user_id):
+    return f'replica:pin:{user_id}'
+
+
+def pin_to_primary(user):
+    """
+    Read the user's own data from the primary for the next
+    READ_REPLICA_LAG_SECONDS, so they see their writes before the replica
+    does. Also moves the rest of the current request to the primary.
+    """
+    if not settings.READ_REPLICA_ALIAS or not user.is_authenticated:
+        return
+    cache.set(_pin_key(user.pk), True, settings.READ_REPLICA_LAG_SECONDS)
+    _read_alias.set(None)
+
+
+def replica_for(user):
+    """
+    The replica alias to read the user's data from, or None for the primary
+    """
+    alias = settings.READ_REPLICA_ALIAS
+    if not alias or (user.is_authenticated and cache.get(_pin_key(user.pk))):
+        return None
+    return alias
+
+
+async def areplica_for(user):
+    alias = settings.READ_REPLICA_ALIAS
+    if not alias or (user.is_authenticated and await cache.aget(_pin_key(user.pk))):
+        return None
+    return alias
+
+
+@contextmanager
+def reading_from(alias):
+    """
+    Route leads reads inside the block to `alias` (None for the primary)
+    """
+    token = _read_alias.set(alias)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def reads_for(user):
+    """
+    reading_from() the replica, unless the user wrote recently
+    """
+    return reading_from(replica_for(user))
+
+
+def replica_reads(view):
+    """
+    Function view decorator running the view inside reads_for(request.user)
+    """
+    @functools.wraps(view)
+    def wrapped(request, *args, **kwargs):
+        with reads_for(request.user):
+            return view(request, *args, **kwargs)
+    return wrapped
+
+
+def reading_from_replica():
+    return _read_alias.get() is not None
+
+
+def cache_timeout(timeout):
+    """
+    Cap a cache timeout for results read from a replica. They can be up to
+    READ_REPLICA_LAG_SECONDS behind the data version they are cached under.
+    """
+    if reading_from_replica():
+        return min(timeout, settings.READ_REPLICA_LAG_SECONDS)
+    return timeout
+
+
+def copy_sqlite(source=DEFAULT_DB_ALIAS, target=None):
+    """
+    Copy one SQLite database over another with the online backup API. A
+    stand-in for replication when the replica is a second local SQLite file.
+    """
+    target = target or settings.READ_REPLICA_ALIAS
+    source_connection, target_connection = connections[source], connections[target]
+    if source_connection.vendor != 'sqlite' or target_connection.vendor != 'sqlite':
+        raise ValueError('Only SQLite databases can be copied')
+    target_connection.close()
+    src = sqlite3.connect(source_connection.settings_dict['NAME'])
+    dst = sqlite3.connect(target_connection.settings_dict['NAME'])
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
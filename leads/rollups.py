@@ -0,0 +1,252 @@
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+from .models import Lead, LeadDailyRollup
+from .analytics import DURATION_RANGES
+from . import analytics_cache, callers, changes, live, shards
+
+
+DURATION_FIELDS = [
+    'duration_0_30',
+    'duration_31_60',
+    'duration_61_120',
+    'duration_121_300',
+    'duration_301_plus',
+]
+
+COUNTER_FIELDS = [
+    'lead_count', 'new_count', 'contacted_count', 'converted_count', 'lost_count',
+    'missed_calls', 'answered_calls', *DURATION_FIELDS,
+    'total_duration', 'responded_count', 'total_response_seconds',
+]
+
+
+def rollup_day(lead, tz=None):
+    timestamp = lead.call_timestamp or lead.created_at or timezone.now()
+    # localtime() rejects naive timestamps rather than reading them as host time.
+    return timezone.localtime(timestamp, tz).date()
+
+
+def duration_field(call_duration):
+    for field, (_, min_dur, max_dur) in zip(DURATION_FIELDS, DURATION_RANGES):
+        if call_duration >= min_dur and (max_dur is None or call_duration <= max_dur):
+            return field
+    return None
+
+
+def contribution(lead, tz=None):
+    """
+    The (client_id, day) key and counter values a single lead adds to its
+    rollup row, plus its caller contribution.
+    Pass `tz` when calling in a loop to skip the per-call timezone lookup.
+    """
+    return (*counters(lead, tz), callers.contribution(lead))
+
+
+def counters(lead, tz=None):
+    """
+    contribution() without the caller part, which needs no customer number
+    """
+    call_duration = lead.call_duration
+    values = {
+        'lead_count': 1,
+        f'{lead.status}_count': 1,
+        'total_duration': call_duration,
+        'answered_calls' if call_duration else 'missed_calls': 1,
+    }
+    bucket = duration_field(call_duration)
+    if bucket:
+        values[bucket] = 1
+    if lead.first_contacted_at and lead.created_at:
+        values['responded_count'] = 1
+        values['total_response_seconds'] = (lead.first_contacted_at - lead.created_at).total_seconds()
+    return (lead.client_id, rollup_day(lead, tz)), values
+
+
+def apply_change(before, after):
+    """
+    Move a lead's contribution from `before` to `after`; either may be None
+    for a create or delete. Must run inside the transaction writing the lead.
+    """
+    apply_changes([(before, after)])
+
+
+def apply_changes(changes):
+    """
+    apply_change for many (before, after) pairs, one UPDATE per touched rollup row.
+    Also updates the leads' callers and invalidates the cached analytics of
+    every client touched.
+    """
+    changes = list(changes)
+    callers.apply_changes(
+        (before and before[2], after and after[2]) for before, after in changes
+    )
+    deltas = defaultdict(lambda: defaultdict(int))
+    client_ids = set()
+    for before, after in changes:
+        if before is not None:
+            row = deltas[before[0]]
+            client_ids.add(before[0][0])
+            for field, value in before[1].items():
+                row[field] -= value
+        if after is not None:
+            row = deltas[after[0]]
+            client_ids.add(after[0][0])
+            for field, value in after[1].items():
+                row[field] += value
+
+    analytics_cache.bump_versions(client_ids)
+
+    changes = {}
+    days_by_client = defaultdict(set)
+    for (client_id, day), values in deltas.items():
+        row_changes = {field: F(field) + value for field, value in values.items() if value}
+        if row_changes:
+            changes[(client_id, day)] = row_changes
+            days_by_client[client_id].add(day)
+    if not changes:
+        return
+    live.publish_rollup_deltas({
+        key: {field: value for field, value in deltas[key].items() if value} for key in changes
+    })
+
+    existing = set()
+    for client_id, days in days_by_client.items():
+        existing.update(
+            LeadDailyRollup.objects.filter(client_id=client_id, day__in=days).values_list('client_id', 'day')
+        )
+    LeadDailyRollup.objects.bulk_create(
+        [LeadDailyRollup(client_id=client_id, day=day) for client_id, day in changes if (client_id, day) not in existing],
+        ignore_conflicts=True,
+    )
+    for (client_id, day), row_changes in changes.items():
+        LeadDailyRollup.objects.filter(client_id=client_id, day=day).update(**row_changes)
+
+
+def summarize(client, date_from=None):
+    """
+    Same shape as analytics.summarize, read from the client's rollup rows
+    """
+    rollups = LeadDailyRollup.objects.filter(client=client)
+    if date_from is not None:
+        rollups = rollups.filter(day__gte=timezone.localtime(date_from).date())
+    row = rollups.aggregate(**{field: Sum(field) for field in COUNTER_FIELDS})
+    row = {field: value or 0 for field, value in row.items()}
+
+    avg_response_seconds = 0
+    if row['responded_count']:
+        avg_response_seconds = row['total_response_seconds'] / row['responded_count']
+    avg_call_duration = 0
+    if row['answered_calls']:
+        avg_call_duration = row['total_duration'] / row['answered_calls']
+
+    return {
+        'total_leads': row['lead_count'],
+        'converted_leads': row['converted_count'],
+        'missed_calls': row['missed_calls'],
+        'avg_response_seconds': avg_response_seconds,
+        'avg_call_duration': avg_call_duration,
+        'status_counts': [
+            {'status': value, 'count': row[f'{value}_count']}
+            for value, _ in Lead.STATUS_CHOICES
+            if row[f'{value}_count']
+        ],
+        'duration_data': [
+            {'label': label, 'count': row[field]}
+            for field, (label, _, _) in zip(DURATION_FIELDS, DURATION_RANGES)
+        ],
+    }
+
+
+def lead_counts(client_ids):
+    """
+    {client_id: total leads} from the rollup rows, one query per shard
+    """
+    counts = {}
+    for alias, shard_client_ids in shards.group(client_ids).items():
+        with shards.using(alias):
+            counts.update(
+                LeadDailyRollup.objects.filter(client_id__in=shard_client_ids)
+                .values('client_id').annotate(total=Sum('lead_count')).values_list('client_id', 'total')
+            )
+    return counts
+
+
+def leads_over_time(client, date_from):
+    return LeadDailyRollup.objects.filter(
+        client=client,
+        day__gte=timezone.localtime(date_from).date(),
+        lead_count__gt=0,
+    ).order_by('day').values('day', count=F('lead_count'))
+
+
+def compute_rollups(leads_queryset):
+    """
+    Build rollup rows in memory from raw leads, keyed by (client_id, day)
+    """
+    rollups = defaultdict(lambda: dict.fromkeys(COUNTER_FIELDS, 0))
+    leads = leads_queryset.only(
+        'client_id', 'status', 'call_duration', 'call_timestamp', 'created_at', 'first_contacted_at',
+    ).order_by()
+    tz = timezone.get_current_timezone()
+    for lead in leads.iterator(chunk_size=2000):
+        key, values = counters(lead, tz)
+        for field, value in values.items():
+            rollups[key][field] += value
+    return rollups
+
+
+def rebuild(client_ids, alias=None):
+    """
+    Recompute the clients' rows from their leads, on their shards or on `alias`
+    """
+    count = 0
+    groups = {alias: list(client_ids)} if alias else shards.group(client_ids)
+    for alias, shard_client_ids in groups.items():
+        with shards.using(alias):
+            count += _rebuild(shard_client_ids)
+    return count
+
+
+def _rebuild(client_ids):
+    with transaction.atomic(using=shards.db()):
+        changes.hold_writes(client_ids)
+        rollups = compute_rollups(Lead.objects.filter(client_id__in=client_ids))
+        LeadDailyRollup.objects.filter(client_id__in=client_ids).delete()
+        analytics_cache.bump_versions(client_ids)
+        LeadDailyRollup.objects.bulk_create(
+            [
+                LeadDailyRollup(client_id=client_id, day=day, **values)
+                for (client_id, day), values in rollups.items()
+            ],
+            batch_size=500,
+        )
+    return len(rollups)
+
+
+def verify(client_ids):
+    """
+    Compare stored rollups with ones recomputed from leads, returning mismatching keys
+    """
+    mismatches = []
+    for alias, shard_client_ids in shards.group(client_ids).items():
+        with shards.using(alias):
+            mismatches += _verify(shard_client_ids)
+    return sorted(mismatches)
+
+
+def _verify(client_ids):
+    expected = compute_rollups(Lead.objects.filter(client_id__in=client_ids))
+    stored = {
+        (row['client_id'], row['day']): row
+        for row in LeadDailyRollup.objects.filter(client_id__in=client_ids)
+        .values('client_id', 'day', *COUNTER_FIELDS)
+    }
+    mismatches = []
+    for key in sorted(set(expected) | set(stored)):
+        want = expected.get(key, dict.fromkeys(COUNTER_FIELDS, 0))
+        have = stored.get(key, dict.fromkeys(COUNTER_FIELDS, 0))
+        if any(abs(want[field] - have[field]) > 0.001 for field in COUNTER_FIELDS):
+            mismatches.append(key)
+    return mismatches
@@ -1,7 +1,9 @@
 
-from datetime import timezone
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Lead
+from .models import Caller, Lead
+from . import rollups, shards
 
 class LeadSerializer(serializers.ModelSerializer):
     
@@ -11,13 +13,24 @@ class LeadSerializer(serializers.ModelSerializer):
             
             if not instance.first_contacted_at:
                 validated_data['first_contacted_at'] = timezone.now()
-        return super().update(instance, validated_data)
+        with transaction.atomic(using=shards.db()):
+            before = rollups.contribution(instance)
+            lead = super().update(instance, validated_data)
+            rollups.apply_change(before, rollups.contribution(lead))
+        return lead
 
     class Meta:
         model = Lead
         fields = [
-            'id', 'customer_number', 'status', 'notes', 'created_at',
-            'call_timestamp', 'call_duration', 'recording_url', 'first_contacted_at'
+            'id', 'call_sid', 'customer_number', 'customer_e164', 'status', 'notes', 'created_at',
+            'call_timestamp', 'call_duration', 'recording_url', 'first_contacted_at', 'updated_at'
         ]
         
-        read_only_fields = ['created_at']
\ No newline at end of file
+        read_only_fields = ['call_sid', 'customer_e164', 'created_at']
+
+class CallerSerializer(serializers.ModelSerializer):
+
+    class Meta:
+        model = Caller
+        fields = ['id', 'number', 'first_seen', 'last_seen', 'call_count', 'total_duration', 'latest_status']
+        read_only_fields = fields
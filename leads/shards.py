@@ -0,0 +1,191 @@
+import contextvars
+import functools
+import hashlib
+from collections import defaultdict
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+# Per-client data. Clients themselves (and users, tokens, sessions) stay on
+# the default database, which acts as the directory of which shard holds
+# each client's leads.
+SHARDED_MODELS = {'lead', 'caller', 'leaddailyrollup', 'leadchangesequence', 'leadtombstone'}
+
+# The shard sharded models are routed to in the current block; None means
+# the default database. A context variable so async views' sync_to_async
+# queries see it too.
+_active = contextvars.ContextVar('lead_shard', default=None)
+
+
+def is_sharded(model):
+    return model._meta.app_label == 'leads' and model._meta.model_name in SHARDED_MODELS
+
+
+def is_client(model):
+    return model._meta.app_label == 'leads' and model._meta.model_name == 'client'
+
+
+class ShardRouter:
+    """
+    Routes sharded models to the shard chosen by for_client()/using(), or to
+    the shard of the client or object a related lookup starts from. Leads
+    reach their client through the directory on the default database.
+    """
+
+    def _shard_for(self, model, hints):
+        instance = hints.get('instance')
+        if instance is not None and is_sharded(type(instance)) and instance._state.db in settings.LEAD_SHARDS:
+            # Objects read from a replica are left to the replica router.
+            return instance._state.db
+        if instance is not None and is_client(type(instance)):
+            return alias_for(instance)
+        return _active.get()
+
+    def db_for_read(self, model, **hints):
+        if is_client(model):
+            instance = hints.get('instance')
+            if instance is not None and is_sharded(type(instance)):
+                return DEFAULT_DB_ALIAS
+            return None
+        if not is_sharded(model):
+            return None
+        alias = self._shard_for(model, hints)
+        # Reads on the default database are left to the replica router.
+        return None if alias == DEFAULT_DB_ALIAS else alias
+
+    def db_for_write(self, model, **hints):
+        if not is_sharded(model):
+            return None
+        return self._shard_for(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        models = {type(obj1), type(obj2)}
+        if any(is_client(model) for model in models) and any(is_sharded(model) for model in models):
+            return True
+        return None
+
+
+def hash_shard(key, aliases=None):
+    """
+    Rendezvous hashing: the alias scoring highest for `key`. Adding a shard
+    only moves the keys it now wins, about 1/N of them.
+    """
+    aliases = aliases or settings.LEAD_SHARDS
+    return max(aliases, key=lambda alias: hashlib.md5(f'{alias}:{key}'.encode()).digest())
+
+
+def alias_for(client):
+    """
+    The alias holding a client's leads. Clients created before sharding have
+    no stored shard and live on the default database.
+    """
+    return client.shard or DEFAULT_DB_ALIAS
+
+
+def partition(client_ids):
+    """
+    {alias: [positions in client_ids]} for a sequence of client ids
+    """
+    client_ids = list(client_ids)
+    if len(settings.LEAD_SHARDS) == 1:
+        return {settings.LEAD_SHARDS[0]: list(range(len(client_ids)))} if client_ids else {}
+    from .models import Client
+    aliases = dict(Client.objects.using(DEFAULT_DB_ALIAS).filter(id__in=set(client_ids)).values_list('id', 'shard'))
+    positions = defaultdict(list)
+    for position, client_id in enumerate(client_ids):
+        positions[aliases.get(client_id) or DEFAULT_DB_ALIAS].append(position)
+    return dict(positions)
+
+
+def group(client_ids):
+    """
+    {alias: [client ids]}
+    """
+    client_ids = list(client_ids)
+    return {
+        alias: [client_ids[position] for position in positions]
+        for alias, positions in partition(client_ids).items()
+    }
+
+
+def db():
+    """
+    The alias sharded models are routed to in the current block
+    """
+    return _active.get() or DEFAULT_DB_ALIAS
+
+
+def activate(alias):
+    """
+    Route sharded models to `alias` until deactivate() is called with the returned token
+    """
+    return _active.set(alias)
+
+
+def deactivate(token):
+    _active.reset(token)
+
+
+@contextmanager
+def using(alias):
+    """
+    Route sharded models to `alias` inside the block
+    """
+    token = activate(alias)
+    try:
+        yield alias
+    finally:
+        deactivate(token)
+
+
+def for_client(client):
+    """
+    using() the shard holding `client` (a Client, or None for the default database)
+    """
+    return using(alias_for(client) if client is not None else DEFAULT_DB_ALIAS)
+
+
+def for_client_id(client_id):
+    """
+    using() the shard the directory currently records for a client. Unlike
+    for_client(), never trusts a stale Client object.
+    """
+    return using(next(iter(partition([client_id])), DEFAULT_DB_ALIAS))
+
+
+def client_shard(view):
+    """
+    Function view decorator running the view on the shard of request.user's client
+    """
+    @functools.wraps(view)
+    def wrapped(request, *args, **kwargs):
+        with for_client(getattr(request.user, 'client', None)):
+            return view(request, *args, **kwargs)
+    return wrapped
+
+
+def ensure_stubs(clients, alias=None):
+    """
+    Copy the clients' directory rows to their shards (or to `alias`), without
+    their users, so the shards' lead foreign keys have a row to point at.
+    """
+    from .models import Client
+    target = alias
+    by_alias = defaultdict(list)
+    for client in clients:
+        alias = target or alias_for(client)
+        if alias != DEFAULT_DB_ALIAS:
+            by_alias[alias].append(client)
+    for alias, clients in by_alias.items():
+        Client.objects.using(alias).bulk_create(
+            [
+                Client(
+                    id=client.id, business_name=client.business_name, webhook_token=client.webhook_token,
+                    virtual_number=client.virtual_number, shard=client.shard,
+                )
+                for client in clients
+            ],
+            update_conflicts=True,
+            unique_fields=['id'],
+            update_fields=['business_name', 'webhook_token', 'virtual_number', 'shard'],
+        )
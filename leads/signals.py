@@ -0,0 +1,49 @@
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+from .models import Client, Lead
+from .client_cache import client_cache
+from . import changes, phone, shards
+
+
+@receiver(post_save, sender=Client)
+@receiver(post_delete, sender=Client)
+def invalidate_client_token(sender, instance, **kwargs):
+    client_cache.invalidate(instance.webhook_token)
+
+
+@receiver(pre_save, sender=Client)
+def assign_client_shard(sender, instance, raw=False, using=None, **kwargs):
+    if raw or using != DEFAULT_DB_ALIAS or instance.shard or not instance._state.adding:
+        return
+    instance.shard = shards.hash_shard(instance.webhook_token)
+
+
+@receiver(post_save, sender=Client)
+def copy_client_to_shard(sender, instance, raw=False, using=None, **kwargs):
+    if not raw and using == DEFAULT_DB_ALIAS:
+        shards.ensure_stubs([instance])
+
+
+@receiver(post_delete, sender=Client)
+def delete_client_from_shard(sender, instance, using=None, **kwargs):
+    alias = shards.alias_for(instance)
+    if using == DEFAULT_DB_ALIAS and alias != DEFAULT_DB_ALIAS:
+        # Cascades to the client's leads, rollups and callers on the shard.
+        Client.objects.using(alias).filter(id=instance.id).delete()
+
+
+@receiver(pre_save, sender=Lead)
+def stamp_lead_change(sender, instance, raw=False, using=None, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'change_seq' not in update_fields):
+        return
+    with shards.using(using):
+        instance.change_seq = changes.next_seqs(instance.client_id)
+
+
+@receiver(pre_save, sender=Lead)
+def normalize_lead_number(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or (update_fields is not None and 'customer_number' not in update_fields):
+        return
+    for field, value in phone.normalized_fields(instance.customer_number).items():
+        setattr(instance, field, value)
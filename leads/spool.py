@@ -0,0 +1,161 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.db import InterfaceError, OperationalError
+from django.utils.dateparse import parse_datetime
+from .models import Client
+from . import ingest
+
+logger = logging.getLogger(__name__)
+
+# Connection and locking problems; the batch is retried as it is.
+TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+
+
+class WebhookSpool:
+    """
+    Append-only queue of accepted webhook events in its own SQLite WAL file,
+    so accepting a call never waits on the main database's write lock.
+    """
+
+    def __init__(self, path):
+        self.path = str(path)
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=FULL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS events ('
+                'id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                'client_id INTEGER NOT NULL, '
+                'payload TEXT NOT NULL, '
+                'received_at REAL NOT NULL)'
+            )
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS dead_events ('
+                'id INTEGER PRIMARY KEY, '
+                'client_id INTEGER NOT NULL, '
+                'payload TEXT NOT NULL, '
+                'received_at REAL NOT NULL, '
+                'error TEXT NOT NULL, '
+                'failed_at REAL NOT NULL)'
+            )
+            self._local.conn = conn
+        return conn
+
+    def append(self, client_id, event):
+        self.append_many(client_id, [event])
+
+    def append_many(self, client_id, events):
+        received_at = time.time()
+        rows = []
+        for event in events:
+            payload = dict(event)
+            if payload['call_timestamp']:
+                payload['call_timestamp'] = payload['call_timestamp'].isoformat()
+            rows.append((client_id, json.dumps(payload), received_at))
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany('INSERT INTO events (client_id, payload, received_at) VALUES (?, ?, ?)', rows)
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def read_batch(self, limit):
+        rows = self._connection().execute(
+            'SELECT id, client_id, payload, received_at FROM events ORDER BY id LIMIT ?', (limit,)
+        ).fetchall()
+        batch = []
+        for event_id, client_id, payload, received_at in rows:
+            event = json.loads(payload)
+            if event['call_timestamp']:
+                event['call_timestamp'] = parse_datetime(event['call_timestamp'])
+            batch.append((event_id, client_id, event, datetime.fromtimestamp(received_at, dt_timezone.utc)))
+        return batch
+
+    def delete_through(self, event_id):
+        self._connection().execute('DELETE FROM events WHERE id <= ?', (event_id,))
+
+    def bury(self, event_id, error):
+        """
+        Move an event that can't be written to dead_events, for inspection
+        """
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute(
+                'INSERT INTO dead_events (id, client_id, payload, received_at, error, failed_at) '
+                'SELECT id, client_id, payload, received_at, ?, ? FROM events WHERE id = ?',
+                (error, time.time(), event_id),
+            )
+            conn.execute('DELETE FROM events WHERE id = ?', (event_id,))
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def dead_count(self):
+        return self._connection().execute('SELECT COUNT(*) FROM dead_events').fetchone()[0]
+
+    def __len__(self):
+        return self._connection().execute('SELECT COUNT(*) FROM events').fetchone()[0]
+
+
+_spools = {}
+_spools_lock = threading.Lock()
+
+
+def get_spool():
+    path = str(settings.WEBHOOK_SPOOL_PATH)
+    with _spools_lock:
+        if path not in _spools:
+            _spools[path] = WebhookSpool(path)
+        return _spools[path]
+
+
+def drain(spool, batch_size=500):
+    """
+    Write one batch of spooled events to Lead in a single transaction and
+    drop them from the spool afterwards. A crash between the two replays the
+    batch, which is harmless because ingestion is idempotent on CallSid.
+    Events for clients deleted since they were accepted are discarded.
+
+    If the batch fails, its events are written one at a time and any that
+    still fail are moved to dead_events, so one bad event can't stall the
+    spool. Transient database errors are raised and the batch is retried.
+    """
+    batch = spool.read_batch(batch_size)
+    if not batch:
+        return 0
+    client_ids = set(Client.objects.filter(id__in={item[1] for item in batch}).values_list('id', flat=True))
+    batch_items = [
+        (event_id, (client_id, event, received_at))
+        for event_id, client_id, event, received_at in batch
+        if client_id in client_ids
+    ]
+    try:
+        ingest.record_calls([item for _, item in batch_items])
+    except TRANSIENT_ERRORS:
+        raise
+    except Exception:
+        logger.warning('Spool batch failed, writing its %d events one by one', len(batch_items), exc_info=True)
+        for event_id, item in batch_items:
+            try:
+                ingest.record_calls([item])
+            except TRANSIENT_ERRORS:
+                raise
+            except Exception as error:
+                logger.exception('Moving spooled event %s to dead_events', event_id)
+                spool.bury(event_id, repr(error))
+    spool.delete_through(batch[-1][0])
+    return len(batch)
@@ -1,10 +1,43 @@
-from django.test import TestCase, Client as TestClient
+from django.test import (
+    TestCase, TransactionTestCase, Client as TestClient, AsyncClient, AsyncRequestFactory, RequestFactory, override_settings,
+)
+from django.http import HttpResponse
+from django.test.utils import CaptureQueriesContext
+from django.db import connection, connections, transaction, IntegrityError, OperationalError
+from django.utils.connection import ConnectionDoesNotExist
+from django.core.cache import cache
+from django.db.models import F, Sum
+import random
+import threading
+import time
+from unittest import mock, skipUnless
+import re
 from django.contrib.auth.models import User
 from django.urls import reverse
+from django.core.management import call_command, CommandError
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from django.conf import settings
 from django.utils import timezone
-from datetime import datetime
-from .models import Client, Lead
+from datetime import datetime, timedelta
+from .models import Caller, Client, Lead, LeadDailyRollup, LeadTombstone
+from . import (
+    analytics, analytics_cache, benchmark, callers, changes, conditional, database, export, ingest, loadgen, metrics,
+    notes_search, phone, provisioning, rebalance, replica, rollups, shards, spool,
+)
+from .client_cache import ClientTokenCache, client_cache
+from .live import LeadBroker
+from .views import AsyncCallWebhookView, AsyncDashboardAnalyticsView
+from asgiref.sync import sync_to_async
+import asyncio
+from .pagination import encode_cursor
 import uuid
+from io import StringIO
+import tempfile
+import gzip
+import json
+import os
+import csv
 
 
 class WebhookTestCase(TestCase):
@@ -166,6 +199,154 @@ class WebhookTestCase(TestCase):
         self.assertEqual(lead.call_duration, 60)
         self.assertEqual(lead.recording_url, 'https://example.com/new_recording.mp3')
 
+    def test_webhook_retry_without_start_time_is_idempotent(self):
+        url = reverse('call-webhook', kwargs={'token': self.webhook_token})
+        params = {
+            'CallSid': 'test_call_008',
+            'From': '+919988776662',
+            'CallStatus': 'no-answer',
+            'Direction': 'incoming',
+        }
+        
+        first = self.test_client.get(url, params)
+        params['CallStatus'] = 'completed'
+        params['DialCallDuration'] = '30'
+        second = self.test_client.get(url, params)
+        
+        self.assertTrue(first.json()['created'])
+        self.assertFalse(second.json()['created'])
+        lead = Lead.objects.get(call_sid='test_call_008')
+        self.assertEqual(lead.status, 'contacted')
+        self.assertEqual(lead.call_duration, 30)
+        self.assertEqual(rollups.summarize(self.client_model)['total_leads'], 1)
+
+    def test_webhook_call_sid_scoped_to_client(self):
+        other = Client.objects.create(business_name='Other Business', virtual_number='+918045678902')
+        params = {'CallSid': 'shared_sid', 'From': '+919988776663', 'Direction': 'incoming'}
+        
+        self.test_client.get(reverse('call-webhook', kwargs={'token': self.webhook_token}), params)
+        self.test_client.get(reverse('call-webhook', kwargs={'token': other.webhook_token}), params)
+        
+        self.assertEqual(Lead.objects.filter(call_sid='shared_sid').count(), 2)
+
+
+class ConcurrentWebhookTestCase(TransactionTestCase):
+    def setUp(self):
+        self.client_model = Client.objects.create(
+            business_name='Test Business',
+            virtual_number='+918045678901'
+        )
+
+    def test_parallel_duplicate_webhooks_create_one_lead(self):
+        url = reverse('call-webhook', kwargs={'token': self.client_model.webhook_token})
+        params = {
+            'CallSid': 'concurrent_call',
+            'From': '+919988776655',
+            'CallStatus': 'completed',
+            'Direction': 'incoming',
+            'DialCallDuration': '45',
+        }
+        workers = 8
+        barrier = threading.Barrier(workers)
+        results = []
+
+        def send():
+            try:
+                barrier.wait()
+                for _ in range(50):
+                    try:
+                        results.append(TestClient().get(url, params).json()['created'])
+                        return
+                    except OperationalError:
+                        # SQLite reports writer contention as "database is locked";
+                        # retry the way a provider would.
+                        continue
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=send) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), workers)
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual(Lead.objects.filter(call_sid='concurrent_call').count(), 1)
+        self.assertEqual(rollups.verify([self.client_model.id]), [])
+
+
+class DatabaseProfileTestCase(TransactionTestCase):
+    def setUp(self):
+        client_cache.clear()
+        self.client_model = Client.objects.create(
+            business_name='Test Business',
+            virtual_number='+918045678901'
+        )
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite profile')
+    def test_sqlite_connections_are_tuned(self):
+        values = database.pragmas(connection)
+
+        self.assertEqual(values['journal_mode'], 'wal')
+        self.assertEqual(values['synchronous'], 1)
+        self.assertEqual(values['busy_timeout'], settings.SQLITE_PRAGMAS['busy_timeout'])
+        self.assertEqual(values['mmap_size'], settings.SQLITE_PRAGMAS['mmap_size'])
+
+    def test_pragmas_are_not_logged_as_queries(self):
+        connection.close()
+        with CaptureQueriesContext(connection) as captured:
+            Client.objects.count()
+        self.assertEqual(len(captured), 1)
+
+    def test_concurrent_writers_and_readers_never_see_locked_errors(self):
+        url = reverse('call-webhook', kwargs={'token': self.client_model.webhook_token})
+        writers, calls = 12, 15
+        barrier = threading.Barrier(writers + 2)
+        errors = []
+        created = []
+
+        def write(worker):
+            try:
+                barrier.wait()
+                for index in range(calls):
+                    params = {'CallSid': f'stress-{worker}-{index}', 'From': f'+9199887{worker:02d}{index:03d}',
+                              'CallStatus': 'completed', 'Direction': 'incoming', 'DialCallDuration': '30'}
+                    try:
+                        if worker % 2:
+                            # Batches read existing leads before writing.
+                            response = TestClient().post(url, json.dumps([params]), content_type='application/json')
+                            created.append(response.json()['results'][0]['result'] == 'created')
+                        else:
+                            created.append(TestClient().get(url, params).json()['created'])
+                    except OperationalError as exc:
+                        errors.append(exc)
+            finally:
+                connection.close()
+
+        def read():
+            try:
+                barrier.wait()
+                while len(created) + len(errors) < writers * calls:
+                    try:
+                        analytics.summarize(Lead.objects.filter(client=self.client_model))
+                    except OperationalError as exc:
+                        errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=write, args=(worker,)) for worker in range(writers)]
+        threads += [threading.Thread(target=read) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(created, [True] * writers * calls)
+        self.assertEqual(Lead.objects.filter(client=self.client_model).count(), writers * calls)
+        self.assertEqual(rollups.verify([self.client_model.id]), [])
+
 
 class ClientModelTestCase(TestCase):
     def setUp(self):
@@ -262,6 +443,7 @@ class DashboardTestCase(TestCase):
             virtual_number='+918045678901'
         )
         self.test_client = TestClient()
+        cache.clear()
 
     def test_dashboard_authentication_required(self):
         response = self.test_client.get('/dashboard/')
@@ -285,3 +467,2138 @@ class DashboardTestCase(TestCase):
         self.assertIn('kpis', data)
         self.assertIn('leads_by_status', data)
         self.assertIn('leads_over_time', data)
+
+    def test_analytics_api_kpis(self):
+        Lead.objects.create(client=self.client_model, customer_number='+919988776655',
+                            status='converted', call_duration=45, call_timestamp=timezone.now())
+        Lead.objects.create(client=self.client_model, customer_number='+919988776656',
+                            status='new', call_duration=0, call_timestamp=timezone.now())
+        Lead.objects.create(client=self.client_model, customer_number='+919988776657',
+                            status='new', call_duration=400, call_timestamp=timezone.now())
+        rollups.rebuild([self.client_model.id])
+        self.test_client.login(username='testuser', password='testpass123')
+
+        data = self.test_client.get('/analytics/').json()
+
+        self.assertEqual(data['kpis']['total_leads'], 3)
+        self.assertEqual(data['kpis']['total_missed_calls'], 1)
+        self.assertEqual(
+            data['leads_by_status'],
+            [{'status': 'new', 'count': 2}, {'status': 'converted', 'count': 1}]
+        )
+        self.assertEqual(sum(item['count'] for item in data['leads_over_time']), 3)
+
+
+class AnalyticsTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client_model = Client.objects.create(
+            user=self.user,
+            business_name='Test Business',
+            virtual_number='+918045678901'
+        )
+        for duration, status in [(0, 'new'), (20, 'contacted'), (45, 'converted'),
+                                 (90, 'converted'), (200, 'lost'), (400, 'contacted')]:
+            Lead.objects.create(
+                client=self.client_model,
+                customer_number=f'+9199887766{duration:02d}',
+                status=status,
+                call_duration=duration,
+                call_timestamp=timezone.now()
+            )
+
+    def test_summarize_single_query(self):
+        leads_queryset = analytics.filter_leads(self.client_model)
+
+        with self.assertNumQueries(1):
+            summary = analytics.summarize(leads_queryset)
+
+        self.assertEqual(summary['total_leads'], 6)
+        self.assertEqual(summary['converted_leads'], 2)
+        self.assertEqual(summary['missed_calls'], 1)
+        self.assertEqual(summary['avg_call_duration'], 151)
+        self.assertEqual(
+            [item['count'] for item in summary['duration_data']],
+            [2, 1, 1, 1, 1]
+        )
+        self.assertEqual(
+            summary['status_counts'],
+            [
+                {'status': 'new', 'count': 1},
+                {'status': 'contacted', 'count': 2},
+                {'status': 'converted', 'count': 2},
+                {'status': 'lost', 'count': 1},
+            ]
+        )
+
+    def test_filter_leads(self):
+        self.assertEqual(analytics.filter_leads(self.client_model, duration='121+').count(), 2)
+        self.assertEqual(analytics.filter_leads(self.client_model, status='converted').count(), 2)
+        self.assertEqual(analytics.filter_leads(self.client_model, search='776600').count(), 1)
+
+    def test_dashboard_uses_summary(self):
+        self.test_client = TestClient()
+        self.test_client.login(username='testuser', password='testpass123')
+
+        response = self.test_client.get('/dashboard/', {'duration': '121+'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['analytics']['total_leads'], 2)
+        self.assertEqual(response.context['analytics']['missed_calls'], 0)
+
+
+class RollupTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client_model = Client.objects.create(
+            user=self.user,
+            business_name='Test Business',
+            virtual_number='+918045678901'
+        )
+        self.webhook_url = reverse('call-webhook', kwargs={'token': self.client_model.webhook_token})
+        self.test_client = TestClient()
+
+    def send_call(self, call_sid, number, call_status, duration):
+        return self.test_client.get(self.webhook_url, {
+            'CallSid': call_sid,
+            'From': number,
+            'CallStatus': call_status,
+            'Direction': 'incoming',
+            'DialCallDuration': duration,
+            'StartTime': '2025-08-07T10:30:00Z',
+        })
+
+    def test_webhook_updates_rollup(self):
+        self.send_call('call_001', '+919988776655', 'completed', '45')
+        self.send_call('call_002', '+919988776656', 'no-answer', '0')
+        self.send_call('call_001', '+919988776655', 'completed', '90')
+
+        rollup = LeadDailyRollup.objects.get(client=self.client_model)
+        self.assertEqual(str(rollup.day), '2025-08-07')
+        self.assertEqual(rollup.lead_count, 2)
+        self.assertEqual(rollup.contacted_count, 1)
+        self.assertEqual(rollup.new_count, 1)
+        self.assertEqual(rollup.missed_calls, 1)
+        self.assertEqual(rollup.duration_31_60, 0)
+        self.assertEqual(rollup.duration_61_120, 1)
+        self.assertEqual(rollup.total_duration, 90)
+        self.assertEqual(rollups.verify([self.client_model.id]), [])
+
+    def test_serializer_update_moves_status(self):
+        self.send_call('call_001', '+919988776655', 'no-answer', '0')
+        lead = Lead.objects.get()
+        api_client = APIClient()
+        api_client.force_authenticate(self.user)
+
+        response = api_client.patch(reverse('lead-detail', kwargs={'pk': lead.pk}), {'status': 'contacted'})
+
+        self.assertEqual(response.status_code, 200)
+        rollup = LeadDailyRollup.objects.get(client=self.client_model)
+        self.assertEqual(rollup.new_count, 0)
+        self.assertEqual(rollup.contacted_count, 1)
+        self.assertEqual(rollup.responded_count, 1)
+        self.assertEqual(rollups.verify([self.client_model.id]), [])
+
+    def test_summary_matches_raw_analytics(self):
+        self.send_call('call_001', '+919988776655', 'completed', '45')
+        self.send_call('call_002', '+919988776656', 'no-answer', '0')
+        self.send_call('call_003', '+919988776657', 'completed', '400')
+
+        raw = analytics.summarize(analytics.filter_leads(self.client_model))
+        with self.assertNumQueries(1):
+            summary = rollups.summarize(self.client_model)
+
+        self.assertEqual(summary, raw)
+
+    def test_rebuild_command(self):
+        self.send_call('call_001', '+919988776655', 'completed', '45')
+        Lead.objects.create(client=self.client_model, customer_number='+919988776656',
+                            call_timestamp=timezone.now())
+
+        with self.assertRaises(CommandError):
+            call_command('rebuild_lead_rollups', '--verify', stdout=StringIO())
+        call_command('rebuild_lead_rollups', stdout=StringIO())
+        call_command('rebuild_lead_rollups', '--verify', stdout=StringIO())
+
+        self.assertEqual(rollups.summarize(self.client_model)['total_leads'], 2)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN output is SQLite specific')
+class QueryPlanTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client_model = Client.objects.create(
+            user=self.user,
+            business_name='Test Business',
+            virtual_number='+918045678901'
+        )
+        Lead.objects.create(client=self.client_model, customer_number='+919988776655',
+                            call_duration=45, call_timestamp=timezone.now())
+        self.test_client = TestClient()
+        self.test_client.login(username='testuser', password='testpass123')
+
+    def assertNoLeadTableScans(self, path, params=None, allow_sort=False):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.test_client.get(path, params or {})
+        self.assertLess(response.status_code, 400)
+
+        for query in captured.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or 'leads_' not in sql:
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+                plan = [row[-1] for row in cursor.fetchall()]
+            for step in plan:
+                # A virtual-table scan is an FTS index lookup, not a table scan.
+                self.assertIsNone(
+                    re.match(r'SCAN (TABLE )?leads_(?!\w+ VIRTUAL TABLE)', step),
+                    f'Full scan in plan {plan} for {sql}'
+                )
+                if not allow_sort:
+                    self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', step, f'Sort in plan {plan} for {sql}')
+
+    def test_dashboard_queries_use_indexes(self):
+        self.assertNoLeadTableScans('/dashboard/')
+        self.assertNoLeadTableScans('/dashboard/', {'days': 7, 'status': 'new'})
+        self.assertNoLeadTableScans('/dashboard/', {'duration': '121+'}, allow_sort=True)
+        self.assertNoLeadTableScans('/dashboard/', {'search': '9988'})
+        self.assertNoLeadTableScans('/dashboard/', {'q': 'refund'}, allow_sort=True)
+
+    def test_api_queries_use_indexes(self):
+        self.assertNoLeadTableScans('/analytics/')
+        api_client = APIClient()
+        api_client.force_authenticate(self.user)
+        self.test_client = api_client
+        self.assertNoLeadTableScans(reverse('lead-list'))
+        cursor = encode_cursor(Lead.objects.get())
+        self.assertNoLeadTableScans(reverse('lead-list'), {'cursor': cursor})
+        self.assertNoLeadTableScans(reverse('lead-changes'), {'since': changes.encode_since(1)})
+        self.assertNoLeadTableScans(reverse('lead-list'), {'q': 'refund'}, allow_sort=True)
+        callers.rebuild([self.client_model.id])
+        self.assertNoLeadTableScans(reverse('caller-list'))
+        self.assertNoLeadTableScans(reverse('caller-summary'))
+        self.assertNoLeadTableScans(reverse('caller-leads', args=[Caller.objects.get().id]), allow_sort=True)
+
+    def test_webhook_queries_use_indexes(self):
+        url = reverse('call-webhook', kwargs={'token': self.client_model.webhook_token})
+        self.assertNoLeadTableScans(url, {
+            'CallSid': 'test_call_001',
+            'From': '+919988776655',
+            'CallStatus': 'completed',
+            'Direction': 'incoming',
+            'StartTime': '2025-08-07T10:30:00Z',
+        })
+
+
+class PhoneNormalizationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client_model = Client.objects.create(
+            user=self.user,
+            business_name='Test Business',
+            virtual_number='+918045678901'
+        )
+
+    def test_provider_formats_normalize_to_e164(self):
+        for number in ['+91 99887 76655', '09988776655', '919988776655', '9988776655', '00919988776655']:
+            self.assertEqual(phone.normalize_e164(number), '+919988776655', number)
+        self.assertEqual(phone.normalize_e164('+1 (415) 555-0100'), '+14155550100')
+        self.assertIsNone(phone.normalize_e164('anonymous'))
+        self.assertIsNone(phone.normalize_e164('12345'))
+
+    def test_webhook_stores_normalized_number(self):
+        response = self.client.get(f'/webhook/{self.client_model.webhook_token}/', {
+            'CallSid': 'CA-e164', 'From': '09988776655', 'CallStatus': 'completed', 'Direction': 'incoming',
+        })
+        self.assertEqual(response.status_code, 200)
+        lead = Lead.objects.get(call_sid='CA-e164')
+        self.assertEqual(lead.customer_number, '09988776655')
+        self.assertEqual(lead.customer_e164, '+919988776655')
+        self.assertEqual(lead.customer_digits_reversed, '556677889919')
+
+    def test_save_renormalizes_edited_number(self):
+        lead = Lead.objects.create(client=self.client_model, customer_number='9988776655')
+        self.assertEqual(lead.customer_e164, '+919988776655')
+        lead.customer_number = '+14155550100'
+        lead.save()
+        lead.refresh_from_db()
+        self.assertEqual(lead.customer_e164, '+14155550100')
+        self.assertEqual(lead.customer_digits_reversed, '00105555141')
+
+    def test_search_by_prefix_suffix_and_full_number(self):
+        Lead.objects.create(client=self.client_model, customer_number='+919988776655')
+        Lead.objects.create(client=self.client_model, customer_number='08045671234')
+        Lead.objects.create(client=self.client_model, customer_number='+14155550100')
+
+        def numbers(search):
+            return sorted(analytics.filter_leads(self.client_model, search=search).values_list('customer_e164', flat=True))
+
+        self.assertEqual(numbers('99887'), ['+919988776655'])
+        self.assertEqual(numbers('080456'), ['+918045671234'])
+        self.assertEqual(numbers('+1415'), ['+14155550100'])
+        self.assertEqual(numbers('1234'), ['+918045671234'])
+        self.assertEqual(numbers('0100'), ['+14155550100'])
+        for number in ['09988776655', '919988776655', '+91 99887-76655', '00919988776655']:
+            self.assertEqual(numbers(number), ['+919988776655'], number)
+        self.assertEqual(numbers('77665'), [])
+
+
+class NotesSearchTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client_model = Client.objects.create(
+            user=self.user,
+            business_name='Test Business',
+            virtual_number='+918045678901'
+        )
+        other_user = User.objects.create_user(username='other', password='testpass123')
+        self.other_client = Client.objects.create(user=other_user, business_name='Other', virtual_number='+918045678902')
+
+    def add_lead(self, notes, client=None, **fields):
+        return Lead.objects.create(client=client or self.client_model, customer_number='+919988776655',
+                                   call_timestamp=timezone.now(), notes=notes, **fields)
+
+    def matches(self, q):
+        return sorted(analytics.filter_leads(self.client_model, q=q).values_list('id', flat=True))
+
+    def test_index_follows_inserts_updates_and_deletes(self):
+        lead = self.add_lead('Wants a refund for the damaged delivery')
+        self.add_lead('Asked about refund timelines', client=self.other_client)
+        self.assertEqual(self.matches('refund'), [lead.id])
+        self.assertEqual(self.matches('REFUNDS delivery'), [])
+        self.assertEqual(self.matches('refu deliv'), [lead.id])
+
+        Lead.objects.filter(id=lead.id).update(notes='Pricing question for bulk orders')
+        self.assertEqual(self.matches('refund'), [])
+        self.assertEqual(self.matches('pricing'), [lead.id])
+
+        lead.status = 'contacted'
+        Lead.objects.bulk_update([lead], ['status'])
+        self.assertEqual(self.matches('pricing'), [lead.id])
+
+        lead.delete()
+        self.assertEqual(self.matches('pricing'), [])
+
+    def test_query_syntax_is_not_interpreted(self):
+        lead = self.add_lead('Callback "NEAR" the office OR home')
+        self.assertEqual(self.matches('"near" OR'), [lead.id])
+        self.assertEqual(self.matches('client_id:1 AND'), [])
+        self.assertEqual(analytics.filter_leads(self.client_model, q='***').count(), 1)
+
+    def test_api_ranks_best_match_first_and_pages(self):
+        weak = self.add_lead('Refund requested, also asked about invoices, pricing, delivery and warranty terms')
+        strong = self.add_lead('Refund refund refund')
+        self.add_lead('Unrelated')
+        api_client = APIClient()
+        api_client.force_authenticate(self.user)
+
+        response = api_client.get(reverse('lead-list'), {'q': 'refund', 'page_size': 1})
+        self.assertEqual([lead['id'] for lead in response.data['results']], [strong.id])
+        response = api_client.get(response.data['next'])
+        self.assertEqual([lead['id'] for lead in response.data['results']], [weak.id])
+        self.assertIsNone(response.data['next'])
+
+    def test_dashboard_filters_by_notes(self):
+        match = self.add_lead('Needs a quote for solar panels')
+        self.add_lead('Wrong number')
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get('/dashboard/', {'q': 'solar'})
+        self.assertEqual([lead.id for lead in response.context['leads_page']], [match.id])
+        self.assertEqual(response.context['analytics']['total_leads'], 1)
+        self.assertFalse(response.context['live_updates'])
+
+    def test_falls_back_to_icontains_without_fts(self):
+        match = self.add_lead('Needs a quote for solar panels')
+        self.add_lead('Wrong number')
+        available = notes_search.available
+        notes_search.available = lambda alias, name: False
+        try:
+            self.assertEqual(self.matches('SOLAR quote'), [match.id])
+            queryset = analytics.filter_leads(self.client_model, q='solar')
+            self.assertNotIn('search_rank', notes_search.rank(queryset, self.client_model.id, 'solar').query.annotations)
+        finally:
+            notes_search.available = available
+
+
+class CallerTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client_model = Client.objects.create(
+            user=self.user,
+            business_name='Test Business',
+            virtual_number='+918045678901'
+        )
+        self.url = reverse('call-webhook', kwargs={'token': self.client_model.webhook_token})
+
+    def send_call(self, call_sid, number, duration=0, start_time=None, status='completed'):
+        params = {'CallSid': call_sid, 'From': number, 'CallStatus': status,
+                  'Direction': 'incoming', 'DialCallDuration': duration}
+        if start_time:
+            params['StartTime'] = start_time.isoformat()
+        return self.client.get(self.url, params)
+
+    def assertCallersMatchLeads(self):
+        stored = {
+            number: values for number, *values in Caller.objects.filter(client=self.client_model).values_list(
+                'number', 'first_seen', 'last_seen', 'call_count', 'total_duration', 'latest_status'
+            )
+        }
+        expected = {
+            number: [row[field] for field in ['first_seen', 'last_seen', 'call_count', 'total_duration', 'latest_status']]
+            for (_, number), row in callers.compute_callers(Lead.objects.filter(client=self.client_model)).items()
+        }
+        self.assertEqual(stored, expected)
+
+    def test_webhook_upserts_caller_across_number_formats(self):
+        now = timezone.now().replace(microsecond=0)
+        self.send_call('CA1', '+919988776655', 30, now - timedelta(days=2))
+        self.send_call('CA2', '09988776655', 45, now, status='no-answer')
+        self.send_call('CA3', '9988776655', 15, now - timedelta(days=1))
+        self.send_call('CA4', '+14155550100', 10, now)
+
+        caller = Caller.objects.get(client=self.client_model, number='+919988776655')
+        self.assertEqual(caller.call_count, 3)
+        self.assertEqual(caller.total_duration, 90)
+        self.assertEqual(caller.first_seen, now - timedelta(days=2))
+        self.assertEqual(caller.last_seen, now)
+        self.assertEqual(caller.latest_status, 'new')
+        self.assertEqual(callers.summarize(self.client_model),
+                         {'unique_callers': 2, 'repeat_callers': 1, 'repeat_calls': 3})
+
+        # A repeated event for the same call updates it instead of counting another call.
+        self.send_call('CA2', '09988776655', 60, now)
+        caller.refresh_from_db()
+        self.assertEqual((caller.call_count, caller.total_duration, caller.latest_status), (3, 105, 'contacted'))
+        self.assertCallersMatchLeads()
+
+    def test_batch_import_edit_and_delete_paths(self):
+        received_at = timezone.now()
+        events = [
+            ingest.parse_call_event({'CallSid': f'CA{index}', 'From': number, 'Direction': 'incoming',
+                                     'CallStatus': 'completed', 'DialCallDuration': '20'})
+            for index, number in enumerate(['09988776655', '919988776655', '08045671234'])
+        ]
+        ingest.record_calls([(self.client_model.id, event, received_at) for event in events[:2]])
+        ingest.import_calls(self.client_model.id, events[2:], received_at - timedelta(days=3))
+        self.assertCallersMatchLeads()
+
+        api_client = APIClient()
+        api_client.force_authenticate(self.user)
+        lead = Lead.objects.get(call_sid='CA1')
+        api_client.patch(reverse('lead-detail', args=[lead.id]), {'status': 'converted'}, format='json')
+        self.assertEqual(Caller.objects.get(number='+919988776655').latest_status, 'converted')
+
+        api_client.delete(reverse('lead-detail', args=[Lead.objects.get(call_sid='CA0').id]))
+        api_client.delete(reverse('lead-detail', args=[lead.id]))
+        self.assertFalse(Caller.objects.filter(number='+919988776655').exists())
+        self.assertEqual(Caller.objects.get(number='+918045671234').call_count, 1)
+
+    def test_rebuild_matches_incremental(self):
+        now = timezone.now()
+        for index in range(4):
+            self.send_call(f'CA{index}', f'+9199887766{index % 2}0', index * 10, now - timedelta(hours=index))
+        incremental = sorted(Caller.objects.values_list('number', 'call_count', 'total_duration', 'latest_status'))
+        self.assertEqual(callers.rebuild([self.client_model.id]), 2)
+        self.assertEqual(
+            sorted(Caller.objects.values_list('number', 'call_count', 'total_duration', 'latest_status')), incremental
+        )
+
+    def test_api_lists_callers_and_history(self):
+        now = timezone.now()
+        self.send_call('CA1', '+919988776655', 30, now - timedelta(days=1))
+        self.send_call('CA2', '09988776655', 30, now)
+        self.send_call('CA3', '+14155550100', 30, now - timedelta(days=2))
+        api_client = APIClient()
+        api_client.force_authenticate(self.user)
+
+        data = api_client.get(reverse('caller-list')).data
+        self.assertEqual([row['number'] for row in data['results']], ['+919988776655', '+14155550100'])
+        repeat = api_client.get(reverse('caller-list'), {'repeat': 1}).data['results']
+        self.assertEqual([row['call_count'] for row in repeat], [2])
+        self.assertEqual(api_client.get(reverse('caller-summary')).data['repeat_callers'], 1)
+
+        history = api_client.get(reverse('caller-leads', args=[repeat[0]['id']])).data
+        self.assertEqual([lead['call_sid'] for lead in history['results']], ['CA2', 'CA1'])
+
+    def test_dashboard_shows_repeat_callers(self):
+        self.send_call('CA1', '+919988776655', 30)
+        self.send_call('CA2', '09988776655', 30)
+        self.client.login(username='testuser', password='testpass123')
+        response = self.client.get('/dashboard/')
+        self.assertEqual(response.context['caller_stats']['repeat_callers'], 1)
+        self.assertEqual(response.context['top_callers'][0]['number'], '+919988776655')
+        self.assertContains(response, 'Top Repeat Callers')
+
+
+class ClientTokenCacheTestCase(TestCase):
+    def setUp(self):
+        client_cache.clear()
+        self.client_model = Client.objects.create(
+            business_name='Test Business',
+            virtual_number='+918045678901'
+        )
+
+    def test_hit_skips_database(self):
+        self.assertEqual(client_cache.get(self.client_model.webhook_token), self.client_model)
+        with self.assertNumQueries(0):
+            self.assertEqual(client_cache.get(self.client_model.webhook_token), self.client_model)
+
+    def test_unknown_token_cached_negatively(self):
+        token = uuid.uuid4()
+        self.assertIsNone(client_cache.get(token))
+        with self.assertNumQueries(0):
+            self.assertIsNone(client_cache.get(token))
+
+    def test_invalidated_on_save_and_delete(self):
+        token = uuid.uuid4()
+        self.assertIsNone(client_cache.get(token))
+
+        created = Client.objects.create(business_name='Other', virtual_number='+918045678902', webhook_token=token)
+        self.assertEqual(client_cache.get(token), created)
+
+        created.delete()
+        self.assertIsNone(client_cache.get(token))
+
+    def test_bounded_and_expiring(self):
+        cache = ClientTokenCache(maxsize=2, ttl=300)
+        tokens = [uuid.uuid4() for _ in range(3)]
+        for token in tokens:
+            cache.get(token)
+        with self.assertNumQueries(1):
+            cache.get(tokens[0])
+
+        expiring = ClientTokenCache(maxsize=2, ttl=0)
+        expiring.get(tokens[0])
+        with self.assertNumQueries(1):
+            expiring.get(tokens[0])
+
+    def test_webhook_uses_cache(self):
+        url = reverse('call-webhook', kwargs={'token': self.client_model.webhook_token})
+        params = {'CallSid': 'call_001', 'From': '+919988776655', 'Direction': 'incoming'}
+        TestClient().get(url, params)
+
+        with CaptureQueriesContext(connection) as captured:
+            response = TestClient().get(url, params)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('FROM "leads_client"' in query['sql'] for query in captured.captured_queries))
+
+
+class WebhookSpoolTestCase(TestCase):
+    def setUp(self):
+        self.client_model = Client.objects.create(
+            business_name='Test Business',
+            virtual_number='+918045678901'
+        )
+        self.url = reverse('call-webhook', kwargs={'token': self.client_model.webhook_token})
+        self.spool_dir = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(
+            WEBHOOK_INGEST_MODE='spool',
+            WEBHOOK_SPOOL_PATH=os.path.join(self.spool_dir.name, 'spool.sqlite3'),
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.addCleanup(self.spool_dir.cleanup)
+
+    def send_call(self, call_sid, call_status='completed', duration='45', **extra):
+        return TestClient().get(self.url, {
+            'CallSid': call_sid,
+            'From': '+919988776655',
+            'CallStatus': call_status,
+            'Direction': 'incoming',
+            'DialCallDuration': duration,
+            **extra,
+        })
+
+    def test_webhook_queues_without_writing_leads(self):
+        response = self.send_call('call_001')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['message'], 'Lead queued')
+        self.assertEqual(Lead.objects.count(), 0)
+        self.assertEqual(len(spool.get_spool()), 1)
+
+    def test_webhook_validates_before_queueing(self):
+        response = TestClient().get(self.url, {'Direction': 'incoming'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(len(spool.get_spool()), 0)
+
+    def test_drain_writes_batches(self):
+        self.send_call('call_001', 'no-answer', '0')
+        self.send_call('call_002', StartTime='2025-08-07T10:30:00Z')
+        self.send_call('call_001', 'completed', '30')
+        self.send_call('call_003')
+
+        call_command('drain_webhook_spool', '--once', '--batch-size', '2', stdout=StringIO())
+
+        self.assertEqual(len(spool.get_spool()), 0)
+        self.assertEqual(Lead.objects.count(), 3)
+        lead = Lead.objects.get(call_sid='call_001')
+        self.assertEqual(lead.status, 'contacted')
+        self.assertEqual(lead.call_duration, 30)
+        self.assertEqual(str(Lead.objects.get(call_sid='call_002').call_timestamp), '2025-08-07 10:30:00+00:00')
+        self.assertEqual(rollups.verify([self.client_model.id]), [])
+
+    def test_failing_event_is_moved_aside(self):
+        self.send_call('call_001')
+        event = ingest.parse_call_event({'CallSid': 'call_bad', 'From': '+919988776655', 'Direction': 'incoming'})
+        spool.get_spool().append(self.client_model.id, {**event, 'status': None})
+        self.send_call('call_002')
+
+        with self.assertLogs('leads.spool', 'WARNING'):
+            call_command('drain_webhook_spool', '--once', stdout=StringIO())
+
+        self.assertEqual(len(spool.get_spool()), 0)
+        self.assertEqual(spool.get_spool().dead_count(), 1)
+        self.assertEqual(sorted(Lead.objects.values_list('call_sid', flat=True)), ['call_001', 'call_002'])
+        self.assertEqual(rollups.verify([self.client_model.id]), [])
+
+    def test_overlong_fields_are_rejected_before_queueing(self):
+        self.assertEqual(self.send_call('c' * 65).status_code, 400)
+        self.assertEqual(self.send_call('call_001', From='9' * 21).status_code, 400)
+        self.assertEqual(len(spool.get_spool()), 0)
+
+    def test_replayed_batch_is_idempotent(self):
+        self.send_call('call_001')
+        webhook_spool = spool.get_spool()
+        batch = webhook_spool.read_batch(10)
+        items = [(client_id, event, received_at) for _, client_id, event, received_at in batch]
+
+        self.assertEqual(ingest.record_calls(items), [True])
+        self.assertEqual(ingest.record_calls(items), [False])
+        self.assertEqual(Lead.objects.count(), 1)
+        self.assertEqual(rollups.summarize(self.client_model)['total_leads'], 1)
+
+
+class WebhookBatchTestCase(TestCase):
+    def setUp(self):
+        self.client_model = Client.objects.create(
+            business_name='Test Business',
+            virtual_number='+918045678901'
+        )
+        self.url = reverse('call-webhook', kwargs={'token': self.client_model.webhook_token})
+        self.events = [
+            {'CallSid': 'call_001', 'From': '+919988776655', 'CallStatus': 'completed',
+             'Direction': 'incoming', 'DialCallDuration': 45, 'StartTime': '2025-08-07T10:30:00Z'},
+            {'CallSid': 'call_002', 'From': '+919988776656', 'CallStatus': 'busy', 'Direction': 'incoming'},
+            {'CallSid': 'call_003', 'From': '+918045678901', 'Direction': 'outbound'},
+            {'From': '+919988776657', 'Direction': 'incoming'},
+            {'CallSid': 'call_001', 'From': '+919988776655', 'CallStatus': 'completed',
+             'Direction': 'incoming', 'DialCallDuration': 60},
+        ]
+
+    def test_json_array_batch(self):
+        response = TestClient().post(self.url, json.dumps(self.events), content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [result['result'] for result in response.json()['results']],
+            ['created', 'created', 'filtered', 'rejected', 'updated']
+        )
+        self.assertEqual(Lead.objects.count(), 2)
+        lead = Lead.objects.get(call_sid='call_001')
+        self.assertEqual(lead.call_duration, 60)
+        self.assertEqual(str(lead.call_timestamp), '2025-08-07 10:30:00+00:00')
+        self.assertEqual(rollups.verify([self.client_model.id]), [])
+
+    def test_batch_mixing_naive_and_missing_start_times(self):
+        events = [
+            {'CallSid': 'a1', 'From': '+919988776655', 'Direction': 'incoming', 'StartTime': '2025-08-07 10:30:00'},
+            {'CallSid': 'a2', 'From': '+919988776655', 'Direction': 'incoming'},
+        ]
+        response = TestClient().post(self.url, json.dumps(events), content_type='application/json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['result'] for result in response.json()['results']], ['created', 'created'])
+        lead = Lead.objects.get(call_sid='a1')
+        self.assertEqual(lead.call_timestamp, timezone.make_aware(datetime(2025, 8, 7, 10, 30)))
+        self.assertEqual(Caller.objects.get().call_count, 2)
+        self.assertEqual(rollups.verify([self.client_model.id]), [])
+
+    def test_gzipped_ndjson_batch(self):
+        body = '\n'.join(json.dumps(event) for event in self.events).encode()
+
+        response = TestClient().post(
+            self.url, gzip.compress(body), content_type='application/x-ndjson',
+            headers={'Content-Encoding': 'gzip'}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 5)
+        self.assertEqual(Lead.objects.count(), 2)
+
+    def test_replayed_batch_updates(self):
+        TestClient().post(self.url, json.dumps(self.events[:2]), content_type='application/json')
+        response = TestClient().post(self.url, json.dumps(self.events[:2]), content_type='application/json')
+
+        self.assertEqual([result['result'] for result in response.json()['results']], ['updated', 'updated'])
+        self.assertEqual(Lead.objects.count(), 2)
+
+    def test_malformed_batch(self):
+        response = TestClient().post(self.url, '[{"CallSid":', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        response = TestClient().post(self.url, b'not gzip', content_type='application/json',
+                                     headers={'Content-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_truncated_gzip_batch_is_rejected(self):
+        body = gzip.compress(json.dumps(self.events).encode())
+
+        for payload in (body[:-8], body + b'trailing'):
+            response = TestClient().post(self.url, payload, content_type='application/json',
+                                         headers={'Content-Encoding': 'gzip'})
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(Lead.objects.count(), 0)
+
+    def test_batch_size_limit_applies_to_the_batch_route_only(self):
+        self.assertEqual(settings.DATA_UPLOAD_MAX_MEMORY_SIZE, 2.5 * 1024 * 1024)
+        body = json.dumps(self.events)
+
+        with override_settings(WEBHOOK_BATCH_MAX_BYTES=len(body) - 1):
+            response = TestClient().post(self.url, body, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], 'Batch is too large')
+
+        with override_settings(WEBHOOK_BATCH_MAX_BYTES=len(body), DATA_UPLOAD_MAX_MEMORY_SIZE=10):
+            response = TestClient().post(self.url, body, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Lead.objects.count(), 2)
+
+    def test_batch_invalid_token(self):
+        url = reverse('call-webhook', kwargs={'token': uuid.uuid4()})
+        response = TestClient().post(url, json.dumps(self.events), content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+
+class LeadPaginationTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client_model = Client.objects.create(
+            user=self.user,
+            business_name='Test Business',
+            virtual_number='+918045678901'
+        )
+        now = timezone.now()
+        for index in range(25):
+            Lead.objects.create(
+                client=self.client_model,
+                customer_number=f'+9199887766{index:02d}',
+                call_timestamp=now - timedelta(minutes=index // 3),
+            )
+        Lead.objects.create(client=self.client_model, customer_number='+919988776699')
+        self.expected = list(
+            Lead.objects.order_by(F('call_timestamp').desc(nulls_last=True), '-id').values_list('id', flat=True)
+        )
+
+    def test_api_walks_every_lead_once(self):
+        api_client = APIClient()
+        api_client.force_authenticate(self.user)
+        seen = []
+        url = reverse('lead-list') + '?page_size=4'
+
+        while url:
+            data = api_client.get(url).json()
+            self.assertLessEqual(len(data['results']), 4)
+            seen.extend(item['id'] for item in data['results'])
+            url = data['next']
+
+        self.assertEqual(seen, self.expected)
+
+    def test_api_rejects_invalid_cursor(self):
+        api_client = APIClient()
+        api_client.force_authenticate(self.user)
+        response = api_client.get(reverse('lead-list'), {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_dashboard_table_pages(self):
+        test_client = TestClient()
+        test_client.login(username='testuser', password='testpass123')
+
+        first = test_client.get('/dashboard/', {'days': 7})
+        self.assertEqual([lead.id for lead in first.context['leads_page']], self.expected[:20])
+        self.assertIsNone(first.context['first_page_url'])
+        self.assertIn('days=7', first.context['next_page_url'])
+
+        second = test_client.get('/dashboard/' + first.context['next_page_url'])
+        self.assertEqual([lead.id for lead in second.context['leads_page']], self.expected[20:])
+        self.assertIsNone(second.context['next_page_url'])
+        self.assertEqual(second.context['first_page_url'], '?days=7')
+
+
+class LeadExportTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client_model = Client.objects.create(
+            user=self.user,
+            business_name='Test Business',
+            virtual_number='+918045678901'
+        )
+        now = timezone.now()
+        Lead.objects.create(client=self.client_model, customer_number='+919988776655', status='converted',
+                            call_duration=45, call_timestamp=now - timedelta(days=1), notes='Wants, "a quote"')
+        Lead.objects.create(client=self.client_model, customer_number='+919988776656',
+                            call_duration=0, call_timestamp=now - timedelta(days=60))
+        other = Client.objects.create(business_name='Other Business', virtual_number='+918045678902')
+        Lead.objects.create(client=other, customer_number='+919988776657', call_timestamp=now)
+        self.test_client = TestClient()
+        self.test_client.login(username='testuser', password='testpass123')
+
+    def test_csv_export_streams_client_leads(self):
+        response = self.test_client.get(reverse('lead-export'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.reader(StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(rows[0], export.EXPORT_FIELDS)
+        self.assertEqual([row[2] for row in rows[1:]], ['+919988776656', '+919988776655'])
+        self.assertEqual(rows[2][-1], 'Wants, "a quote"')
+
+    def test_ndjson_export_applies_filters(self):
+        response = self.test_client.get(reverse('lead-export'), {'format': 'ndjson', 'days': 30})
+
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertEqual(json.loads(lines[0])['status'], 'converted')
+
+        response = self.test_client.get(reverse('lead-export'), {'format': 'ndjson', 'duration': '0'})
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['customer_number'] for line in lines], ['+919988776656'])
+
+    def test_unknown_format_rejected(self):
+        response = self.test_client.get(reverse('lead-export'), {'format': 'xlsx'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_invalid_days_rejected(self):
+        for days in ('abc', '1.5', '999999999'):
+            response = self.test_client.get(reverse('lead-export'), {'days': days})
+            self.assertEqual(response.status_code, 400)
+
+
+class ImportCallLogTestCase(TestCase):
+    def setUp(self):
+        self.client_model = Client.objects.create(
+            business_name='Test Business',
+            virtual_number='+918045678901'
+        )
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def write_csv(self, name, rows):
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['CallSid', 'From', 'Direction', 'CallStatus',
+                                                   'DialCallDuration', 'StartTime'])
+            writer.writeheader()
+            writer.writerows(rows)
+        return path
+
+    def run_import(self, path, *args):
+        out = StringIO()
+        call_command('import_call_log', path, '--client-id', str(self.client_model.id), *args, stdout=out)
+        return out.getvalue()
+
+    def test_csv_import_maps_status_and_skips_duplicates(self):
+        path = self.write_csv('calls.csv', [
+            {'CallSid': 'CA1', 'From': '+919988776655', 'Direction': 'incoming', 'CallStatus': 'completed',
+             'DialCallDuration': '45', 'StartTime': '2024-03-01T10:00:00+00:00'},
+            {'CallSid': 'CA2', 'From': '+919988776656', 'Direction': 'incoming', 'CallStatus': 'no-answer',
+             'DialCallDuration': '', 'StartTime': '2024-03-02T10:00:00+00:00'},
+            {'CallSid': 'CA2', 'From': '+919988776656', 'Direction': 'incoming', 'CallStatus': 'no-answer',
+             'DialCallDuration': '', 'StartTime': '2024-03-02T10:00:00+00:00'},
+            {'CallSid': 'CA3', 'From': '+919988776657', 'Direction': 'outgoing', 'CallStatus': 'completed',
+             'DialCallDuration': '10', 'StartTime': ''},
+            {'CallSid': '', 'From': '+919988776658', 'Direction': 'incoming', 'CallStatus': 'completed',
+             'DialCallDuration': '10', 'StartTime': ''},
+        ])
+
+        output = self.run_import(path, '--transaction-size', '2')
+
+        self.assertIn('Imported 2 leads (1 duplicates skipped, 1 filtered, 1 rejected)', output)
+        leads = {lead.call_sid: lead for lead in Lead.objects.filter(client=self.client_model)}
+        self.assertEqual(leads['CA1'].status, 'contacted')
+        self.assertEqual(leads['CA1'].call_duration, 45)
+        self.assertEqual(leads['CA2'].status, 'new')
+        self.assertEqual(rollups.verify([self.client_model.id]), [])
+
+        output = self.run_import(path)
+        self.assertIn('Imported 0 leads (3 duplicates skipped', output)
+        self.assertEqual(Lead.objects.filter(client=self.client_model).count(), 2)
+
+    def test_gzipped_ndjson_import(self):
+        path = os.path.join(self.tmpdir.name, 'calls.ndjson.gz')
+        with gzip.open(path, 'wt') as f:
+            f.write(json.dumps({'CallSid': 'CA1', 'From': '+919988776655', 'Direction': 'incoming',
+                                'CallStatus': 'completed', 'DialCallDuration': 30, 'RecordingUrl': None}) + '\n')
+            f.write('not json\n')
+
+        output = self.run_import(path)
+
+        self.assertIn('Imported 1 leads (0 duplicates skipped, 0 filtered, 1 rejected)', output)
+        lead = Lead.objects.get(client=self.client_model, call_sid='CA1')
+        self.assertEqual(lead.call_duration, 30)
+        self.assertIsNone(lead.recording_url)
+        self.assertIsNotNone(lead.call_timestamp)
+        self.assertEqual(rollups.verify([self.client_model.id]), [])
+
+    def test_short_rows_are_rejected(self):
+        path = os.path.join(self.tmpdir.name, 'calls.csv')
+        with open(path, 'w', newline='') as f:
+            f.write('CallSid,From,Direction,CallStatus,DialCallDuration,StartTime\n')
+            f.write('CA1,+919988776655,incoming,completed,45,2024-03-01T10:00:00+00:00\n')
+            f.write('CA2,+919988776656\n')
+            f.write('CA3,+919988776657,incoming\n')
+
+        output = self.run_import(path)
+
+        self.assertIn('Imported 1 leads (0 duplicates skipped, 0 filtered, 2 rejected)', output)
+        self.assertEqual(ingest.parse_call_event({'CallSid': 'CA4', 'From': '+919988776655', 'Direction': 'incoming',
+                                                  'CallStatus': None})['status'], 'new')
+        self.assertIsNone(ingest.parse_call_event({'CallSid': 'CA5', 'From': '+919988776655', 'Direction': None}))
+
+    @override_settings(TIME_ZONE='Asia/Kolkata')
+    def test_naive_start_times_roll_up_in_the_configured_timezone(self):
+        path = self.write_csv('calls.csv', [
+            {'CallSid': 'CA1', 'From': '+919988776655', 'Direction': 'incoming', 'CallStatus': 'completed',
+             'DialCallDuration': '45', 'StartTime': '2024-03-01 23:30:00'},
+        ])
+
+        self.run_import(path)
+
+        lead = Lead.objects.get(client=self.client_model, call_sid='CA1')
+        self.assertEqual(timezone.localtime(lead.call_timestamp).date(), datetime(2024, 3, 1).date())
+        self.assertEqual(
+            list(LeadDailyRollup.objects.filter(client=self.client_model).values_list('day', flat=True)),
+            [datetime(2024, 3, 1).date()],
+        )
+        self.assertEqual(rollups.verify([self.client_model.id]), [])
+
+        lead.call_timestamp = datetime(2024, 3, 1, 23, 30)
+        with self.assertRaises(ValueError):
+            rollups.rollup_day(lead)
+
+    def test_unknown_client_rejected(self):
+        with self.assertRaises(CommandError):
+            call_command('import_call_log', self.write_csv('calls.csv', []), '--client-id', '999', stdout=StringIO())
+
+
+class AnalyticsCacheTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client_model = Client.objects.create(
+            user=self.user,
+            business_name='Test Business',
+            virtual_number='+918045678901'
+        )
+        self.test_client = TestClient()
+        self.test_client.login(username='testuser', password='testpass123')
+
+    def send_call(self, call_sid, call_status='completed'):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.test_client.get(f'/webhook/{self.client_model.webhook_token}/', {
+                'CallSid': call_sid, 'From': '+919988776655', 'CallStatus': call_status,
+                'Direction': 'incoming', 'DialCallDuration': '30',
+            })
+
+    def lead_queries(self, path, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.test_client.get(path, params or {})
+        self.assertEqual(response.status_code, 200)
+        # Leave out the two cheap ETag watermark queries.
+        watermark = ('"leads_leadchangesequence"."last_seq"', 'SUM("leads_leaddailyrollup"."lead_count")')
+        return [
+            q['sql'] for q in queries.captured_queries
+            if 'leads_lead' in q['sql'] and not any(part in q['sql'] for part in watermark)
+        ]
+
+    def test_repeat_views_hit_cache(self):
+        self.send_call('CA1')
+
+        self.assertTrue(self.lead_queries('/analytics/'))
+        self.assertEqual(self.lead_queries('/analytics/'), [])
+        self.lead_queries('/dashboard/', {'status': 'contacted'})
+        dashboard_queries = self.lead_queries('/dashboard/', {'status': 'contacted'})
+        # Only the lead table page is left.
+        self.assertEqual(len(dashboard_queries), 1)
+
+    def test_webhook_write_invalidates(self):
+        self.send_call('CA1')
+        self.assertEqual(self.test_client.get('/analytics/').json()['kpis']['total_leads'], 1)
+
+        self.send_call('CA2')
+        self.assertEqual(self.test_client.get('/analytics/').json()['kpis']['total_leads'], 2)
+
+        self.send_call('CA2', call_status='no-answer')
+        response = self.test_client.get('/dashboard/', {'status': 'new'})
+        self.assertEqual(response.context['analytics']['total_leads'], 1)
+
+    def test_api_update_invalidates(self):
+        self.send_call('CA1')
+        self.test_client.get('/analytics/')
+        lead = Lead.objects.get(call_sid='CA1')
+
+        api_client = APIClient()
+        api_client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = api_client.patch(reverse('lead-detail', kwargs={'pk': lead.pk}), {'status': 'converted'})
+        self.assertEqual(response.status_code, 200)
+
+        data = self.test_client.get('/analytics/').json()
+        self.assertEqual(data['leads_by_status'], [{'status': 'converted', 'count': 1}])
+
+    def test_versions_are_per_client(self):
+        other = Client.objects.create(business_name='Other Business', virtual_number='+918045678902')
+        version = analytics_cache.data_version(other.id)
+
+        self.send_call('CA1')
+
+        self.assertEqual(analytics_cache.data_version(other.id), version)
+        self.assertNotEqual(analytics_cache.data_version(self.client_model.id), version)
+
+    def test_file_backend(self):
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': location,
+        }}):
+            self.send_call('CA1')
+            self.assertEqual(self.test_client.get('/analytics/').json()['kpis']['total_leads'], 1)
+            self.assertEqual(self.lead_queries('/analytics/'), [])
+            self.send_call('CA2')
+            self.assertEqual(self.test_client.get('/analytics/').json()['kpis']['total_leads'], 2)
+
+
+class ConditionalGetTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client_model = Client.objects.create(
+            user=self.user,
+            business_name='Test Business',
+            virtual_number='+918045678901'
+        )
+        self.test_client = TestClient()
+        self.test_client.login(username='testuser', password='testpass123')
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(self.user)
+
+    def send_call(self, call_sid, call_status='completed'):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.test_client.get(f'/webhook/{self.client_model.webhook_token}/', {
+                'CallSid': call_sid, 'From': '+919988776655', 'CallStatus': call_status,
+                'Direction': 'incoming', 'DialCallDuration': '30',
+            })
+
+    def test_analytics_not_modified_until_a_write(self):
+        self.send_call('CA1')
+        response = self.test_client.get('/analytics/')
+        etag = response['ETag']
+        self.assertNotIn('Last-Modified', response)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.test_client.get('/analytics/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+        self.assertFalse(any('COUNT(' in q['sql'] for q in queries.captured_queries))
+
+        self.send_call('CA1', call_status='no-answer')
+        response = self.test_client.get('/analytics/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_leads_etag_tracks_writes_and_deletes(self):
+        self.send_call('CA1')
+        self.send_call('CA2')
+        url = reverse('lead-list')
+        etag = self.api_client.get(url)['ETag']
+
+        self.assertEqual(self.api_client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertNotEqual(self.api_client.get(url, {'page_size': 1})['ETag'], etag)
+
+        lead = Lead.objects.get(call_sid='CA1')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api_client.delete(reverse('lead-detail', kwargs={'pk': lead.pk}))
+        response = self.api_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 1)
+
+    def test_if_modified_since_is_ignored(self):
+        self.send_call('CA1')
+        self.send_call('CA2')
+        since = 'Fri, 01 Jan 2100 00:00:00 GMT'
+        self.assertEqual(self.api_client.get(reverse('lead-list'), HTTP_IF_MODIFIED_SINCE=since).status_code, 200)
+
+    def test_etag_changes_on_writes_in_the_same_second_and_deletes(self):
+        self.send_call('CA1')
+        etags = [self.api_client.get(reverse('lead-list'))['ETag']]
+        self.send_call('CA1', call_status='no-answer')
+        etags.append(self.api_client.get(reverse('lead-list'))['ETag'])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api_client.delete(reverse('lead-detail', args=[Lead.objects.get(call_sid='CA1').pk]))
+        etags.append(self.api_client.get(reverse('lead-list'))['ETag'])
+        self.assertEqual(len(set(etags)), 3)
+
+    def test_bulk_update_moves_watermark(self):
+        self.send_call('CA1')
+        before, _ = conditional.client_watermark(self.client_model)
+
+        ingest.record_calls([(self.client_model.id, {
+            'call_sid': 'CA1', 'customer_number': '+919988776655', 'status': 'new',
+            'call_duration': 0, 'recording_url': None, 'call_timestamp': None,
+        }, timezone.now())])
+
+        after, count = conditional.client_watermark(self.client_model)
+        self.assertGreater(after, before)
+        self.assertEqual(count, 1)
+
+
+class ChangeFeedTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client_model = Client.objects.create(
+            user=self.user,
+            business_name='Test Business',
+            virtual_number='+918045678901'
+        )
+        self.api_client = APIClient()
+        self.api_client.force_authenticate(self.user)
+
+    def send_call(self, call_sid, call_status='completed'):
+        self.api_client.get(reverse('call-webhook', kwargs={'token': self.client_model.webhook_token}), {
+            'CallSid': call_sid, 'From': '+919988776655', 'CallStatus': call_status,
+            'Direction': 'incoming', 'DialCallDuration': '30',
+        })
+
+    def feed(self, since=None, **params):
+        if since is not None:
+            params['since'] = since
+        response = self.api_client.get(reverse('lead-changes'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_feed_returns_changes_in_order_and_resumes(self):
+        self.send_call('CA1')
+        self.send_call('CA2')
+        data = self.feed()
+        self.assertEqual([(c['op'], c['lead']['call_sid']) for c in data['changes']],
+                         [('upsert', 'CA1'), ('upsert', 'CA2')])
+        self.assertFalse(data['has_more'])
+
+        since = data['next']
+        self.assertEqual(self.feed(since)['changes'], [])
+
+        self.send_call('CA1', call_status='no-answer')
+        lead = Lead.objects.get(call_sid='CA2')
+        self.api_client.delete(reverse('lead-detail', kwargs={'pk': lead.pk}))
+
+        data = self.feed(since)
+        self.assertEqual([c['op'] for c in data['changes']], ['upsert', 'delete'])
+        self.assertEqual(data['changes'][0]['lead']['status'], 'new')
+        self.assertEqual(data['changes'][1]['id'], lead.pk)
+        self.assertEqual(data['changes'][1]['call_sid'], 'CA2')
+
+        # Superseded versions of a lead are not replayed from the start.
+        self.assertEqual([c['op'] for c in self.feed()['changes']], ['upsert', 'delete'])
+
+    def test_limit_and_has_more(self):
+        for index in range(5):
+            self.send_call(f'CA{index}')
+
+        data = self.feed(limit=2)
+        self.assertEqual(len(data['changes']), 2)
+        self.assertTrue(data['has_more'])
+        data = self.feed(data['next'], limit=10)
+        self.assertEqual([c['lead']['call_sid'] for c in data['changes']], ['CA2', 'CA3', 'CA4'])
+        self.assertFalse(data['has_more'])
+
+    def test_bulk_writes_are_sequenced(self):
+        received_at = timezone.now()
+        event = {'customer_number': '+919988776655', **phone.normalized_fields('+919988776655'),
+                 'status': 'new', 'call_duration': 0, 'recording_url': None, 'call_timestamp': None}
+        ingest.record_calls([(self.client_model.id, {**event, 'call_sid': sid}, received_at)
+                             for sid in ['CA1', 'CA2']])
+        since = self.feed()['next']
+        ingest.record_calls([(self.client_model.id, {**event, 'call_sid': 'CA2', 'status': 'contacted'}, received_at)])
+        ingest.import_calls(self.client_model.id, [{**event, 'call_sid': 'CA3'}], received_at)
+
+        data = self.feed(since)
+        self.assertEqual([c['lead']['call_sid'] for c in data['changes']], ['CA2', 'CA3'])
+        seqs = list(Lead.objects.order_by('change_seq').values_list('change_seq', flat=True))
+        self.assertEqual(seqs, [1, 3, 4])
+
+    def test_feed_is_per_client(self):
+        other = Client.objects.create(business_name='Other Business', virtual_number='+918045678902')
+        Lead.objects.create(client=other, customer_number='+919988776655', call_sid='CA1')
+
+        self.assertEqual(self.feed()['changes'], [])
+
+    def test_deleting_client_leaves_no_tombstones(self):
+        self.send_call('CA1')
+        self.client_model.delete()
+        self.assertFalse(LeadTombstone.objects.exists())
+
+    def test_deleting_a_client_does_not_load_its_leads(self):
+        def delete_queries(count, number):
+            client = Client.objects.create(business_name='Bulk', virtual_number=number)
+            ingest.import_calls(client.id, [
+                {'call_sid': f'CA{index}', 'customer_number': '+919988776655', 'status': 'new',
+                 'call_duration': 0, 'recording_url': None, 'call_timestamp': None}
+                for index in range(count)
+            ], timezone.now())
+            with CaptureQueriesContext(connection) as captured:
+                client.delete()
+            self.assertFalse(Lead.objects.filter(client_id=client.id).exists())
+            return [query['sql'] for query in captured if 'leads_lead"' in query['sql']]
+
+        queries = delete_queries(50, '+918045678902')
+        self.assertEqual(len(queries), len(delete_queries(1, '+918045678903')))
+        self.assertFalse(any(query.startswith('SELECT') for query in queries))
+
+    def test_admin_bulk_delete_records_tombstones(self):
+        for sid in ('CA1', 'CA2', 'CA3'):
+            self.send_call(sid)
+        since = self.feed()['next']
+        User.objects.create_superuser(username='admin', password='adminpass123')
+        admin_client = TestClient()
+        admin_client.login(username='admin', password='adminpass123')
+        ids = list(Lead.objects.filter(call_sid__in=['CA1', 'CA3']).values_list('id', flat=True))
+
+        response = admin_client.post(reverse('admin:leads_lead_changelist'), {
+            'action': 'delete_selected', '_selected_action': ids, 'post': 'yes',
+        })
+
+        self.assertEqual(response.status_code, 302)
+        changes_after = self.feed(since)['changes']
+        self.assertEqual([(c['op'], c['call_sid']) for c in changes_after], [('delete', 'CA1'), ('delete', 'CA3')])
+        self.assertEqual(len({c['seq'] for c in changes_after}), 2)
+        self.assertEqual(rollups.verify([self.client_model.id]), [])
+
+    def test_invalid_cursor(self):
+        response = self.api_client.get(reverse('lead-changes'), {'since': 'bogus'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_pruned_tombstones_require_a_resync(self):
+        self.send_call('CA1')
+        self.send_call('CA2')
+        since = self.feed()['next']
+        self.api_client.delete(reverse('lead-detail', kwargs={'pk': Lead.objects.get(call_sid='CA1').pk}))
+        current = self.feed(since)['next']
+        LeadTombstone.objects.update(deleted_at=timezone.now() - timedelta(days=31))
+
+        out = StringIO()
+        call_command('prune_lead_tombstones', '--days', '30', stdout=out)
+
+        self.assertIn('Pruned 1 tombstones', out.getvalue())
+        response = self.api_client.get(reverse('lead-changes'), {'since': since})
+        self.assertEqual(response.status_code, 410)
+        self.assertTrue(response.json()['resync'])
+        self.assertEqual(self.feed(current)['changes'], [])
+        self.assertEqual([c['lead']['call_sid'] for c in self.feed()['changes']], ['CA2'])
+
+
+class ChangeSequenceTransactionTestCase(TransactionTestCase):
+    def setUp(self):
+        self.client_model = Client.objects.create(business_name='Test Business', virtual_number='+918045678901')
+
+    def last_seq(self):
+        return self.client_model.change_sequence.last_seq
+
+    def test_seq_rolls_back_with_a_failed_lead_insert(self):
+        Lead.objects.create(client=self.client_model, customer_number='+919988776655', call_sid='CA1')
+        self.client_model.refresh_from_db()
+        self.assertEqual(self.last_seq(), 1)
+
+        with self.assertRaises(IntegrityError):
+            Lead.objects.create(client=self.client_model, customer_number='+919988776655', call_sid='CA1')
+
+        self.client_model.refresh_from_db()
+        self.assertEqual(self.last_seq(), 1)
+
+    def test_reserving_seqs_outside_a_transaction_fails(self):
+        with self.assertRaises(transaction.TransactionManagementError):
+            changes.next_seqs(self.client_model.id)
+
+
+class LiveStreamTestCase(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client_model = Client.objects.create(
+            user=self.user,
+            business_name='Test Business',
+            virtual_number='+918045678901'
+        )
+
+    def send_call(self, call_sid, call_duration='30'):
+        with self.captureOnCommitCallbacks(execute=True):
+            TestClient().get(reverse('call-webhook', kwargs={'token': self.client_model.webhook_token}), {
+                'CallSid': call_sid, 'From': '+919988776655', 'CallStatus': 'completed',
+                'Direction': 'incoming', 'DialCallDuration': call_duration,
+                'StartTime': '2025-08-07T10:30:00Z',
+            })
+
+    async def open_stream(self):
+        await self.async_client.aforce_login(self.user)
+        response = await self.async_client.get(reverse('lead-stream'))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 5000\n\n')
+        return stream
+
+    async def test_stream_pushes_kpi_deltas_and_new_leads(self):
+        stream = await self.open_stream()
+
+        await sync_to_async(self.send_call)('CA1')
+
+        kpis = (await asyncio.wait_for(anext(stream), 5)).decode()
+        self.assertTrue(kpis.startswith('event: kpis\n'))
+        day = json.loads(kpis.split('data: ', 1)[1])['days'][0]
+        self.assertEqual(day['day'], '2025-08-07')
+        self.assertEqual(day['lead_count'], 1)
+        self.assertEqual(day['contacted_count'], 1)
+        self.assertEqual(day['duration_0_30'], 1)
+
+        lead = (await asyncio.wait_for(anext(stream), 5)).decode()
+        self.assertTrue(lead.startswith('event: lead\n'))
+        self.assertEqual(json.loads(lead.split('data: ', 1)[1])['customer_number'], '+919988776655')
+
+        # A repeated CallSid moves counters but is not a new lead.
+        await sync_to_async(self.send_call)('CA1', '0')
+        kpis = (await asyncio.wait_for(anext(stream), 5)).decode()
+        day = json.loads(kpis.split('data: ', 1)[1])['days'][0]
+        self.assertEqual(day['missed_calls'], 1)
+        self.assertEqual(day['answered_calls'], -1)
+        self.assertNotIn('lead_count', day)
+
+    @override_settings(LIVE_STREAM_HEARTBEAT=0.01)
+    async def test_idle_stream_sends_keepalives(self):
+        stream = await self.open_stream()
+        self.assertEqual(await asyncio.wait_for(anext(stream), 5), b': keepalive\n\n')
+
+    async def test_stream_requires_login(self):
+        response = await self.async_client.get(reverse('lead-stream'))
+        self.assertEqual(response.status_code, 401)
+
+    async def test_broker_fans_out_per_client_and_resyncs_slow_readers(self):
+        test_broker = LeadBroker(queue_size=2)
+        subscriber = test_broker.subscribe(1)
+        other = test_broker.subscribe(2)
+
+        for index in range(3):
+            await sync_to_async(test_broker.publish)(1, 'lead', {'id': index})
+        await asyncio.sleep(0)
+
+        self.assertEqual(subscriber[1].get_nowait(), ('resync', {}))
+        self.assertTrue(other[1].empty())
+        test_broker.unsubscribe(1, subscriber)
+        self.assertFalse(test_broker.has_subscribers(1))
+
+
+class AsyncViewsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        client_cache.clear()
+        self.user = User.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='testpass123'
+        )
+        self.client_model = Client.objects.create(
+            user=self.user,
+            business_name='Test Business',
+            virtual_number='+918045678901'
+        )
+        self.factory = AsyncRequestFactory()
+        self.url = f'/webhook/{self.client_model.webhook_token}/'
+
+    async def webhook(self, params, token=None):
+        request = self.factory.get(self.url, params)
+        response = await AsyncCallWebhookView.as_view()(request, token=token or self.client_model.webhook_token)
+        return response.status_code, json.loads(response.content)
+
+    async def analytics(self, **headers):
+        request = self.factory.get('/analytics/', headers=headers)
+
+        async def auser():
+            return self.user
+        request.auser = auser
+        return await AsyncDashboardAnalyticsView.as_view()(request)
+
+    async def test_webhook_creates_then_updates(self):
+        params = {'CallSid': 'CA1', 'From': '+919988776655', 'CallStatus': 'completed',
+                  'Direction': 'incoming', 'DialCallDuration': '45'}
+
+        self.assertEqual(await self.webhook(params), (200, {'message': 'Lead processed', 'created': True}))
+        params['CallStatus'] = 'no-answer'
+        self.assertEqual(await self.webhook(params), (200, {'message': 'Lead processed', 'created': False}))
+
+        lead = await Lead.objects.aget(call_sid='CA1')
+        self.assertEqual(lead.status, 'new')
+        self.assertEqual(await sync_to_async(rollups.verify)([self.client_model.id]), [])
+
+    async def test_webhook_rejections(self):
+        status_code, _ = await self.webhook({'CallSid': 'CA1'}, token=uuid.uuid4())
+        self.assertEqual(status_code, 401)
+        self.assertEqual(await self.webhook({'Direction': 'incoming'}), (400, {'error': 'Missing required fields'}))
+        self.assertEqual((await self.webhook({'Direction': 'outgoing'}))[0], 200)
+        self.assertFalse(await Lead.objects.aexists())
+
+    async def test_batch_post(self):
+        body = json.dumps([
+            {'CallSid': 'CA1', 'From': '+919988776655', 'Direction': 'incoming', 'CallStatus': 'completed'},
+            {'CallSid': 'CA2', 'Direction': 'incoming'},
+        ])
+        request = self.factory.post(self.url, body, content_type='application/json')
+        response = await AsyncCallWebhookView.as_view()(request, token=self.client_model.webhook_token)
+
+        results = json.loads(response.content)['results']
+        self.assertEqual([result['result'] for result in results], ['created', 'rejected'])
+
+    async def test_analytics_matches_sync_view(self):
+        await self.webhook({'CallSid': 'CA1', 'From': '+919988776655', 'CallStatus': 'completed',
+                            'Direction': 'incoming', 'DialCallDuration': '45'})
+
+        response = await self.analytics()
+        self.assertEqual(response.status_code, 200)
+        sync_response = await sync_to_async(self.analytics_sync)()
+        self.assertEqual(json.loads(response.content), json.loads(sync_response.content))
+        self.assertEqual(response['ETag'], sync_response['ETag'])
+
+        response = await self.analytics(if_none_match=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def analytics_sync(self):
+        test_client = TestClient()
+        test_client.force_login(self.user)
+        return test_client.get('/analytics/')
+
+
+class BenchmarkDriverTestCase(TestCase):
+    def test_wsgi_and_asgi_drivers_report_latencies(self):
+        from lead_catcher_project.asgi import application as asgi_application
+        from lead_catcher_project.wsgi import application as wsgi_application
+        requests = [('GET', '/', '', {'host': 'localhost'}, b'')] * 6 + [('GET', '/missing/', '', {'host': 'localhost'}, b'')]
+
+        for drive, application in [(benchmark.drive_wsgi, wsgi_application), (benchmark.drive_asgi, asgi_application)]:
+            report = drive(application, requests, 3)
+            self.assertEqual(report['requests'], 7)
+            self.assertEqual(report['errors'], 1)
+            self.assertGreater(report['requests_per_second'], 0)
+            self.assertLessEqual(report['p50_ms'], report['p99_ms'])
+
+    def test_time_requests_counts_queries_of_one_request(self):
+        user = User.objects.create_user(username='testuser', password='testpass123')
+        Client.objects.create(user=user, business_name='Test Business', virtual_number='+918045678901')
+        self.client.force_login(user)
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get('/analytics/')
+        cold_queries = len(captured)
+        report = benchmark.time_requests(lambda: self.client.get('/analytics/'), 3)
+        self.assertEqual(report['requests'], 3)
+        self.assertEqual(report['errors'], 0)
+        self.assertGreater(report['queries'], 0)
+        self.assertLess(report['queries'], cold_queries)
+
+    def test_compare_reports_matches_measurements(self):
+        def report(p50):
+            return {'results': [{
+                'leads': 1000,
+                'webhook': {'p50_ms': p50, 'queries': 12},
+                'endpoints': {'dashboard': {'cold': {'p50_ms': p50 * 2, 'queries': 9}}},
+            }]}
+
+        rows = benchmark.compare_reports(report(10), report(15), metrics=('p50_ms', 'queries'))
+        self.assertEqual(rows, [
+            ('1000 webhook', 'p50_ms', 10, 15),
+            ('1000 webhook', 'queries', 12, 12),
+            ('1000 dashboard cold', 'p50_ms', 20, 30),
+            ('1000 dashboard cold', 'queries', 9, 9),
+        ])
+
+
+class LoadGeneratorTestCase(TestCase):
+    def test_generated_events_have_realistic_shape(self):
+        now = timezone.now()
+        events = list(loadgen.generate_events(5000, days=30, repeat_rate=0.3, missed_rate=0.25,
+                                              rng=random.Random(7), now=now))
+        self.assertEqual(events, list(loadgen.generate_events(5000, days=30, repeat_rate=0.3, missed_rate=0.25,
+                                                              rng=random.Random(7), now=now)))
+        self.assertEqual(len({event['call_sid'] for event in events}), 5000)
+
+        missed = sum(1 for event in events if event['call_duration'] == 0) / len(events)
+        self.assertAlmostEqual(missed, 0.25, delta=0.03)
+        repeats = 1 - len({event['customer_e164'] for event in events}) / len(events)
+        self.assertAlmostEqual(repeats, 0.3, delta=0.03)
+        self.assertTrue(all(now - timedelta(days=31) < event['call_timestamp'] <= now for event in events))
+        self.assertTrue(all(event['status'] in ('new', 'lost') for event in events if not event['call_duration']))
+
+        hours = [timezone.localtime(event['call_timestamp']).hour for event in events]
+        self.assertGreater(hours.count(10), hours.count(3) * 5)
+
+    def test_seed_command_creates_consistent_data(self):
+        out = StringIO()
+        with CaptureQueriesContext(connection) as captured:
+            call_command('seed_leads', clients=2, leads=300, seed=3, stdout=out)
+        self.assertIn('Seeded 600 leads for 2 clients', out.getvalue())
+        # Notes go in with the insert, so they carry its change_seq.
+        self.assertFalse([query for query in captured if query['sql'].startswith('UPDATE "leads_lead" ')])
+
+        client_ids = list(Client.objects.values_list('id', flat=True))
+        self.assertEqual(len(client_ids), 2)
+        self.assertEqual(rollups.verify(client_ids), [])
+        self.assertEqual(Caller.objects.aggregate(calls=Sum('call_count'))['calls'], 600)
+        self.assertTrue(Lead.objects.exclude(notes=None).exists())
+
+        call_command('seed_leads', client_id=client_ids[0], leads=100, seed=4, stdout=StringIO())
+        self.assertEqual(Lead.objects.filter(client_id=client_ids[0]).count(), 400)
+
+        call_command('seed_leads', delete=True, stdout=StringIO())
+        self.assertFalse(Client.objects.exists())
+        self.assertFalse(Lead.objects.exists())
+
+
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        metrics.registry.reset()
+        client_cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client_model = Client.objects.create(
+            user=self.user,
+            business_name='Test Business',
+            virtual_number='+918045678901'
+        )
+        self.staff = User.objects.create_user(username='staff', password='testpass123', is_staff=True)
+        self.webhook_url = reverse('call-webhook', kwargs={'token': self.client_model.webhook_token})
+        self.test_client = TestClient()
+
+    def scrape(self):
+        test_client = TestClient()
+        test_client.force_login(self.staff)
+        response = test_client.get('/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode()
+
+    def test_requests_counted_per_view_with_sql(self):
+        self.test_client.force_login(self.user)
+        self.test_client.get('/analytics/')
+        self.test_client.get('/analytics/')
+
+        with CaptureQueriesContext(connection) as captured:
+            self.test_client.get('/analytics/')
+        queries = len(captured)
+
+        body = self.scrape()
+        self.assertIn('http_request_duration_seconds_count{view="dashboard-analytics",method="GET"} 3', body)
+        self.assertIn('http_responses_total{view="dashboard-analytics",method="GET",status="200"} 3', body)
+        self.assertIn('http_request_db_queries_bucket{view="dashboard-analytics",method="GET",le="+Inf"} 3', body)
+        self.assertGreater(queries, 0)
+        self.assertEqual(metrics.registry.request_queries[('dashboard-analytics', 'GET')].count, 3)
+        self.assertGreaterEqual(metrics.registry.request_queries[('dashboard-analytics', 'GET')].sum, 3 * queries)
+
+    def test_unmatched_paths_share_one_label(self):
+        self.test_client.get('/no-such-page/')
+        self.test_client.get('/another-missing-page/')
+
+        self.assertEqual(metrics.registry.responses[('unmatched', 'GET', '404')], 2)
+
+    def test_webhook_outcomes(self):
+        params = {'CallSid': 'CA1', 'From': '+919988776655', 'CallStatus': 'completed', 'Direction': 'incoming'}
+        self.test_client.get(self.webhook_url, params)
+        self.test_client.get(self.webhook_url, params)
+        self.test_client.get(self.webhook_url, {'Direction': 'outgoing'})
+        self.test_client.get(self.webhook_url, {'Direction': 'incoming'})
+        self.test_client.get(reverse('call-webhook', kwargs={'token': uuid.uuid4()}), params)
+        self.test_client.post(self.webhook_url, json.dumps([
+            {'CallSid': 'CA2', 'From': '+919988776600', 'Direction': 'incoming'},
+            {'CallSid': 'CA3', 'Direction': 'incoming'},
+        ]), content_type='application/json')
+
+        self.assertEqual(dict(metrics.registry.webhook_events), {
+            'created': 2, 'updated': 1, 'filtered': 1, 'rejected': 2, 'unauthorized': 1,
+        })
+        self.assertIn('webhook_events_total{outcome="created"} 2', self.scrape())
+
+    def test_endpoint_is_staff_only(self):
+        self.assertIn(self.test_client.get('/metrics/').status_code, (401, 403))
+        self.test_client.force_login(self.user)
+        self.assertEqual(self.test_client.get('/metrics/').status_code, 403)
+
+        token = Token.objects.create(user=self.staff)
+        response = TestClient().get('/metrics/', headers={'Authorization': f'Token {token.key}'})
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(METRICS_SLOW_REQUEST_MS=100)
+    def test_slow_requests_logged(self):
+        request = RequestFactory().get('/analytics/')
+        request.resolver_match = None
+        timer = metrics.SqlTimer()
+        timer.queries = 7
+
+        with self.assertLogs('leads.metrics', level='WARNING') as logs:
+            metrics.finish_request(request, HttpResponse(), timer, time.perf_counter() - 0.5)
+        self.assertIn('Slow request GET /analytics/ (unmatched)', logs.output[0])
+        self.assertIn('7 queries', logs.output[0])
+
+        with self.assertNoLogs('leads.metrics', level='WARNING'):
+            metrics.finish_request(request, HttpResponse(), timer, time.perf_counter())
+
+    async def test_async_requests_counted(self):
+        params = {'CallSid': 'CA1', 'From': '+919988776655', 'CallStatus': 'completed', 'Direction': 'incoming'}
+        response = await AsyncClient().get(self.webhook_url, params)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(metrics.registry.responses[('call-webhook', 'GET', '200')], 1)
+        self.assertGreater(metrics.registry.request_queries[('call-webhook', 'GET')].sum, 0)
+        self.assertEqual(metrics.registry.webhook_events['created'], 1)
+
+
+def add_sqlite_alias(alias):
+    """
+    Register a database alias backed by a new temporary SQLite file
+    """
+    handle, path = tempfile.mkstemp(suffix='.sqlite3')
+    os.close(handle)
+    connections.settings[alias] = {**connections['default'].settings_dict, 'NAME': path}
+    return path
+
+
+def remove_sqlite_alias(alias):
+    path = connections.settings[alias]['NAME']
+    connections[alias].close()
+    del connections[alias]
+    del connections.settings[alias]
+    os.remove(path)
+
+
+@override_settings(READ_REPLICA_ALIAS='replica_test', READ_REPLICA_LAG_SECONDS=60)
+class ReadReplicaTestCase(TransactionTestCase):
+    """
+    Runs against a second SQLite file registered as the replica, refreshed
+    from the primary only by replica.copy_sqlite().
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # Registered after the test runner set up its databases, which
+        # would otherwise try to create a test copy of it.
+        add_sqlite_alias('replica_test')
+        cls.databases = cls.databases | {'replica_test'}
+
+    @classmethod
+    def tearDownClass(cls):
+        remove_sqlite_alias('replica_test')
+        cls.databases = cls.databases - {'replica_test'}
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        client_cache.clear()
+
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client_model = Client.objects.create(
+            user=self.user,
+            business_name='Test Business',
+            virtual_number='+918045678901'
+        )
+        self.webhook_url = reverse('call-webhook', kwargs={'token': self.client_model.webhook_token})
+        self.receive_call('CA1')
+        self.lead = Lead.objects.get(call_sid='CA1')
+        replica.copy_sqlite('default', 'replica_test')
+
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def receive_call(self, call_sid):
+        params = {'CallSid': call_sid, 'From': '+919988776600', 'CallStatus': 'completed', 'Direction': 'incoming'}
+        self.assertEqual(TestClient().get(self.webhook_url, params).status_code, 200)
+
+    def list_sids(self):
+        return sorted(lead['call_sid'] for lead in self.api.get(reverse('lead-list')).json()['results'])
+
+    def test_list_and_analytics_read_the_replica(self):
+        self.receive_call('CA2')
+        self.assertEqual(Lead.objects.count(), 2)
+
+        self.assertEqual(self.list_sids(), ['CA1'])
+        test_client = TestClient()
+        test_client.force_login(self.user)
+        self.assertEqual(test_client.get('/analytics/').json()['kpis']['total_leads'], 1)
+        self.assertEqual(test_client.get('/dashboard/').context['analytics']['total_leads'], 1)
+
+        replica.copy_sqlite('default', 'replica_test')
+        self.assertEqual(self.list_sids(), ['CA1', 'CA2'])
+
+    def test_writes_go_to_the_primary_and_pin_the_user(self):
+        response = self.api.patch(reverse('lead-detail', args=[self.lead.id]), {'status': 'converted'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(Lead.objects.using('default').get(id=self.lead.id).status, 'converted')
+        self.assertEqual(Lead.objects.using('replica_test').get(id=self.lead.id).status, 'contacted')
+        # Read-your-writes: the user's list comes from the primary for a while.
+        self.assertEqual(self.api.get(reverse('lead-list')).json()['results'][0]['status'], 'converted')
+
+        self.assertIsNone(replica.replica_for(self.user))
+        self.assertEqual(replica.replica_for(User.objects.create_user(username='other')), 'replica_test')
+
+        cache.clear()
+        self.assertEqual(self.api.get(reverse('lead-list')).json()['results'][0]['status'], 'contacted')
+
+    def test_reads_outside_replica_views_use_the_primary(self):
+        self.receive_call('CA2')
+
+        self.assertEqual(Lead.objects.count(), 2)
+        with replica.reads_for(self.user):
+            self.assertEqual(Lead.objects.count(), 1)
+            self.assertEqual(Lead.objects.get(call_sid='CA1').client.id, self.client_model.id)
+            lead = Lead.objects.get(call_sid='CA1')
+            lead.notes = 'Saved from a replica read'
+            lead.save()
+        self.assertEqual(Lead.objects.using('default').get(call_sid='CA1').notes, 'Saved from a replica read')
+
+    def test_cached_results_from_the_replica_expire_quickly(self):
+        with override_settings(ANALYTICS_CACHE_TIMEOUT=300, READ_REPLICA_LAG_SECONDS=5):
+            self.assertEqual(replica.cache_timeout(300), 300)
+            with replica.reads_for(self.user):
+                self.assertEqual(replica.cache_timeout(300), 5)
+
+
+@override_settings(LEAD_SHARDS=['default', 'shard_test'])
+class ShardingTestCase(TransactionTestCase):
+    """
+    Runs with a second SQLite file as an extra lead shard, given the test
+    schema by replica.copy_sqlite().
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        add_sqlite_alias('shard_test')
+        replica.copy_sqlite('default', 'shard_test')
+        cls.databases = cls.databases | {'shard_test'}
+
+    @classmethod
+    def tearDownClass(cls):
+        remove_sqlite_alias('shard_test')
+        cls.databases = cls.databases - {'shard_test'}
+        super().tearDownClass()
+
+    def setUp(self):
+        cache.clear()
+        client_cache.clear()
+
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client_model = Client.objects.create(
+            user=self.user,
+            business_name='Test Business',
+            virtual_number='+918045678901',
+            shard='shard_test',
+        )
+        self.webhook_url = reverse('call-webhook', kwargs={'token': self.client_model.webhook_token})
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def receive_call(self, call_sid, webhook_url=None, number='+919988776600'):
+        params = {'CallSid': call_sid, 'From': number, 'CallStatus': 'completed', 'Direction': 'incoming'}
+        self.assertEqual(TestClient().get(webhook_url or self.webhook_url, params).status_code, 200)
+
+    def test_new_clients_are_hashed_onto_a_shard(self):
+        client = Client.objects.create(business_name='Hashed', virtual_number='+918045678902')
+        self.assertEqual(client.shard, shards.hash_shard(client.webhook_token))
+        self.assertEqual(shards.hash_shard(client.webhook_token), shards.hash_shard(client.webhook_token))
+        self.assertTrue(Client.objects.using('shard_test').filter(id=self.client_model.id, user=None).exists())
+
+    def test_webhook_writes_land_on_the_client_shard(self):
+        self.receive_call('CA1')
+        self.receive_call('CA2')
+
+        self.assertEqual(Lead.objects.using('shard_test').filter(client_id=self.client_model.id).count(), 2)
+        self.assertFalse(Lead.objects.using('default').exists())
+        self.assertEqual(LeadDailyRollup.objects.using('shard_test').get().lead_count, 2)
+        self.assertEqual(Caller.objects.using('shard_test').get().call_count, 2)
+        self.assertEqual(rollups.verify([self.client_model.id]), [])
+
+    def test_views_read_from_the_client_shard(self):
+        self.receive_call('CA1')
+        lead = Lead.objects.using('shard_test').get()
+
+        self.assertEqual([row['call_sid'] for row in self.api.get(reverse('lead-list')).json()['results']], ['CA1'])
+        response = self.api.patch(reverse('lead-detail', args=[lead.id]), {'status': 'converted'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Lead.objects.using('shard_test').get().status, 'converted')
+        self.assertEqual(self.api.get(reverse('caller-list')).json()['results'][0]['call_count'], 1)
+
+        test_client = TestClient()
+        test_client.force_login(self.user)
+        self.assertEqual(test_client.get('/analytics/').json()['kpis']['total_leads'], 1)
+        self.assertEqual(test_client.get('/dashboard/').context['analytics']['total_leads'], 1)
+
+    def test_clients_on_different_shards_do_not_see_each_other(self):
+        other_user = User.objects.create_user(username='other', password='testpass123')
+        other = Client.objects.create(
+            user=other_user, business_name='Other', virtual_number='+918045678902', shard='default',
+        )
+        self.receive_call('CA1')
+        self.receive_call('CA1', reverse('call-webhook', kwargs={'token': other.webhook_token}), '+919988776601')
+
+        self.assertEqual(Lead.objects.using('default').get().client_id, other.id)
+        self.assertEqual(Lead.objects.using('shard_test').get().client_id, self.client_model.id)
+        self.api.force_authenticate(other_user)
+        results = self.api.get(reverse('lead-list')).json()['results']
+        self.assertEqual([row['customer_number'] for row in results], ['+919988776601'])
+
+    def test_deleting_a_client_deletes_its_shard_rows(self):
+        self.receive_call('CA1')
+        self.user.delete()
+
+        self.assertFalse(Client.objects.using('shard_test').exists())
+        self.assertFalse(Lead.objects.using('shard_test').exists())
+        self.assertFalse(LeadDailyRollup.objects.using('shard_test').exists())
+
+    def test_admin_browses_the_selected_shard(self):
+        self.receive_call('CA1')
+        User.objects.create_superuser(username='admin', password='adminpass123')
+        test_client = TestClient()
+        test_client.login(username='admin', password='adminpass123')
+
+        url = reverse('admin:leads_lead_changelist')
+        self.assertEqual(test_client.get(url).context['cl'].result_count, 0)
+        response = test_client.get(url, {'shard': 'shard_test'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+        self.assertContains(response, '+919988776600')
+
+    def test_webhooks_follow_a_move_despite_cached_clients(self):
+        self.receive_call('CA1')
+        stale = Client.objects.get(id=self.client_model.id)
+        call_command('rebalance_shards', client_id=self.client_model.id, to='default', settle=0, stdout=StringIO())
+        # Another worker's cache still holds the client as it was before the move.
+        client_cache._store(self.client_model.webhook_token, stale)
+
+        self.receive_call('CA2')
+        self.assertEqual(
+            sorted(Lead.objects.using('default').filter(client=self.client_model).values_list('call_sid', flat=True)),
+            ['CA1', 'CA2'],
+        )
+        self.assertFalse(Lead.objects.using('shard_test').exists())
+
+    def test_moving_a_client_keeps_its_leads_and_feed(self):
+        self.receive_call('CA1')
+        self.receive_call('CA2', number='+919988776601')
+        self.receive_call('CA3')
+        self.api.delete(reverse('lead-detail', args=[Lead.objects.using('shard_test').get(call_sid='CA3').id]))
+        feed = self.api.get(reverse('lead-changes')).json()
+        old_ids = {change['lead']['id'] for change in feed['changes'] if change['op'] == 'upsert'}
+
+        call_command('rebalance_shards', client_id=self.client_model.id, to='default', settle=0, batch_size=1, stdout=StringIO())
+
+        self.client_model.refresh_from_db()
+        self.assertEqual(self.client_model.shard, 'default')
+        self.assertFalse(Client.objects.using('shard_test').exists())
+        self.assertFalse(Lead.objects.using('shard_test').exists())
+        moved = Lead.objects.using('default').filter(client=self.client_model)
+        self.assertEqual(sorted(moved.values_list('call_sid', flat=True)), ['CA1', 'CA2'])
+        self.assertEqual(rollups.verify([self.client_model.id]), [])
+        self.assertEqual(Caller.objects.using('default').count(), 2)
+
+        # A consumer resuming from its cursor drops the old ids before
+        # seeing the leads under their new ones.
+        changes_after = self.api.get(reverse('lead-changes'), {'since': feed['next']}).json()['changes']
+        deletes = [change for change in changes_after if change['op'] == 'delete']
+        upserts = [change for change in changes_after if change['op'] == 'upsert']
+        self.assertTrue(old_ids <= {change['id'] for change in deletes})
+        self.assertEqual(sorted(change['lead']['call_sid'] for change in upserts), ['CA1', 'CA2'])
+        self.assertLess(max(change['seq'] for change in deletes), min(change['seq'] for change in upserts))
+
+        self.receive_call('CA4')
+        self.assertEqual(Lead.objects.using('default').filter(client=self.client_model).count(), 3)
+        self.assertEqual(rollups.verify([self.client_model.id]), [])
+
+    def test_writes_that_land_on_the_source_after_the_switch_are_moved(self):
+        self.receive_call('CA1')
+        since = self.api.get(reverse('lead-changes')).json()['next']
+        target_at_switch = []
+
+        def late_writer():
+            # A worker that looked the client up just before the switch.
+            try:
+                while Client.objects.get(id=self.client_model.id).shard != 'default':
+                    time.sleep(0.01)
+                target_at_switch.append((
+                    LeadDailyRollup.objects.using('default').filter(client=self.client_model).exists(),
+                    LeadTombstone.objects.using('default').filter(client=self.client_model).exists(),
+                ))
+                with shards.using('shard_test'):
+                    Lead.objects.create(client_id=self.client_model.id, customer_number='+919988776602', call_sid='CA2')
+            finally:
+                for alias in ('default', 'shard_test'):
+                    connections[alias].close()
+
+        thread = threading.Thread(target=late_writer)
+        thread.start()
+        rebalance.move_client(self.client_model, 'default', settle=1)
+        thread.join()
+
+        # Rebuilt and restamped before any writer could reach the target.
+        self.assertEqual(target_at_switch, [(True, True)])
+        moved = Lead.objects.using('default').filter(client=self.client_model)
+        self.assertEqual(sorted(moved.values_list('call_sid', flat=True)), ['CA1', 'CA2'])
+        self.assertGreater(moved.get(call_sid='CA2').change_seq, moved.get(call_sid='CA1').change_seq)
+        upserts = [
+            change['lead']['call_sid']
+            for change in self.api.get(reverse('lead-changes'), {'since': since}).json()['changes']
+            if change['op'] == 'upsert'
+        ]
+        self.assertEqual(upserts, ['CA1', 'CA2'])
+        self.assertEqual(rollups.verify([self.client_model.id]), [])
+        self.assertFalse(Lead.objects.using('shard_test').exists())
+
+    def test_rebalance_plans_moves_to_the_hashed_shard(self):
+        self.client_model.shard = 'default' if shards.hash_shard(self.client_model.webhook_token) == 'shard_test' else 'shard_test'
+        self.client_model.save()
+        out = StringIO()
+        call_command('rebalance_shards', dry_run=True, stdout=out)
+        self.assertIn(f'Would move client {self.client_model.id}', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('rebalance_shards', client_id=self.client_model.id, to='nowhere', stdout=StringIO())
+
+
+class AdminTestCase(TestCase):
+    def setUp(self):
+        User.objects.create_superuser(username='admin', password='adminpass123')
+        self.test_client = TestClient()
+        self.test_client.login(username='admin', password='adminpass123')
+        self.add_clients(2)
+
+    def add_clients(self, count):
+        for _ in range(count):
+            number = Client.objects.count() + 1
+            client = Client.objects.create(
+                user=User.objects.create_user(username=f'user{number}', password='testpass123'),
+                business_name=f'Business {number}',
+                virtual_number=f'+9180456789{number:02d}',
+            )
+            webhook_url = reverse('call-webhook', kwargs={'token': client.webhook_token})
+            for call in range(number):
+                params = {
+                    'CallSid': f'CA{number}-{call}', 'From': '+919988776600', 'CallStatus': 'completed', 'Direction': 'incoming',
+                }
+                self.assertEqual(self.test_client.get(webhook_url, params).status_code, 200)
+
+    def changelist_queries(self, url, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.test_client.get(url, params).status_code, 200)
+        return len(queries)
+
+    def test_changelists_run_a_constant_number_of_queries(self):
+        client_url, lead_url = reverse('admin:leads_client_changelist'), reverse('admin:leads_lead_changelist')
+        before = self.changelist_queries(client_url), self.changelist_queries(lead_url)
+        self.add_clients(4)
+        self.assertEqual((self.changelist_queries(client_url), self.changelist_queries(lead_url)), before)
+
+    def test_client_list_links_to_its_leads(self):
+        client = Client.objects.get(business_name='Business 2')
+        response = self.test_client.get(reverse('admin:leads_client_changelist'))
+        link = f'{reverse("admin:leads_lead_changelist")}?client={client.id}&amp;shard=default">2</a>'
+        self.assertContains(response, link)
+
+        response = self.test_client.get(reverse('admin:leads_lead_changelist'), {'client': client.id})
+        self.assertEqual({lead.client_id for lead in response.context['cl'].result_list}, {client.id})
+        self.assertEqual(response.context['cl'].result_count, 2)
+
+    def test_large_unfiltered_lists_estimate_their_count(self):
+        Lead.objects.filter(call_sid='CA2-0').delete()
+        url = reverse('admin:leads_lead_changelist')
+        high = Lead.objects.order_by('-id').values_list('id', flat=True).first()
+        with override_settings(ADMIN_ESTIMATED_COUNT_THRESHOLD=1):
+            self.assertEqual(self.test_client.get(url).context['cl'].result_count, high)
+            client = Client.objects.get(business_name='Business 2')
+            self.assertEqual(self.test_client.get(url, {'client': client.id}).context['cl'].result_count, 1)
+        self.assertEqual(self.test_client.get(url).context['cl'].result_count, 2)
+
+    def test_lead_list_drills_down_by_call_date(self):
+        lead = Lead.objects.first()
+        response = self.test_client.get(reverse('admin:leads_lead_changelist'), {
+            'call_timestamp__year': timezone.localtime(lead.call_timestamp).year,
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 3)
+
+
+    def test_lead_cannot_be_moved_to_another_client(self):
+        lead = Lead.objects.get(call_sid='CA1-0')
+        other = Client.objects.get(business_name='Business 2')
+        url = reverse('admin:leads_lead_change', args=[lead.pk])
+        self.assertNotIn('client', self.test_client.get(url).context['adminform'].form.fields)
+
+        local = timezone.localtime(lead.call_timestamp)
+        response = self.test_client.post(url, {
+            'client': other.pk, 'customer_number': lead.customer_number, 'status': 'contacted', 'notes': '',
+            'call_sid': lead.call_sid, 'call_duration': lead.call_duration, 'recording_url': '',
+            'call_timestamp_0': local.strftime('%Y-%m-%d'), 'call_timestamp_1': local.strftime('%H:%M:%S'),
+            'first_contacted_at_0': '', 'first_contacted_at_1': '',
+        })
+        self.assertEqual(response.status_code, 302)
+        lead.refresh_from_db()
+        self.assertEqual((lead.client_id, lead.status), (Client.objects.get(business_name='Business 1').pk, 'contacted'))
+        self.assertEqual(rollups.verify(Client.objects.values_list('id', flat=True)), [])
+
+class ProvisioningTestCase(TestCase):
+    def setUp(self):
+        Client.objects.create(business_name='Existing', virtual_number='+918000000041')
+
+    def write_csv(self, rows, fields=('username', 'business_name', 'email', 'virtual_number')):
+        handle, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(handle, 'w', newline='') as stream:
+            writer = csv.writer(stream)
+            writer.writerow(fields)
+            writer.writerows(rows)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def provision(self, rows, **options):
+        out = StringIO()
+        call_command('provision_clients', self.write_csv(rows), stdout=out, stderr=StringIO(), **options)
+        return out.getvalue()
+
+    def test_creates_users_and_clients_and_writes_their_urls(self):
+        output = self.provision([
+            ['acme', 'Acme Plumbing', 'ops@acme.test', ''],
+            ['bolt', 'Bolt Electric', '', '+918011112222'],
+            ['cray', 'Cray Roofing', '', ''],
+        ], domain='https://leads.example.com', batch_size=2)
+
+        rows = list(csv.DictReader(StringIO(output)))
+        self.assertEqual([row['username'] for row in rows], ['acme', 'bolt', 'cray'])
+        self.assertEqual([row['virtual_number'] for row in rows], ['+918000000042', '+918011112222', '+918000000043'])
+        client = Client.objects.select_related('user').get(user__username='acme')
+        self.assertEqual(client.business_name, 'Acme Plumbing')
+        self.assertEqual(client.user.email, 'ops@acme.test')
+        self.assertFalse(client.user.has_usable_password())
+        self.assertEqual(client.shard, shards.hash_shard(client.webhook_token))
+        self.assertEqual(rows[0]['webhook_url'], f'https://leads.example.com/webhook/{client.webhook_token}/')
+
+    def test_json_output(self):
+        output = self.provision([['acme', 'Acme Plumbing', '', '']], format='json')
+        self.assertEqual([row['username'] for row in json.loads(output)], ['acme'])
+
+    def test_queries_per_batch_do_not_grow_with_its_size(self):
+        def queries(count, offset):
+            rows = [[f'user{offset + index}', f'Business {index}', '', ''] for index in range(count)]
+            with CaptureQueriesContext(connection) as captured:
+                self.provision(rows, batch_size=100)
+            return len(captured)
+
+        self.assertEqual(queries(3, 0), queries(30, 100))
+
+    def test_invalid_batch_is_rejected_whole(self):
+        User.objects.create_user(username='taken')
+        with self.assertRaisesMessage(CommandError, 'username taken already exists'):
+            self.provision([['fresh', 'Fresh', '', ''], ['taken', 'Taken', '', '']])
+        with self.assertRaisesMessage(CommandError, 'virtual number +918000000041 is already assigned'):
+            self.provision([['fresh', 'Fresh', '', '+918000000041']])
+        with self.assertRaisesMessage(CommandError, 'missing the business_name column'):
+            call_command('provision_clients', self.write_csv([['fresh']], fields=('username',)), stdout=StringIO())
+        self.assertFalse(User.objects.filter(username='fresh').exists())
+
+    def test_bad_row_in_a_later_batch_creates_nobody(self):
+        with self.assertRaisesMessage(CommandError, 'line 4: username fresh appears twice'):
+            self.provision([['fresh', 'Fresh', '', ''], ['other', 'Other', '', ''], ['fresh', 'Again', '', '']],
+                           batch_size=1)
+        self.assertFalse(User.objects.filter(username__in=['fresh', 'other']).exists())
+
+    def test_allocated_numbers_skip_ones_requested_later_in_the_file(self):
+        output = self.provision([['acme', 'Acme', '', ''], ['bolt', 'Bolt', '', '+918000000042']], batch_size=1)
+
+        rows = list(csv.DictReader(StringIO(output)))
+        self.assertEqual([row['virtual_number'] for row in rows], ['+918000000043', '+918000000042'])
+
+    def test_rows_taken_after_the_check_are_named(self):
+        rows = [
+            {'username': 'acme', 'business_name': 'Acme'},
+            {'username': 'bolt', 'business_name': 'Bolt'},
+        ]
+        reads = []
+
+        def read_rows():
+            reads.append(len(rows))
+            if len(reads) == 2:
+                # Another run creates the user between the check and the write.
+                User.objects.create_user(username='bolt')
+            return iter(rows)
+
+        with self.assertRaisesMessage(provisioning.ProvisioningError, 'line 3: username bolt already exists'):
+            list(provisioning.provision(read_rows))
+        self.assertEqual(len(reads), 2)
+        self.assertFalse(User.objects.filter(username='acme').exists())
+
+        with self.assertRaisesMessage(provisioning.ProvisioningError,
+                                      'line 2: virtual number +918000000041 is already assigned'):
+            list(provisioning.provision(lambda: iter(rows[:1]), numbers=iter(['+918000000041'])))
+
+    def test_reads_stdin(self):
+        with open(self.write_csv([['acme', 'Acme', '', '']])) as stream, mock.patch('sys.stdin', stream):
+            out = StringIO()
+            call_command('provision_clients', '-', stdout=out, stderr=StringIO())
+        self.assertEqual([row['username'] for row in csv.DictReader(StringIO(out.getvalue()))], ['acme'])
+
+    @override_settings(LEAD_SHARDS=['missing_shard'])
+    def test_batch_rolls_back_when_shard_stubs_fail(self):
+        with self.assertRaises(ConnectionDoesNotExist):
+            self.provision([['fresh', 'Fresh', '', '']])
+        self.assertFalse(User.objects.filter(username='fresh').exists())
+        self.assertFalse(Client.objects.filter(business_name='Fresh').exists())
+
+    def test_webhook_urls_export_streams_with_constant_queries(self):
+        self.provision([[f'user{index}', f'Business {index}', '', ''] for index in range(5)])
+        out = StringIO()
+        with CaptureQueriesContext(connection) as captured:
+            call_command('get_webhook_urls', format='csv', stdout=out)
+        rows = list(csv.DictReader(StringIO(out.getvalue())))
+        self.assertEqual(len(rows), 6)
+        self.assertEqual(rows[1]['username'], 'user0')
+        self.assertLessEqual(len(captured), 2)
+
+        out = StringIO()
+        call_command('get_webhook_urls', stdout=out)
+        self.assertIn('User: No user', out.getvalue())
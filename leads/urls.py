@@ -1,12 +1,23 @@
 
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CallWebhookView, LeadViewSet, DashboardAnalyticsView, dashboard_view, logout_view
+from .views import (
+    CallWebhookView, AsyncCallWebhookView, CallerViewSet, LeadViewSet, DashboardAnalyticsView, AsyncDashboardAnalyticsView,
+    MetricsView,
+    dashboard_view, export_leads_view, lead_stream_view, logout_view,
+)
 from .landing_views import landing_page, pricing_page, features_page
 
 
+if settings.ASYNC_VIEWS:
+    webhook_view, analytics_view = AsyncCallWebhookView, AsyncDashboardAnalyticsView
+else:
+    webhook_view, analytics_view = CallWebhookView, DashboardAnalyticsView
+
 router = DefaultRouter()
 router.register(r'leads', LeadViewSet, basename='lead')
+router.register(r'callers', CallerViewSet, basename='caller')
 
 urlpatterns = [
     
@@ -19,11 +30,14 @@ urlpatterns = [
     
     
     path('dashboard/', dashboard_view, name='dashboard'),
+    path('dashboard/export/', export_leads_view, name='lead-export'),
+    path('dashboard/stream/', lead_stream_view, name='lead-stream'),
     
     
     path('leads/', include(router.urls)),  
-    path('analytics/', DashboardAnalyticsView.as_view(), name='dashboard-analytics'),
+    path('analytics/', analytics_view.as_view(), name='dashboard-analytics'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
     
     
-    path('webhook/<uuid:token>/', CallWebhookView.as_view(), name='call-webhook'),
+    path('webhook/<uuid:token>/', webhook_view.as_view(), name='call-webhook'),
 ]
\ No newline at end of file
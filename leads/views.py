@@ -1,23 +1,94 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.authentication import SessionAuthentication
-from django.utils.dateparse import parse_datetime
+from rest_framework.authentication import SessionAuthentication, TokenAuthentication
+from rest_framework.permissions import SAFE_METHODS, IsAdminUser
+from django.conf import settings
 from django.shortcuts import render, redirect
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.views import View
+from asgiref.sync import sync_to_async
+from django.core.serializers.json import DjangoJSONEncoder
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import logout
 from django.contrib import messages
-from django.db.models import Count
 from django.utils import timezone
+from django.db import transaction
 from datetime import timedelta
+import asyncio
 import json
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from rest_framework import viewsets
-from .serializers import LeadSerializer
-from django.db.models import Count, Avg, F, DurationField
-from .models import Client, Lead
-from django.db.models.functions import TruncDate, Extract
+from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
+from .serializers import CallerSerializer, LeadSerializer
+from .models import Caller, Client, Lead
+from . import (
+    analytics, analytics_cache, callers, changes, conditional, export, ingest, live, metrics, notes_search, replica,
+    rollups, shards, spool,
+)
+from .client_cache import client_cache
+from .pagination import CallerCursorPagination, LeadCursorPagination, InvalidCursor, keyset_page
+
+DASHBOARD_PAGE_SIZE = 20
+
+
+def classify_batch(items):
+    """
+    Per-event results for a parsed batch, plus the events to store. Accepted
+    events get a result of None until their outcome is known.
+    """
+    results = []
+    events = []
+    for index, params in enumerate(items):
+        if params is None:
+            results.append({"index": index, "result": "rejected", "error": "Event must be an object"})
+            continue
+        try:
+            event = ingest.parse_call_event(params)
+        except ingest.InvalidCallEvent as exc:
+            results.append({"index": index, "result": "rejected", "error": str(exc)})
+            continue
+        if event is None:
+            results.append({"index": index, "result": "filtered"})
+            continue
+        results.append({"index": index, "result": None})
+        events.append(event)
+    return results, events
+
+
+def store_batch(client, events):
+    if not events:
+        return []
+    if settings.WEBHOOK_INGEST_MODE == 'spool':
+        spool.get_spool().append_many(client.id, events)
+        return ['queued'] * len(events)
+    received_at = timezone.now()
+    created_flags = ingest.record_calls([(client.id, event, received_at) for event in events])
+    return ['created' if created else 'updated' for created in created_flags]
+
+
+def read_webhook_batch(request):
+    """
+    The raw batch body. Reading the stream rather than request.body skips
+    DATA_UPLOAD_MAX_MEMORY_SIZE, so WEBHOOK_BATCH_MAX_BYTES is the only limit.
+    """
+    body = request.read(settings.WEBHOOK_BATCH_MAX_BYTES + 1)
+    if len(body) > settings.WEBHOOK_BATCH_MAX_BYTES:
+        raise ingest.InvalidCallEvent("Batch is too large")
+    return body
+
+
+def parse_webhook_batch(request):
+    return ingest.parse_event_batch(
+        read_webhook_batch(request),
+        content_type=request.content_type or '',
+        content_encoding=request.headers.get('Content-Encoding', '').lower(),
+        max_events=settings.WEBHOOK_BATCH_MAX_EVENTS,
+        max_bytes=settings.WEBHOOK_BATCH_MAX_BYTES,
+    )
+
 
 @method_decorator(csrf_exempt, name='dispatch')
 class CallWebhookView(APIView):
@@ -25,77 +96,254 @@ class CallWebhookView(APIView):
     authentication_classes = []
 
     def get(self, request, token, *args, **kwargs):
-        try:
-            client = Client.objects.get(webhook_token=token)
-        except Client.DoesNotExist:
+        client = client_cache.get(token)
+        if client is None:
+            metrics.count_webhook_events(['unauthorized'])
             return Response({"error": "Unauthorized"}, status=status.HTTP_401_UNAUTHORIZED)
             
-        params = request.GET
+        try:
+            event = ingest.parse_call_event(request.GET)
+        except ingest.InvalidCallEvent as exc:
+            metrics.count_webhook_events(['rejected'])
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
         
-        direction = params.get('Direction', '').lower()
-        if direction != 'incoming':
+        if event is None:
+            metrics.count_webhook_events(['filtered'])
             return Response({"message": "Only incoming calls are processed"}, status=status.HTTP_200_OK)
         
-        call_sid = params.get('CallSid')
-        customer_number = params.get('From')
-        call_status = params.get('CallStatus', '').lower()
+        if settings.WEBHOOK_INGEST_MODE == 'spool':
+            spool.get_spool().append(client.id, event)
+            metrics.count_webhook_events(['queued'])
+            return Response({"message": "Lead queued"}, status=status.HTTP_200_OK)
         
-        if not call_sid or not customer_number:
-            return Response({"error": "Missing required fields"}, status=status.HTTP_400_BAD_REQUEST)
+        lead, created = ingest.record_call(client, event)
+        metrics.count_webhook_events(['created' if created else 'updated'])
         
-        if call_status == 'completed':
-            lead_status = 'contacted'
-        elif call_status in ['no-answer', 'busy', 'failed']:
-            lead_status = 'new'
-        else:
-            lead_status = 'new'
+        return Response({"message": "Lead processed", "created": created}, status=status.HTTP_200_OK)
+    
+    def post(self, request, token, *args, **kwargs):
+        client = client_cache.get(token)
+        if client is None:
+            metrics.count_webhook_events(['unauthorized'])
+            return Response({"error": "Unauthorized"}, status=status.HTTP_401_UNAUTHORIZED)
         
-        call_duration = int(params.get('DialCallDuration', 0))
-        recording_url = params.get('RecordingUrl')
-        start_time_str = params.get('StartTime')
+        try:
+            items = parse_webhook_batch(request)
+        except ingest.InvalidCallEvent as exc:
+            metrics.count_webhook_events(['rejected'])
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
         
-        call_timestamp = None
-        if start_time_str:
-            try:
-                call_timestamp = parse_datetime(start_time_str)
-            except:
-                pass
+        results, events = classify_batch(items)
+        outcomes = store_batch(client, events)
+        for result, outcome in zip([result for result in results if result["result"] is None], outcomes):
+            result["result"] = outcome
+        metrics.count_webhook_events(result["result"] for result in results)
         
-        if not call_timestamp:
-            call_timestamp = timezone.now()
+        return Response({"message": "Batch processed", "results": results}, status=status.HTTP_200_OK)
+    
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncCallWebhookView(View):
+    """
+    CallWebhookView for ASGI deployments (ASYNC_VIEWS=True). Token lookups
+    served from client_cache and rejected events never leave the event loop;
+    a write is a single thread hop.
+    """
+
+    async def get(self, request, token, *args, **kwargs):
+        client = await client_cache.aget(token)
+        if client is None:
+            metrics.count_webhook_events(['unauthorized'])
+            return JsonResponse({"error": "Unauthorized"}, status=status.HTTP_401_UNAUTHORIZED)
         
-        lead, created = Lead.objects.get_or_create(
-            client=client,
-            customer_number=customer_number,
-            call_timestamp=call_timestamp,
-            defaults={
-                'status': lead_status,
-                'call_duration': call_duration,
-                'recording_url': recording_url,
-            }
-        )
+        try:
+            event = ingest.parse_call_event(request.GET)
+        except ingest.InvalidCallEvent as exc:
+            metrics.count_webhook_events(['rejected'])
+            return JsonResponse({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
         
-        if not created:
-            lead.status = lead_status
-            lead.call_duration = call_duration
-            if recording_url:
-                lead.recording_url = recording_url
-            lead.save()
+        if event is None:
+            metrics.count_webhook_events(['filtered'])
+            return JsonResponse({"message": "Only incoming calls are processed"})
         
-        return Response({"message": "Lead processed", "created": created}, status=status.HTTP_200_OK)
+        if settings.WEBHOOK_INGEST_MODE == 'spool':
+            await sync_to_async(spool.get_spool().append)(client.id, event)
+            metrics.count_webhook_events(['queued'])
+            return JsonResponse({"message": "Lead queued"})
+        
+        lead, created = await ingest.arecord_call(client, event)
+        metrics.count_webhook_events(['created' if created else 'updated'])
+        
+        return JsonResponse({"message": "Lead processed", "created": created})
     
+    async def post(self, request, token, *args, **kwargs):
+        client = await client_cache.aget(token)
+        if client is None:
+            metrics.count_webhook_events(['unauthorized'])
+            return JsonResponse({"error": "Unauthorized"}, status=status.HTTP_401_UNAUTHORIZED)
+        
+        try:
+            items = parse_webhook_batch(request)
+        except ingest.InvalidCallEvent as exc:
+            metrics.count_webhook_events(['rejected'])
+            return JsonResponse({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        results, events = classify_batch(items)
+        outcomes = await sync_to_async(store_batch)(client, events)
+        for result, outcome in zip([result for result in results if result["result"] is None], outcomes):
+            result["result"] = outcome
+        metrics.count_webhook_events(result["result"] for result in results)
+        
+        return JsonResponse({"message": "Batch processed", "results": results})
+
 
+class ClientShardMixin:
+    """
+    Looks up the user's client as self.client and routes the rest of the
+    request to the shard holding its leads
+    """
+    client = None
+    _shard_token = None
 
-class LeadViewSet(viewsets.ModelViewSet):
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.client = Client.objects.filter(user=request.user).first()
+        self._shard_token = shards.activate(shards.alias_for(self.client) if self.client else None)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self._shard_token is not None:
+            shards.deactivate(self._shard_token)
+            self._shard_token = None
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class LeadViewSet(ClientShardMixin, viewsets.ModelViewSet):
     serializer_class = LeadSerializer
+    pagination_class = LeadCursorPagination
+
+    def get_queryset(self):
+        if self.client is None:
+            return Lead.objects.none()
+        queryset = Lead.objects.filter(client=self.client).order_by('-call_timestamp')
+        q = self.request.query_params.get('q')
+        if self.action == 'list' and q:
+            notes_q = notes_search.filter_q(self.client.id, q)
+            if notes_q is not None:
+                # Ranked best match first; the paginator pages on (search_rank, id).
+                queryset = notes_search.rank(queryset.filter(notes_q), self.client.id, q)
+        return queryset
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method not in SAFE_METHODS:
+            replica.pin_to_primary(request.user)
+
+    @method_decorator(replica.replica_reads)
+    def list(self, request, *args, **kwargs):
+        client = self.client
+        if client is None:
+            return super().list(request, *args, **kwargs)
+        etag = conditional.validators(client, variant=request.get_full_path())
+        not_modified = conditional.not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
+        return conditional.set_validators(super().list(request, *args, **kwargs), etag)
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        Leads created, updated or deleted since the opaque `since` cursor,
+        in commit order. Keep passing back `next` to stay in sync.
+        """
+        client = self.client
+        if client is None:
+            raise NotFound('Client profile not found')
+        try:
+            since = changes.decode_since(request.query_params.get('since'))
+        except InvalidCursor:
+            raise NotFound('Invalid cursor')
+        try:
+            limit = int(request.query_params.get('limit', changes.FEED_PAGE_SIZE))
+        except ValueError:
+            limit = changes.FEED_PAGE_SIZE
+        limit = max(1, min(limit, changes.FEED_MAX_PAGE_SIZE))
+
+        try:
+            entries, has_more = changes.read_feed(client, since, limit)
+        except changes.ResyncRequired:
+            return Response(
+                {'detail': 'Cursor is older than the retained change history; resync without since', 'resync': True},
+                status=status.HTTP_410_GONE,
+            )
+        results = []
+        for op, seq, obj in entries:
+            if op == 'upsert':
+                results.append({'op': op, 'seq': seq, 'lead': self.get_serializer(obj).data})
+            else:
+                results.append({'op': op, 'seq': seq, 'id': obj.lead_id, 'call_sid': obj.call_sid})
+        return Response({
+            'changes': results,
+            'next': changes.encode_since(entries[-1][1] if entries else since),
+            'has_more': has_more,
+        })
+
+    def perform_destroy(self, instance):
+        with transaction.atomic(using=shards.db()):
+            rollups.apply_change(rollups.contribution(instance), None)
+            changes.record_delete(instance)
+            instance.delete()
+
+
+class CallerViewSet(ClientShardMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    A client's distinct callers, most recently seen first
+    """
+    serializer_class = CallerSerializer
+    pagination_class = CallerCursorPagination
 
     def get_queryset(self):
-        return Lead.objects.filter(client__user=self.request.user).order_by('-call_timestamp')
+        if self.client is None:
+            return Caller.objects.none()
+        queryset = Caller.objects.filter(client=self.client)
+        if self.request.query_params.get('repeat'):
+            queryset = queryset.filter(call_count__gt=1)
+        return queryset
+
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        if self.client is None:
+            raise NotFound('Client profile not found')
+        return Response(callers.summarize(self.client))
+
+    @action(detail=True, methods=['get'])
+    def leads(self, request, pk=None):
+        """
+        The caller's call history, newest first
+        """
+        paginator = LeadCursorPagination()
+        page = paginator.paginate_queryset(callers.leads_for(self.get_object()), request, view=self)
+        return paginator.get_paginated_response(LeadSerializer(page, many=True).data)
+
+
+class MetricsView(APIView):
+    """
+    Request and webhook metrics in Prometheus text format, for staff users.
+    Scrape with a staff user's API token (Authorization: Token ...).
+    """
+    authentication_classes = [SessionAuthentication, TokenAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(metrics.registry.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 
 class DashboardAnalyticsView(APIView):
     authentication_classes = [SessionAuthentication]
     permission_classes = []
     
+    @method_decorator(replica.replica_reads)
+    @method_decorator(shards.client_shard)
     def get(self, request, *args, **kwargs):
         if not request.user.is_authenticated:
             return Response({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
@@ -105,45 +353,93 @@ class DashboardAnalyticsView(APIView):
         except Client.DoesNotExist:
             return Response({"error": "Client profile not found"}, status=status.HTTP_404_NOT_FOUND)
         
-        status_counts = Lead.objects.filter(client=client).values('status').annotate(count=Count('status'))
+        # leads_over_time is a rolling window, so the day is part of the representation.
+        etag = conditional.validators(client, variant=timezone.localdate().isoformat())
+        not_modified = conditional.not_modified(request, etag)
+        if not_modified is not None:
+            return not_modified
         
-        thirty_days_ago = timezone.now() - timedelta(days=30)
-        leads_over_time = Lead.objects.filter(client=client, call_timestamp__gte=thirty_days_ago)\
-            .extra(select={'day': "DATE(call_timestamp)"})\
-            .values('day').annotate(count=Count('id')).order_by('day')
-            
-        response_time_data = Lead.objects.filter(
-            client=client,
-            first_contacted_at__isnull=False
-        ).aggregate(
-            avg_response_time=Avg(F('first_contacted_at') - F('created_at'))
-        )
+        data = analytics_cache.cached(client.id, 'analytics-api', {}, lambda: analytics_api_data(client))
+        return conditional.set_validators(Response(data), etag)
+
+
+class AsyncDashboardAnalyticsView(View):
+    """
+    DashboardAnalyticsView on the async ORM, for ASGI deployments (ASYNC_VIEWS=True)
+    """
+
+    async def get(self, request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return JsonResponse({"error": "Authentication required"}, status=status.HTTP_401_UNAUTHORIZED)
         
-        total_leads = Lead.objects.filter(client=client).count()
-        total_missed = Lead.objects.filter(client=client, call_duration=0).count()
+        try:
+            client = await Client.objects.aget(user=user)
+        except Client.DoesNotExist:
+            return JsonResponse({"error": "Client profile not found"}, status=status.HTTP_404_NOT_FOUND)
         
-        avg_response_seconds = 0
-        if response_time_data['avg_response_time']:
-            avg_response_seconds = response_time_data['avg_response_time'].total_seconds()
+        with shards.for_client(client), replica.reading_from(await replica.areplica_for(user)):
+            etag = await conditional.avalidators(client, variant=timezone.localdate().isoformat())
+            not_modified = conditional.not_modified(request, etag)
+            if not_modified is not None:
+                return not_modified
             
-        data = {
-            'kpis': {
-                'total_leads': total_leads,
-                'total_missed_calls': total_missed,
-                'avg_response_seconds': round(avg_response_seconds)
-            },
-            'leads_by_status': list(status_counts),
-            'leads_over_time': list(leads_over_time)
-        }
+            data = await analytics_cache.acached(client.id, 'analytics-api', {}, lambda: analytics_api_data(client))
+        return conditional.set_validators(JsonResponse(data), etag)
+
+
+def analytics_api_data(client):
+    summary = rollups.summarize(client)
+    thirty_days_ago = timezone.now() - timedelta(days=30)
+    leads_over_time = rollups.leads_over_time(client, thirty_days_ago)
         
-        return Response(data)
+    return {
+        'kpis': {
+            'total_leads': summary['total_leads'],
+            'total_missed_calls': summary['missed_calls'],
+            'avg_response_seconds': round(summary['avg_response_seconds'])
+        },
+        'leads_by_status': summary['status_counts'],
+        'leads_over_time': list(leads_over_time)
+    }
     
 
+def dashboard_analytics(client, leads_queryset, date_from, filters):
+    """
+    Everything on the dashboard except the lead table, for caching as one entry
+    """
+    if filters['status'] or filters['duration'] or filters['search'] or filters['q']:
+        summary = analytics.summarize(leads_queryset)
+        leads_over_time_data = analytics.leads_over_time(leads_queryset, date_from)
+    else:
+        summary = rollups.summarize(client)
+        leads_over_time_data = rollups.leads_over_time(client, date_from)
+
+    hourly_pattern = analytics.hourly_pattern(leads_queryset)
+    return {
+        'summary': summary,
+        'leads_over_time': {
+            "labels": [item['day'].strftime('%b %d') for item in leads_over_time_data],
+            "data": [item['count'] for item in leads_over_time_data],
+            "days": [item['day'].isoformat() for item in leads_over_time_data]
+        },
+        'hourly': {
+            'labels': [f"{int(h)}:00" for h in analytics.BUSINESS_HOURS],
+            'data': [hourly_pattern[h] for h in analytics.BUSINESS_HOURS]
+        },
+        'callers': callers.summarize(client),
+        'top_callers': callers.top_repeat_callers(client),
+    }
+
+
 @login_required
+@replica.replica_reads
+@shards.client_shard
 def dashboard_view(request):
     if request.method == 'POST' and not hasattr(request.user, 'client'):
         business_name = request.POST.get('business_name')
         if business_name:
+            replica.pin_to_primary(request.user)
             Client.objects.create(
                 user=request.user,
                 business_name=business_name,
@@ -159,117 +455,148 @@ def dashboard_view(request):
     days = int(request.GET.get('days', 30))
     date_from = timezone.now() - timedelta(days=days)
     
-    leads_queryset = Lead.objects.filter(client=client)
-    
     status_filter = request.GET.get('status')
-    if status_filter:
-        leads_queryset = leads_queryset.filter(status=status_filter)
-    
     duration_filter = request.GET.get('duration')
-    if duration_filter == '0':
-        leads_queryset = leads_queryset.filter(call_duration=0)
-    elif duration_filter == '1-30':
-        leads_queryset = leads_queryset.filter(call_duration__range=(1, 30))
-    elif duration_filter == '31-120':
-        leads_queryset = leads_queryset.filter(call_duration__range=(31, 120))
-    elif duration_filter == '121+':
-        leads_queryset = leads_queryset.filter(call_duration__gt=120)
-    
     search_filter = request.GET.get('search')
-    if search_filter:
-        leads_queryset = leads_queryset.filter(customer_number__icontains=search_filter)
-
-    status_counts = list(leads_queryset.values('status').annotate(count=Count('status')))
-
-    leads_over_time_data = leads_queryset.filter(call_timestamp__gte=date_from)\
-        .annotate(day=TruncDate('call_timestamp'))\
-        .values('day')\
-        .annotate(count=Count('id'))\
-        .order_by('day')
+    notes_query = request.GET.get('q')
+    leads_queryset = analytics.filter_leads(
+        client, status=status_filter, duration=duration_filter, search=search_filter, q=notes_query
+    )
 
-    leads_over_time = {
-        "labels": [item['day'].strftime('%b %d') for item in leads_over_time_data],
-        "data": [item['count'] for item in leads_over_time_data]
+    filters = {
+        'days': days, 'status': status_filter, 'duration': duration_filter,
+        'search': search_filter, 'q': notes_query,
     }
-    
-    total_leads = leads_queryset.count()
-    converted_leads = leads_queryset.filter(status='converted').count()
-    missed_calls = leads_queryset.filter(call_duration=0).count()
-    
-    response_time_data = leads_queryset.filter(
-        first_contacted_at__isnull=False
-    ).aggregate(
-        avg_response_time=Avg(F('first_contacted_at') - F('created_at'))
+    charts = analytics_cache.cached(
+        client.id, 'dashboard', filters, lambda: dashboard_analytics(client, leads_queryset, date_from, filters)
     )
+    summary = charts['summary']
+    
+    total_leads = summary['total_leads']
+    converted_leads = summary['converted_leads']
+    missed_calls = summary['missed_calls']
+    avg_response_seconds = summary['avg_response_seconds']
     
-    avg_response_seconds = 0
-    if response_time_data['avg_response_time']:
-        avg_response_seconds = response_time_data['avg_response_time'].total_seconds()
+    table_queryset = notes_search.rank(leads_queryset, client.id, notes_query)
+    try:
+        leads_page, next_cursor = keyset_page(table_queryset, request.GET.get('cursor'), DASHBOARD_PAGE_SIZE)
+    except InvalidCursor:
+        leads_page, next_cursor = keyset_page(table_queryset, None, DASHBOARD_PAGE_SIZE)
     
-    all_leads = leads_queryset.order_by('-call_timestamp')
+    query = request.GET.copy()
+    first_page_url = None
+    if query.pop('cursor', None):
+        first_page_url = f"?{query.urlencode()}"
+    next_page_url = None
+    if next_cursor:
+        query['cursor'] = next_cursor
+        next_page_url = f"?{query.urlencode()}"
     
-    analytics = {
+    analytics_data = {
         'total_leads': total_leads,
         'converted_leads': converted_leads,
         'conversion_rate': (converted_leads / total_leads * 100) if total_leads > 0 else 0,
         'missed_calls': missed_calls,
         'missed_call_rate': (missed_calls / total_leads * 100) if total_leads > 0 else 0,
         'avg_response_time_minutes': avg_response_seconds / 60 if avg_response_seconds > 0 else 0,
-        'avg_call_duration': leads_queryset.filter(call_duration__gt=0).aggregate(
-            avg_duration=Avg('call_duration')
-        )['avg_duration'] or 0
-    }
-
-    duration_ranges = [
-        ('0-30s', 0, 30),
-        ('31-60s', 31, 60),
-        ('1-2m', 61, 120),
-        ('2-5m', 121, 300),
-        ('5m+', 301, 999999)
-    ]
-    
-    duration_data = []
-    for label, min_dur, max_dur in duration_ranges:
-        if max_dur == 999999:
-            count = leads_queryset.filter(call_duration__gte=min_dur).count()
-        else:
-            count = leads_queryset.filter(call_duration__range=(min_dur, max_dur)).count()
-        duration_data.append({'label': label, 'count': count})
-    
-    hourly_data = leads_queryset.exclude(call_timestamp__isnull=True)\
-        .annotate(hour=Extract('call_timestamp', 'hour'))\
-        .values('hour')\
-        .annotate(count=Count('id'))\
-        .order_by('hour')
-    
-    hourly_pattern = {str(hour): 0 for hour in range(24)}
-    for item in hourly_data:
-        hourly_pattern[str(item['hour'])] = item['count']
-    
-    business_hours = ['6', '8', '10', '12', '14', '16', '18', '20']
-    hourly_chart_data = {
-        'labels': [f"{int(h)}:00" for h in business_hours],
-        'data': [hourly_pattern[h] for h in business_hours]
+        'avg_call_duration': summary['avg_call_duration']
     }
 
     context = {
         'client': client,
-        'all_leads': all_leads,
-        'status_counts_json': json.dumps(status_counts),
-        'leads_over_time_json': json.dumps(leads_over_time),
-        'duration_data_json': json.dumps(duration_data),
-        'hourly_data_json': json.dumps(hourly_chart_data),
-        'analytics': analytics,
-        'current_filters': {
-            'days': days,
-            'status': status_filter,
-            'duration': duration_filter,
-            'search': search_filter
-        }
+        'leads_page': leads_page,
+        'next_page_url': next_page_url,
+        'first_page_url': first_page_url,
+        'status_counts_json': json.dumps(summary['status_counts']),
+        'leads_over_time_json': json.dumps(charts['leads_over_time']),
+        'duration_data_json': json.dumps(summary['duration_data']),
+        'hourly_data_json': json.dumps(charts['hourly']),
+        'caller_stats': charts['callers'],
+        'top_callers': charts['top_callers'],
+        'analytics': analytics_data,
+        'current_filters': filters,
+        'live_updates': not (status_filter or duration_filter or search_filter or notes_query or first_page_url),
+        'page_size': DASHBOARD_PAGE_SIZE,
     }
     return render(request, 'dashboard/enhanced_dashboard.html', context)
 
 
+EXPORT_FORMATS = {
+    'csv': (export.stream_csv, 'text/csv', 'csv'),
+    'ndjson': (export.stream_ndjson, 'application/x-ndjson', 'ndjson'),
+}
+
+
+@login_required
+@shards.client_shard
+def export_leads_view(request):
+    try:
+        client = request.user.client
+    except Client.DoesNotExist:
+        return redirect('dashboard')
+    
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return HttpResponseBadRequest('Unsupported export format')
+    stream, content_type, extension = EXPORT_FORMATS[export_format]
+    
+    leads_queryset = analytics.filter_leads(
+        client,
+        status=request.GET.get('status'),
+        duration=request.GET.get('duration'),
+        search=request.GET.get('search'),
+        q=request.GET.get('q'),
+    )
+    days = request.GET.get('days')
+    if days:
+        try:
+            since = timezone.now() - timedelta(days=int(days))
+        except (ValueError, OverflowError):
+            return HttpResponseBadRequest('days must be a whole number of days')
+        leads_queryset = leads_queryset.filter(call_timestamp__gte=since)
+    # The response is streamed after the view returns, outside for_client().
+    leads_queryset = leads_queryset.using(shards.alias_for(client))
+    
+    response = StreamingHttpResponse(stream(leads_queryset), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="leads-{timezone.now():%Y%m%d}.{extension}"'
+    return response
+
+
+async def lead_stream_view(request):
+    """
+    Server-Sent Events stream of new leads ('lead') and rollup counter deltas
+    ('kpis') for the signed-in client's dashboard. Needs the ASGI entry point:
+    an idle connection is an awaiting coroutine rather than a worker thread.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=401)
+    client = await Client.objects.filter(user=user).afirst()
+    if client is None:
+        return HttpResponse(status=404)
+    
+    subscriber = live.broker.subscribe(client.id)
+    _, queue = subscriber
+    
+    async def events():
+        try:
+            yield 'retry: 5000\n\n'
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(queue.get(), settings.LIVE_STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ': keepalive\n\n'
+                    continue
+                yield f'event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n'
+        finally:
+            live.broker.unsubscribe(client.id, subscriber)
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 def logout_view(request):
     if request.user.is_authenticated:
         logout(request)